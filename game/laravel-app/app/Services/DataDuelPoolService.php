@@ -0,0 +1,65 @@
+<?php
+
+namespace App\Services;
+
+use Illuminate\Support\Facades\DB;
+
+class DataDuelPoolService
+{
+    /**
+     * Réserve un pool de 10 cartes pré-calculé (table duel_pools, alimentée par `generate-duel-pools`).
+     * Une seule instruction : la sous-requête FOR UPDATE SKIP LOCKED garantit qu'un pool n'est attribué
+     * qu'à une room, même avec des créations concurrentes.
+     */
+    public function claimPool(?string $theme = null, ?int $year = null, ?string $semester = null, ?string $claimedBy = null): ?array
+    {
+        $pivot = mt_rand() / mt_getrandmax();
+
+        $pool = $this->claim($theme, $year, $semester, $claimedBy, '>=', $pivot)
+            ?? $this->claim($theme, $year, $semester, $claimedBy, '<', $pivot);
+
+        if (!$pool) {
+            return null;
+        }
+
+        return [
+            'id' => $pool->id,
+            'theme' => $pool->theme,
+            'year' => $pool->year,
+            'semester' => $pool->semester,
+            'cards' => collect(json_decode($pool->cards, true)),
+        ];
+    }
+
+    private function claim(?string $theme, ?int $year, ?string $semester, ?string $claimedBy, string $operator, float $pivot): ?object
+    {
+        $conditions = ['claimed_at IS NULL', 'project = ?', "random_key {$operator} ?"];
+        $bindings = [config('services.wiki.project'), $pivot];
+
+        if ($theme) {
+            $conditions[] = 'theme = ?';
+            $bindings[] = $theme;
+        }
+        if ($year) {
+            $conditions[] = 'year = ?';
+            $bindings[] = $year;
+        }
+        if ($semester) {
+            $conditions[] = 'semester = ?';
+            $bindings[] = $semester;
+        }
+
+        $where = implode(' AND ', $conditions);
+
+        return DB::connection('data')->selectOne(
+            "UPDATE duel_pools SET claimed_at = NOW(), claimed_by = ?
+             WHERE id = (
+                 SELECT id FROM duel_pools WHERE {$where}
+                 ORDER BY random_key LIMIT 1
+                 FOR UPDATE SKIP LOCKED
+             )
+             RETURNING id, theme, year, semester, cards",
+            array_merge([$claimedBy], $bindings)
+        );
+    }
+}
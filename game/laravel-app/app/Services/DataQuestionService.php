@@ -7,58 +7,58 @@
 
 class DataQuestionService
 {
+    /**
+     * Lit une question publiée dans question_snapshots (une seule ligne, sans jointure), dans la partition du projet.
+     * Le tirage aléatoire passe par un pivot sur random_key (indexé) au lieu d'un ORDER BY RANDOM().
+     */
     public function fetchQuestion(?string $theme = null, ?int $year = null, ?string $semester = null): ?array
     {
-        $query = DB::connection('data')
-            ->table('questions')
-            ->join('themes', 'questions.theme_id', '=', 'themes.id')
-            ->join('question_articles', 'questions.id', '=', 'question_articles.question_id')
-            ->where('questions.status', 'ready')
-            ->groupBy('questions.id', 'themes.name', 'questions.year', 'questions.semester')
-            ->havingRaw('COUNT(question_articles.id) = 4');
+        $pivot = mt_rand() / mt_getrandmax();
 
-        if ($theme) {
-            $query->where('themes.name', $theme);
-        }
-        if ($year) {
-            $query->where('questions.year', $year);
-        }
-        if ($semester) {
-            $query->where('questions.semester', $semester);
-        }
+        $snapshot = $this->snapshotQuery($theme, $year, $semester)
+            ->where('random_key', '>=', $pivot)
+            ->orderBy('random_key')
+            ->first();
 
-        $question = $query->inRandomOrder()->first([
-            'questions.id as id',
-            'themes.name as theme',
-            'questions.year',
-            'questions.semester',
-        ]);
+        if (!$snapshot) {
+            $snapshot = $this->snapshotQuery($theme, $year, $semester)
+                ->where('random_key', '<', $pivot)
+                ->orderBy('random_key')
+                ->first();
+        }
 
-        if (!$question) {
+        if (!$snapshot) {
             return null;
         }
 
-        $articles = DB::connection('data')
-            ->table('question_articles')
-            ->join('articles', 'question_articles.article_id', '=', 'articles.id')
-            ->where('question_articles.question_id', $question->id)
-            ->get([
-                'articles.title',
-                'articles.summary',
-                'articles.image_url',
-                'question_articles.views_total',
-                'question_articles.views_avg_daily',
-            ]);
-
         return [
-            'id' => $question->id,
-            'theme' => $question->theme,
-            'year' => $question->year,
-            'semester' => $question->semester,
-            'articles' => $articles,
+            'id' => $snapshot->question_id,
+            'theme' => $snapshot->theme,
+            'year' => $snapshot->year,
+            'semester' => $snapshot->semester,
+            'articles' => collect(json_decode($snapshot->articles)),
+            'correct_order' => json_decode($snapshot->correct_order, true),
         ];
     }
 
+    private function snapshotQuery(?string $theme, ?int $year, ?string $semester)
+    {
+        $query = DB::connection('data')->table('question_snapshots')
+            ->where('project', config('services.wiki.project'));
+
+        if ($theme) {
+            $query->where('theme', $theme);
+        }
+        if ($year) {
+            $query->where('year', $year);
+        }
+        if ($semester) {
+            $query->where('semester', $semester);
+        }
+
+        return $query;
+    }
+
     public function orderAscendingByPopularity(Collection $articles): array
     {
         return $articles
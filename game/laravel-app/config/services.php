@@ -28,6 +28,11 @@
         'region' => env('AWS_DEFAULT_REGION', 'us-east-1'),
     ],
 
+    'wiki' => [
+        // Projet Wikimedia servi par le jeu : les lectures de question_snapshots restent dans sa partition.
+        'project' => env('DATA_WIKI_PROJECT', 'fr.wikipedia'),
+    ],
+
     'slack' => [
         'notifications' => [
             'bot_user_oauth_token' => env('SLACK_BOT_USER_OAUTH_TOKEN'),
@@ -0,0 +1 @@
+"""Benchmarks hors-ligne du service data (voir __main__)."""
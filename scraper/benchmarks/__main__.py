@@ -0,0 +1,165 @@
+"""
+Benchmarks hors-ligne du service data.
+
+    cd scraper && PYTHONPATH=src python -m benchmarks --scale prod
+
+Les réponses Wikimedia sont synthétiques (httpx.MockTransport), la base est un SQLite temporaire
+(ou --db-url vers une base PostgreSQL *dédiée*, vidée au début du run). Les résultats sont écrits en JSON
+dans benchmarks/results/ ; --compare-with affiche l'écart avec un run précédent. Le run échoue (code 1) si le
+démarrage de la CLI dépasse --startup-budget.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Annotated, Optional
+
+import typer
+from sqlalchemy.engine import make_url
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# (semestres, articles par top mensuel, vocabulaire de titres, appels build_question, articles backfill)
+SCALES = {
+    "small": (2, 200, 2_000, 20, 50),
+    "medium": (6, 1000, 10_000, 100, 200),
+    "prod": (20, 1000, 20_000, 200, 1000),
+}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def periods_for(count: int, last_year: int = 2025) -> list[tuple[int, str]]:
+    """Les `count` derniers semestres jusqu'à last_year-S1 inclus, dans l'ordre chronologique."""
+    periods = []
+    year, semester = last_year, "S1"
+    while len(periods) < count:
+        periods.append((year, semester))
+        year, semester = (year, "S1") if semester == "S2" else (year - 1, "S2")
+    return periods[::-1]
+
+
+def compare(current: dict, baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text())
+    typer.echo(f"\nComparaison avec {baseline_path.name} ({baseline['meta'].get('commit')}) :")
+    sizes = ("scale", "semesters", "titles_per_list", "vocabulary", "db")
+    if any(baseline["meta"].get(key) != current["meta"].get(key) for key in sizes):
+        typer.echo("  Attention : tailles de données ou base différentes, écarts non comparables.")
+    for name, metrics in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+        for key in ("seconds", "p50_ms", "p95_ms", "help_ms"):
+            if key in metrics and before.get(key):
+                delta = (metrics[key] - before[key]) / before[key] * 100
+                typer.echo(f"  {name}.{key}: {before[key]:.4g} -> {metrics[key]:.4g} ({delta:+.1f} %)")
+
+
+def main(
+    scale: Annotated[str, typer.Option("--scale", help="small, medium ou prod (20 semestres x 1000 titres)")] = "small",
+    semesters: Annotated[Optional[int], typer.Option("--semesters", help="Surcharge du nombre de semestres")] = None,
+    titles: Annotated[Optional[int], typer.Option("--titles", help="Articles par top mensuel")] = None,
+    vocabulary: Annotated[Optional[int], typer.Option("--vocabulary", help="Titres distincts")] = None,
+    only: Annotated[Optional[str], typer.Option("--only", help="Cas à exécuter (virgules), dans l'ordre")] = None,
+    repeat: Annotated[int, typer.Option("--repeat", help="Répétitions des cas sans écriture (meilleur temps)")] = 3,
+    db_url: Annotated[Optional[str], typer.Option("--db-url", help="Base dédiée aux benchmarks (vidée !)")] = None,
+    output: Annotated[Optional[Path], typer.Option("--output", help="Fichier JSON de résultats")] = None,
+    compare_with: Annotated[Optional[Path], typer.Option("--compare-with", help="Résultats JSON d'un run précédent")] = None,
+    startup_budget: Annotated[
+        float, typer.Option("--startup-budget", help="Budget de démarrage de la CLI en ms (--help, erreur d'argument)")
+    ] = 400.0,
+) -> None:
+    if scale not in SCALES:
+        raise typer.BadParameter(f"Échelle inconnue : {scale}", param_hint="--scale")
+    if db_url and "bench" not in (make_url(db_url).database or ""):
+        # drop_all/create_all en début de run : jamais sur une base de travail.
+        raise typer.BadParameter("La base doit être dédiée aux benchmarks (nom contenant 'bench').", param_hint="--db-url")
+    default_semesters, default_titles, default_vocabulary, questions, history_articles = SCALES[scale]
+    workdir = tempfile.mkdtemp(prefix="wiki-bench-")
+    # La configuration doit précéder la première lecture des settings (mises en cache, moteur SQL compris).
+    os.environ["WIKI_DB_URL"] = db_url or f"sqlite:///{workdir}/bench.db"
+
+    from wiki_service.config import get_settings
+    from wiki_service.db import get_engine
+    from wiki_service.models import Base
+    from wiki_service.partitions import create_schema
+
+    from .cases import CASES, Context
+
+    settings = get_settings()
+    settings.http_cache_enabled = False
+    engine = get_engine()
+
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        create_schema(conn, [settings.wikimedia_project])
+
+    ctx = Context(
+        periods=periods_for(semesters or default_semesters),
+        per_list=titles or default_titles,
+        vocabulary_size=vocabulary or default_vocabulary,
+        questions=questions,
+        history_articles=history_articles,
+        repeat=repeat,
+        project=settings.wikimedia_project,
+        startup_budget_ms=startup_budget,
+    )
+    selected = [name.strip() for name in only.split(",")] if only else list(CASES)
+    unknown = [name for name in selected if name not in CASES]
+    if unknown:
+        raise typer.BadParameter(f"Cas inconnus : {', '.join(unknown)}", param_hint="--only")
+
+    results = {}
+    for name in CASES:
+        if name not in selected:
+            continue
+        typer.echo(f"{name}...", nl=False)
+        results[name] = CASES[name](ctx)
+        summary = ", ".join(f"{key}={value:.4g}" if isinstance(value, float) else f"{key}={value}"
+                            for key, value in results[name].items())
+        typer.echo(f" {summary}")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "db": engine.dialect.name,
+            "scale": scale,
+            "semesters": len(ctx.periods),
+            "titles_per_list": ctx.per_list,
+            "vocabulary": ctx.vocabulary_size,
+        },
+        "results": results,
+    }
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = RESULTS_DIR / f"{stamp}-{report['meta']['commit'] or 'nogit'}-{scale}.json"
+    output.write_text(json.dumps(report, indent=2))
+    typer.echo(f"Résultats : {output}")
+    if compare_with:
+        compare(report, compare_with)
+    over_budget = [name for name, metrics in results.items() if metrics.get("within_budget") is False]
+    if over_budget:
+        typer.echo(f"Budget dépassé : {', '.join(over_budget)}")
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
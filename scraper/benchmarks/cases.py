@@ -0,0 +1,299 @@
+"""Cas mesurés. Chaque cas reçoit le contexte du run et renvoie un dict de métriques (secondes, débits, latences)."""
+
+from __future__ import annotations
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+import httpx
+from sqlalchemy import func, select
+
+import wiki_service
+from wiki_service.db import get_session
+from wiki_service.exporter import export
+from wiki_service.generation_engine import GenerationEngine
+from wiki_service.history import backfill_stats
+from wiki_service.importer import store_top
+from wiki_service.ingestion import ingest_semester
+from wiki_service.models import Article, ArticleSemesterStat, Theme
+from wiki_service.periods import semester_dates
+from wiki_service.question_builder import build_question
+from wiki_service.question_server import load_index
+from wiki_service.theme_classifier import ThemeClassifier
+from wiki_service.themes import THEMES
+from wiki_service.top_aggregate import SemesterTopAggregate
+from wiki_service.titles import TitleResolver
+from wiki_service.top_views_fetcher import TopViewsFetcher
+from wiki_service.wiki_page_client import WikiPageClient
+from wiki_service.wikimedia_client import WikimediaClient
+
+from .payloads import vocabulary, wikimedia_handler
+
+
+@dataclass
+class Context:
+    periods: List[tuple[int, str]]
+    per_list: int
+    vocabulary_size: int
+    questions: int
+    history_articles: int
+    repeat: int
+    project: str = "fr.wikipedia"
+    startup_budget_ms: float = 400.0
+    titles: List[str] = field(default_factory=list)
+    aggregates: Dict[tuple[int, str], SemesterTopAggregate] = field(default_factory=dict)
+
+    def transport(self) -> httpx.MockTransport:
+        if not self.titles:
+            self.titles = vocabulary(self.vocabulary_size)
+        return httpx.MockTransport(wikimedia_handler(self.titles, self.per_list))
+
+    def resolver(self) -> TitleResolver:
+        """Résolution des titres servie par le mock (cache title_resolutions partagé entre les cas)."""
+        return TitleResolver(self.project, client=WikiPageClient(project=self.project, async_transport=self.transport()))
+
+
+def timed(fn: Callable[[], object]) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def best_of(repeat: int, fn: Callable[[], object]) -> tuple[float, object]:
+    runs = [timed(fn) for _ in range(max(1, repeat))]
+    return min(seconds for seconds, _ in runs), runs[-1][1]
+
+
+def latencies(samples: Sequence[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+# Modules lourds qui ne doivent pas être chargés par `import wiki_service.cli` (chargés par les commandes).
+HEAVY_MODULES = ("sqlalchemy", "httpx", "numpy", "pydantic_settings", "tabulate")
+
+
+def cli_startup(ctx: Context) -> dict:
+    """
+    Démarrage à froid de la CLI (`--help`, argument invalide) dans un process neuf, base injoignable :
+    médiane comparée au budget, et liste des modules lourds chargés dès l'import.
+    """
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.path.dirname(os.path.dirname(wiki_service.__file__)),
+        "WIKI_DB_URL": "postgresql+psycopg2://bench@invalid.invalid:1/bench",
+    }
+
+    def median_ms(*args: str) -> float:
+        runs = []
+        for _ in range(max(5, ctx.repeat)):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, *args], env=env, capture_output=True, check=False)
+            runs.append(time.perf_counter() - started)
+        return statistics.median(runs) * 1000
+
+    probe = f"import sys, wiki_service.cli; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    heavy = subprocess.run(
+        [sys.executable, "-c", probe], env=env, capture_output=True, text=True, check=True
+    ).stdout.strip()
+    results = {
+        "python_ms": median_ms("-c", "pass"),
+        "help_ms": median_ms("-m", "wiki_service.cli", "--help"),
+        "bad_argument_ms": median_ms("-m", "wiki_service.cli", "import-range", "--bogus"),
+        "heavy_imports": heavy or "-",
+        "budget_ms": ctx.startup_budget_ms,
+    }
+    results["within_budget"] = (
+        not heavy and max(results["help_ms"], results["bad_argument_ms"]) <= ctx.startup_budget_ms
+    )
+    return results
+
+
+def top_fetch(ctx: Context) -> dict:
+    """Téléchargement (mock) + parsing incrémental + agrégation des tops de toutes les périodes."""
+    fetcher = TopViewsFetcher(project=ctx.project, transport=ctx.transport())
+    seconds, aggregates = best_of(ctx.repeat, lambda: fetcher.fetch_semesters_aggregate(ctx.periods))
+    ctx.aggregates = aggregates
+    records = len(ctx.periods) * 6 * ctx.per_list
+    return {"seconds": seconds, "records": records, "records_per_s": records / seconds}
+
+
+def theme_match(ctx: Context) -> dict:
+    """Classement par thème des titres agrégés (ThemeClassifier, comme import_top)."""
+    titles = [title for aggregate in ctx.aggregates.values() for title in aggregate.titles]
+
+    def run() -> int:
+        # Nouveau classifieur à chaque passe : le cache de mémo ne fausse pas la mesure.
+        classification = ThemeClassifier(THEMES).classify_indices(titles)
+        return sum(len(indices) for indices in classification.values())
+
+    seconds, matches = best_of(ctx.repeat, run)
+    return {"seconds": seconds, "titles": len(titles), "matches": matches, "titles_per_s": len(titles) / seconds}
+
+
+def db_write(ctx: Context) -> dict:
+    """store_top sur toutes les périodes : redirections résolues, articles, liens thème et stats écrits en masse."""
+    resolver = ctx.resolver()
+
+    def run() -> None:
+        for (year, semester), aggregate in ctx.aggregates.items():
+            store_top(year, semester, 500, aggregate, project=ctx.project, echo=lambda _: None, resolver=resolver)
+
+    seconds, _ = timed(run)
+    with get_session() as session:
+        articles = session.scalar(select(func.count()).select_from(Article))
+        stats = session.scalar(select(func.count()).select_from(ArticleSemesterStat))
+    return {"seconds": seconds, "articles": articles, "stats": stats, "stats_per_s": stats / seconds}
+
+
+def build_question_latency(ctx: Context) -> dict:
+    """build_question sur stats en base (sans réseau) ; chaque question est annulée via un savepoint."""
+    samples = []
+    with get_session() as session:
+        themes = [theme.name for theme in session.scalars(select(Theme).order_by(Theme.id))]
+        for index in range(ctx.questions):
+            year, semester = ctx.periods[index % len(ctx.periods)]
+            savepoint = session.begin_nested()
+            started = time.perf_counter()
+            try:
+                build_question(session, themes[index % len(themes)], year, semester)
+            except ValueError:
+                pass
+            samples.append(time.perf_counter() - started)
+            savepoint.rollback()
+        session.rollback()
+    return {"calls": len(samples), **latencies(samples)}
+
+
+def generate_range(ctx: Context) -> dict:
+    """generate-range de bout en bout (tous thèmes x périodes, stats en base)."""
+    engine = GenerationEngine(allow_fetch=False, project=ctx.project, echo=lambda _: None)
+    jobs = engine.plan([theme["name"] for theme in THEMES], ctx.periods)
+    seconds, report = timed(lambda: engine.run(jobs))
+    return {
+        "seconds": seconds,
+        "jobs": len(jobs),
+        "generated": report.generated,
+        "skipped": sum(report.skipped.values()),
+        "jobs_per_s": len(jobs) / seconds,
+    }
+
+
+def question_serving(ctx: Context) -> dict:
+    """Index en mémoire de `serve` : chargement depuis questions / question_articles puis tirages filtrés."""
+    load_seconds, index = timed(lambda: load_index(ctx.project))
+    themes = [theme["name"] for theme in THEMES]
+    filters = [(None, None, None)] + [
+        (themes[position % len(themes)], year, semester) for position, (year, semester) in enumerate(ctx.periods)
+    ]
+    filters += [(theme, None, None) for theme in themes]
+    samples = []
+    found = 0
+    for position in range(ctx.questions * 100):
+        started = time.perf_counter()
+        found += index.pick(*filters[position % len(filters)]) is not None
+        samples.append(time.perf_counter() - started)
+    ordered = sorted(samples)
+    return {
+        "load_seconds": load_seconds,
+        "questions": len(index),
+        "lookups": len(samples),
+        "hits": found,
+        "p50_us": ordered[len(ordered) // 2] * 1e6,
+        "p99_us": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6,
+    }
+
+
+def incremental_ingest(ctx: Context) -> dict:
+    """
+    import-incremental sur le semestre suivant la plage : premier run à mi-semestre (tops mensuels + quotidiens),
+    puis run de cron du lendemain (un seul top quotidien, séries prolongées en place).
+    """
+    year, semester = ctx.periods[-1]
+    year, semester = (year, "S2") if semester == "S1" else (year + 1, "S1")
+    today = semester_dates(year, semester)[0] + timedelta(days=45)
+    requests = []
+    handler = ctx.transport().handler
+
+    def counting(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        return handler(request)
+
+    fetcher = TopViewsFetcher(project=ctx.project, transport=httpx.MockTransport(counting))
+    resolver = ctx.resolver()
+
+    def run(day) -> tuple[float, object, int]:
+        requests.clear()
+        seconds, report = timed(
+            lambda: ingest_semester(
+                year, semester, 500, ctx.project, fetcher=fetcher, today=day, echo=lambda _: None, resolver=resolver
+            )
+        )
+        return seconds, report, len(requests)
+
+    first_seconds, first, first_requests = run(today)
+    daily_seconds, daily, daily_requests = run(today + timedelta(days=1))
+    return {
+        "first_seconds": first_seconds,
+        "first_requests": first_requests,
+        "seconds": daily_seconds,
+        "requests": daily_requests,
+        "appended": daily.appended,
+        "inserted": daily.inserted,
+    }
+
+
+def history_backfill(ctx: Context) -> dict:
+    """backfill-stats : un historique quotidien (mock) par article, découpé en semestres et écrit en lot."""
+    with get_session() as session:
+        articles = [
+            (row.id, row.slug)
+            for row in session.execute(select(Article.id, Article.slug).order_by(Article.id).limit(ctx.history_articles))
+        ]
+    client = WikimediaClient(project=ctx.project, transport=ctx.transport())
+    seconds, report = timed(
+        lambda: backfill_stats(articles, ctx.periods, client=client, refresh=True, echo=lambda _: None)
+    )
+    return {
+        "seconds": seconds,
+        "articles": report.articles,
+        "stats": report.stats_written,
+        "articles_per_s": report.articles / seconds if seconds else 0.0,
+    }
+
+
+def stats_export(ctx: Context) -> dict:
+    """export des stats (séries décodées) en CSV, lot par lot : pas de dépendance à pyarrow."""
+    with tempfile.TemporaryDirectory(prefix="wiki-export-") as directory:
+        seconds, report = timed(
+            lambda: export(["stats"], Path(directory), fmt="csv", batch_size=1000, echo=lambda _: None)
+        )
+    rows = report.results[0].rows
+    return {"seconds": seconds, "rows": rows, "rows_per_s": rows / seconds if seconds else 0.0}
+
+
+# Ordre d'exécution : chaque cas s'appuie sur les données produites par les précédents (cli_startup est autonome).
+CASES: Dict[str, Callable[[Context], dict]] = {
+    "cli_startup": cli_startup,
+    "top_fetch": top_fetch,
+    "theme_match": theme_match,
+    "db_write": db_write,
+    "build_question": build_question_latency,
+    "generate_range": generate_range,
+    "question_serving": question_serving,
+    "incremental_ingest": incremental_ingest,
+    "history_backfill": history_backfill,
+    "stats_export": stats_export,
+}
@@ -0,0 +1,125 @@
+"""
+Réponses Wikimedia synthétiques (tops mensuels et quotidiens, séries par article, résolution des titres) servies
+via httpx.MockTransport.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import re
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+import httpx
+
+from wiki_service.themes import THEMES
+
+_TOP_RE = re.compile(r"/pageviews/top/([^/]+)/[^/]+/(\d{4})/(\d{2})/(all-days|\d{2})$")
+_DAILY_RE = re.compile(r"/per-article/[^/]+/[^/]+/[^/]+/([^/]+)/daily/(\d{8})\d*/(\d{8})\d*$")
+
+
+def vocabulary(size: int, seed: int = 0) -> List[str]:
+    """
+    Titres d'articles : environ un tiers contient un mot-clé de thème (pour que le classement ait du travail),
+    le reste est neutre, comme dans les vrais tops.
+    """
+    rng = random.Random(seed)
+    keywords = [keyword for theme in THEMES for keyword in theme.get("keywords", [])]
+    titles = []
+    for index in range(size):
+        if keywords and rng.random() < 0.35:
+            keyword = rng.choice(keywords).strip().replace(" ", "_").capitalize()
+            titles.append(f"{keyword}_{index}")
+        else:
+            titles.append(f"Article_{index}")
+    return titles
+
+
+def top_month_payload(
+    project: str, year: int, month: int, titles: List[str], per_list: int, day: str = "all-days"
+) -> bytes:
+    """Corps d'une réponse `pageviews/top/.../all-days` (ou d'un jour) : `per_list` articles tirés du vocabulaire."""
+    rng = random.Random(f"{year}-{month}-{day}")
+    chosen = rng.sample(titles, min(per_list, len(titles)))
+    views = sorted((int(rng.paretovariate(1.2) * 1000) for _ in chosen), reverse=True)
+    articles = [
+        {"article": title, "views": count, "rank": rank}
+        for rank, (title, count) in enumerate(zip(chosen, views), start=1)
+    ]
+    item = {
+        "project": project,
+        "access": "all-access",
+        "year": f"{year}",
+        "month": f"{month:02d}",
+        "day": day,
+        "articles": articles,
+    }
+    return json.dumps({"items": [item]}).encode()
+
+
+def daily_payload(slug: str, start: date, end: date) -> bytes:
+    rng = random.Random(slug)
+    base = rng.randint(10, 50_000)
+    items = []
+    day = start
+    while day <= end:
+        items.append({"timestamp": day.strftime("%Y%m%d00"), "views": max(0, int(base * rng.uniform(0.5, 1.5)))})
+        day += timedelta(days=1)
+    return json.dumps({"items": items}).encode()
+
+
+def query_payload(requested: List[str], positions: Dict[str, int], titles: List[str]) -> bytes:
+    """
+    Corps d'une réponse `action=query&redirects=1` : un titre du vocabulaire sur 25 redirige vers le précédent,
+    les titres inconnus sont des pages absentes.
+    """
+    normalized, redirects, pages = [], [], {}
+    for title in requested:
+        spaced = title.replace("_", " ")
+        if spaced != title:
+            normalized.append({"from": title, "to": spaced})
+        position = positions.get(title)
+        if position is None:
+            pages[spaced] = {"title": spaced, "missing": True}
+            continue
+        if position % 25 == 7:
+            position -= 1
+            redirects.append({"from": spaced, "to": titles[position].replace("_", " ")})
+        target = titles[position].replace("_", " ")
+        pages[target] = {"pageid": position + 1, "ns": 0, "title": target}
+    query = {"normalized": normalized, "redirects": redirects, "pages": list(pages.values())}
+    return json.dumps({"batchcomplete": True, "query": query}).encode()
+
+
+def wikimedia_handler(titles: List[str], per_list: int) -> Callable[[httpx.Request], httpx.Response]:
+    """
+    Handler MockTransport : tops mensuels / quotidiens et séries par article, générés une fois puis resservis,
+    et résolution des titres (api.php).
+    """
+    cache: dict[str, bytes] = {}
+    positions = {title: position for position, title in enumerate(titles)}
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/api.php"):
+            requested = request.url.params.get("titles", "").split("|")
+            body = query_payload(requested, positions, titles)
+            return httpx.Response(200, content=body, headers={"content-type": "application/json"})
+        body = cache.get(path)
+        if body is None:
+            top = _TOP_RE.search(path)
+            daily = _DAILY_RE.search(path)
+            if top:
+                project, year, month = top.group(1), int(top.group(2)), int(top.group(3))
+                body = top_month_payload(project, year, month, titles, per_list, day=top.group(4))
+            elif daily:
+                start = date(int(daily.group(2)[:4]), int(daily.group(2)[4:6]), int(daily.group(2)[6:8]))
+                end = date(int(daily.group(3)[:4]), int(daily.group(3)[4:6]), int(daily.group(3)[6:8]))
+                body = daily_payload(daily.group(1), start, end)
+            else:
+                return httpx.Response(404)
+            cache[path] = body
+        return httpx.Response(200, content=body, headers={"content-type": "application/json"})
+
+    return handle
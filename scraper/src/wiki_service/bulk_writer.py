@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Mapping, Optional, Sequence, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .models import Article, ArticleSemesterStat, ArticleTheme
+
+T = TypeVar("T")
+
+
+def chunked(items: Sequence[T], size: int) -> Iterator[Sequence[T]]:
+    size = max(1, size)
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def dialect_insert(session: Session, model):
+    """INSERT du dialecte courant, pour disposer de ON CONFLICT (PostgreSQL, SQLite pour les tests locaux)."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upsert non supporté pour le dialecte {dialect}.")
+    return insert(model.__table__)
+
+
+def _batch_size(batch_size: Optional[int]) -> int:
+    return batch_size or get_settings().batch_size
+
+
+def upsert_articles(
+    session: Session,
+    titles: Iterable[str],
+    project: str,
+    batch_size: Optional[int] = None,
+    page_ids: Optional[Mapping[str, int]] = None,
+) -> dict[str, int]:
+    """
+    Insère les articles manquants en masse et retourne {slug: article_id} pour tous les titres.
+    Les nouveaux articles reçoivent leur page_id quand il est connu (résolution des titres, voir titles.py).
+
+    ON CONFLICT DO NOTHING rend l'insertion sûre face à un import concurrent ; les lignes déjà présentes
+    (ou insérées entre-temps par un autre processus) sont relues en une requête par lot.
+    """
+    rows: dict[str, dict] = {}
+    for title in titles:
+        slug = title.replace(" ", "_")
+        rows.setdefault(
+            slug, {"project": project, "slug": slug, "title": title, "page_id": (page_ids or {}).get(slug)}
+        )
+
+    ids: dict[str, int] = {}
+    for chunk in chunked(list(rows.values()), _batch_size(batch_size)):
+        stmt = (
+            dialect_insert(session, Article)
+            .values(list(chunk))
+            .on_conflict_do_nothing(index_elements=["project", "slug"])
+            .returning(Article.id, Article.slug)
+        )
+        ids.update({slug: article_id for article_id, slug in session.execute(stmt)})
+        missing = [row["slug"] for row in chunk if row["slug"] not in ids]
+        if missing:
+            existing = session.execute(
+                select(Article.id, Article.slug).where(Article.project == project, Article.slug.in_(missing))
+            )
+            ids.update({slug: article_id for article_id, slug in existing})
+    return ids
+
+
+def link_articles_theme(
+    session: Session,
+    article_ids: Iterable[int],
+    theme_id: int,
+    batch_size: Optional[int] = None,
+) -> None:
+    rows = [{"article_id": article_id, "theme_id": theme_id} for article_id in dict.fromkeys(article_ids)]
+    for chunk in chunked(rows, _batch_size(batch_size)):
+        session.execute(
+            dialect_insert(session, ArticleTheme)
+            .values(list(chunk))
+            .on_conflict_do_nothing(index_elements=["article_id", "theme_id"])
+        )
+
+
+def insert_semester_stats(
+    session: Session,
+    rows: Sequence[dict],
+    batch_size: Optional[int] = None,
+) -> None:
+    """
+    Insère les stats manquantes (project, article_id, year, semester, views_total, views_avg_daily, series_start,
+    series_data).
+
+    Comme upsert_semester_stat_from_series, une stat déjà présente pour le semestre n'est pas modifiée.
+    """
+    for chunk in chunked(rows, _batch_size(batch_size)):
+        session.execute(
+            dialect_insert(session, ArticleSemesterStat)
+            .values(list(chunk))
+            .on_conflict_do_nothing(index_elements=["project", "article_id", "year", "semester"])
+        )
+
+
+def upsert_semester_stats(
+    session: Session,
+    rows: Sequence[dict],
+    batch_size: Optional[int] = None,
+) -> None:
+    """Comme insert_semester_stats, mais remplace les stats existantes (recalcul depuis l'historique complet)."""
+    columns = ("views_total", "views_avg_daily", "series", "series_start", "series_data")
+    for chunk in chunked(rows, _batch_size(batch_size)):
+        stmt = dialect_insert(session, ArticleSemesterStat).values(list(chunk))
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["project", "article_id", "year", "semester"],
+                set_={**{column: stmt.excluded[column] for column in columns}, "updated_at": datetime.now(timezone.utc)},
+            )
+        )
@@ -2,33 +2,122 @@ from __future__ import annotations
 
 import csv
 import os
-from datetime import date
+import sys
+from datetime import date, timedelta
 from typing import Annotated
 from pathlib import Path
 from typing import Optional
 
 import typer
-import httpx
-from tabulate import tabulate
-from sqlalchemy import text
-
-from .config import get_settings
-from .db import Base, engine, get_session
-from .models import Article, ArticleSemesterStat, ArticleTheme, Question, Theme
-from .question_builder import (
-    QuestionPayload,
-    build_question,
-    ensure_semester_stat,
-    ensure_article,
-    ensure_theme,
-    link_article_theme,
-    upsert_semester_stat_from_series,
-)
+
 from .themes import THEMES
-from .top_views_fetcher import TopViewsFetcher
+
+# Démarrage rapide (cron, make, --help) : seuls typer et la liste des thèmes sont chargés à l'import.
+# Chaque commande importe ce dont elle a besoin ; configuration et moteur SQL sont lus à la première utilisation.
 
 app = typer.Typer(help="Service data Wikipédia - génération de questions basées sur les pageviews.")
-settings = get_settings()
+
+
+@app.callback()
+def main_options(
+    ctx: typer.Context,
+    offline: Annotated[
+        bool, typer.Option("--offline", help="Sert uniquement depuis le cache HTTP, sans accès réseau")
+    ] = False,
+    metrics: Annotated[
+        bool, typer.Option("--metrics", help="Temps par étape, compteurs HTTP et SQL (N+1) affichés en fin de commande")
+    ] = False,
+    metrics_json: Annotated[
+        Optional[Path], typer.Option("--metrics-json", help="Écrit aussi les mesures en JSON (active --metrics)")
+    ] = None,
+    metrics_prom: Annotated[
+        Optional[Path],
+        typer.Option("--metrics-prom", help="Écrit aussi les mesures au format textfile Prometheus (active --metrics)"),
+    ] = None,
+    profile: Annotated[
+        Optional[Path], typer.Option("--profile", help="Dump cProfile de la commande (tous threads, dont http-loop)")
+    ] = None,
+) -> None:
+    """Service data Wikipédia - génération de questions basées sur les pageviews."""
+    if offline:
+        from .config import get_settings
+
+        get_settings().offline = True
+    # Fermetures exécutées en ordre inverse : le profil s'arrête en dernier, les mesures après les transports.
+    if profile:
+        from .metrics import start_profile, stop_profile
+
+        profiler = start_profile()
+        ctx.call_on_close(lambda: stop_profile(profiler, profile, echo=typer.echo))
+    if metrics or metrics_json or metrics_prom:
+        from .db import get_engine
+        from .metrics import enable_metrics
+
+        enable_metrics(get_engine()).command = ctx.invoked_subcommand
+        ctx.call_on_close(lambda: report_metrics(metrics_json, metrics_prom))
+    ctx.call_on_close(report_http_cache)
+    ctx.call_on_close(report_http_scheduler)
+    ctx.call_on_close(close_http)
+
+
+def loaded(module: str) -> bool:
+    """Le module a-t-il été importé par la commande ? Sinon rien à rapporter ni à fermer."""
+    return f"{__package__}.{module}" in sys.modules
+
+
+def close_http() -> None:
+    if loaded("http_transport"):
+        from .http_transport import close_http as close
+
+        close()
+
+
+def report_http_cache() -> None:
+    if not loaded("http_cache"):
+        return
+    from .config import get_settings
+    from .http_cache import get_http_cache
+
+    if not get_settings().http_cache_enabled:
+        return
+    stats = get_http_cache().stats
+    if stats.hits or stats.misses:
+        typer.echo(
+            f"Cache HTTP : {stats.hits} hits, {stats.misses} misses, {stats.stores} écritures, "
+            f"{stats.evictions} évictions, {stats.offline_misses} absents hors-ligne."
+        )
+
+
+def report_metrics(json_path: Optional[Path], prom_path: Optional[Path]) -> None:
+    from .metrics import disable_metrics, get_metrics
+
+    collected = get_metrics()
+    if collected is None:
+        return
+    for line in collected.lines():
+        typer.echo(line)
+    if json_path:
+        collected.write_json(json_path)
+        typer.echo(f"Mesures JSON : {json_path}")
+    if prom_path:
+        collected.write_prometheus(prom_path)
+        typer.echo(f"Mesures Prometheus : {prom_path}")
+    disable_metrics()
+
+
+def report_http_scheduler() -> None:
+    if not loaded("http_scheduler"):
+        return
+    from .http_scheduler import get_scheduler
+
+    for host, stats in get_scheduler().summary().items():
+        if stats["retries"] or stats["throttled"] or stats["circuit_opens"]:
+            typer.echo(
+                f"HTTP {host} : {stats['requests']} requêtes, {stats['retries']} retries, "
+                f"{stats['throttled']} limitées (429/503), {stats['server_errors']} erreurs 5xx, "
+                f"{stats['transport_errors']} erreurs réseau, {stats['circuit_opens']} ouvertures du disjoncteur, "
+                f"concurrence finale {stats['concurrency_limit']}, attente {stats['wait_seconds']:.1f}s."
+            )
 
 
 def iter_periods(start_year: int, end_year: int, end_semester_last_year: str = "S1") -> list[tuple[int, str]]:
@@ -41,33 +130,214 @@ def iter_periods(start_year: int, end_year: int, end_semester_last_year: str = "
     return periods
 
 
+def project_list(projects: Optional[str]) -> list[str]:
+    """--projects "fr,en" -> ["fr.wikipedia", "en.wikipedia"] ; sans option, le projet WIKI_PROJECT seul."""
+    from .config import get_settings
+    from .partitions import check_project
+
+    if not projects:
+        return [get_settings().wikimedia_project]
+    names = [p.strip() for p in projects.split(",") if p.strip()]
+    try:
+        return list(dict.fromkeys(check_project(p if "." in p else f"{p}.wikipedia") for p in names))
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc), param_hint="--projects")
+
+
+def prepare_projects(projects: list[str], years: list[int]) -> None:
+    """
+    Avant des écritures parallèles par projet : partitions des projets / années créées (PostgreSQL) et thèmes
+    insérés une fois, pour que les workers ne se disputent ni le DDL ni l'unicité des noms de thèmes.
+    """
+    from .db import get_engine, get_session
+    from .partitions import ensure_partitions
+    from .question_builder import ensure_theme
+
+    with get_engine().begin() as conn:
+        created = ensure_partitions(conn, projects, years)
+    if created:
+        typer.echo(f"{len(created)} partitions créées.")
+    with get_session() as session:
+        for theme_cfg in THEMES:
+            ensure_theme(session, theme_cfg["name"])
+
+
+def for_projects(projects: list[str], task) -> dict:
+    """
+    Exécute task(project, echo) pour chaque projet en parallèle ; {projet: résultat ou exception}.
+    Sous SQLite (un seul écrivain, verrou de base entière) les projets sont enchaînés.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from .db import get_engine
+
+    def run(project: str):
+        echo = (lambda line: typer.echo(f"[{project}] {line}")) if len(projects) > 1 else typer.echo
+        try:
+            return task(project, echo)
+        except Exception as exc:  # noqa: BLE001
+            return exc
+
+    workers = 1 if get_engine().dialect.name == "sqlite" else len(projects)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="project") as pool:
+        return dict(zip(projects, pool.map(run, projects)))
+
+
 @app.command()
 def init_db() -> None:
     """Créer les tables (schema data)."""
+    from .config import get_settings
+    from .db import get_engine
+    from .partitions import create_schema
+
     typer.echo("Création des tables...")
-    Base.metadata.create_all(bind=engine)
+    with get_engine().begin() as conn:
+        create_schema(conn, [get_settings().wikimedia_project])
     typer.echo("OK.")
 
 
 @app.command()
 def upgrade_db() -> None:
-    """Ajoute les colonnes manquantes lors des évolutions du schéma."""
+    """Ajoute les colonnes et index manquants lors des évolutions du schéma (les nouvelles tables via init-db)."""
     statements = [
         "ALTER TABLE articles ADD COLUMN IF NOT EXISTS summary TEXT",
         "ALTER TABLE articles ADD COLUMN IF NOT EXISTS image_url VARCHAR(1024)",
+        "ALTER TABLE article_semester_stats ADD COLUMN IF NOT EXISTS series_start DATE",
+        "ALTER TABLE article_semester_stats ADD COLUMN IF NOT EXISTS series_data BYTEA",
+        "CREATE INDEX IF NOT EXISTS ix_stat_period ON article_semester_stats (year, semester, article_id)",
+        "ALTER TABLE questions DROP CONSTRAINT IF EXISTS uq_question_theme_period",
+        "ALTER TABLE questions ADD COLUMN IF NOT EXISTS difficulty VARCHAR(10)",
+        "ALTER TABLE questions ADD COLUMN IF NOT EXISTS log_gap FLOAT",
+        # Multi-projets : project recopié sur les stats, questions, classements et snapshots (clé de partition).
+        "ALTER TABLE article_semester_stats ADD COLUMN IF NOT EXISTS project VARCHAR(50) NOT NULL "
+        "DEFAULT 'fr.wikipedia'",
+        "UPDATE article_semester_stats s SET project = a.project FROM articles a "
+        "WHERE a.id = s.article_id AND s.project <> a.project",
+        "ALTER TABLE article_semester_stats ALTER COLUMN project DROP DEFAULT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_article_project_semester "
+        "ON article_semester_stats (project, article_id, year, semester)",
+        "ALTER TABLE article_semester_stats DROP CONSTRAINT IF EXISTS uq_article_semester",
+        "ALTER TABLE questions ADD COLUMN IF NOT EXISTS project VARCHAR(50) NOT NULL DEFAULT 'fr.wikipedia'",
+        "UPDATE questions q SET project = a.project FROM question_articles qa JOIN articles a ON a.id = qa.article_id "
+        "WHERE qa.question_id = q.id AND q.project <> a.project",
+        "ALTER TABLE questions ALTER COLUMN project DROP DEFAULT",
+        "DROP INDEX IF EXISTS ix_question_theme_period",
+        "CREATE INDEX IF NOT EXISTS ix_question_project_period ON questions (project, theme_id, year, semester)",
+        "ALTER TABLE question_snapshots ADD COLUMN IF NOT EXISTS project VARCHAR(50) NOT NULL DEFAULT 'fr.wikipedia'",
+        "UPDATE question_snapshots s SET project = q.project FROM questions q "
+        "WHERE q.id = s.question_id AND s.project <> q.project",
+        "ALTER TABLE question_snapshots ALTER COLUMN project DROP DEFAULT",
+        "ALTER TABLE question_snapshots DROP CONSTRAINT IF EXISTS question_snapshots_pkey",
+        "ALTER TABLE question_snapshots ADD CONSTRAINT question_snapshots_pkey PRIMARY KEY (question_id, project)",
+        "ALTER TABLE theme_period_rankings ADD COLUMN IF NOT EXISTS project VARCHAR(50) NOT NULL "
+        "DEFAULT 'fr.wikipedia'",
+        "ALTER TABLE theme_period_rankings ALTER COLUMN project DROP DEFAULT",
+        "ALTER TABLE theme_period_rankings DROP CONSTRAINT IF EXISTS pk_theme_period_rankings",
+        "ALTER TABLE theme_period_rankings ADD CONSTRAINT pk_theme_period_rankings "
+        "PRIMARY KEY (project, theme_id, year, semester, rank)",
+        "ALTER TABLE articles ADD COLUMN IF NOT EXISTS metadata_checked_at TIMESTAMP WITH TIME ZONE",
+        # Articles déjà complets : considérés comme vérifiés, enrich-metadata ne les redemande pas.
+        "UPDATE articles SET metadata_checked_at = updated_at WHERE metadata_checked_at IS NULL "
+        "AND summary IS NOT NULL AND image_url IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS ix_article_metadata_unchecked ON articles (project, id) "
+        "WHERE metadata_checked_at IS NULL",
+        "ALTER TABLE duel_pools ADD COLUMN IF NOT EXISTS project VARCHAR(50) NOT NULL DEFAULT 'fr.wikipedia'",
+        "ALTER TABLE duel_pools ALTER COLUMN project DROP DEFAULT",
+        "ALTER TABLE duel_pools DROP CONSTRAINT IF EXISTS uq_duel_pool_cards",
+        "ALTER TABLE duel_pools ADD CONSTRAINT uq_duel_pool_cards UNIQUE (project, theme_id, year, semester, card_key)",
+        "DROP INDEX IF EXISTS ix_duel_pool_available",
+        "CREATE INDEX ix_duel_pool_available ON duel_pools (project, theme, year, semester, random_key) "
+        "WHERE claimed_at IS NULL",
+        "DROP INDEX IF EXISTS ix_duel_pool_available_any",
+        "CREATE INDEX ix_duel_pool_available_any ON duel_pools (project, random_key) WHERE claimed_at IS NULL",
     ]
-    with engine.begin() as conn:
+    from sqlalchemy import text
+
+    from .db import get_engine
+
+    with get_engine().begin() as conn:
         for stmt in statements:
             conn.execute(text(stmt))
     typer.echo("Migration schema terminée.")
 
 
+@app.command("partition-tables")
+def partition_tables(
+    projects: Annotated[Optional[str], typer.Option("--projects", help="Projets (fr,en,... ou domaines)")] = None,
+    start_year: Annotated[int, typer.Option("--start-year", "-a")] = 2015,
+    end_year: Annotated[int, typer.Option("--end-year", "-b")] = date.today().year,
+) -> None:
+    """
+    PostgreSQL : convertit article_semester_stats (projet puis année) et question_snapshots (projet) en tables
+    partitionnées, puis crée les partitions des projets et années demandés (et de ceux déjà en base).
+    Copie complète sous verrou exclusif : à lancer après upgrade-db, hors des imports. Idempotent.
+    """
+    from .db import get_engine
+    from .partitions import partition_tables as convert
+
+    engine = get_engine()
+    if engine.dialect.name != "postgresql":
+        typer.echo("Partitionnement réservé à PostgreSQL : rien à faire.")
+        return
+    with engine.begin() as conn:
+        changed = convert(conn, project_list(projects), range(start_year, end_year + 1), convert=True)
+    typer.echo(f"Tables partitionnées : {', '.join(changed) or 'déjà à jour'}.")
+
+
+@app.command()
+def migrate_series(
+    batch_size: Annotated[int, typer.Option("--batch-size", help="Lignes converties par transaction")] = 1000,
+) -> None:
+    """Convertit les séries JSON historiques de article_semester_stats vers le format binaire compact."""
+    from sqlalchemy import select, update
+
+    from .db import get_session
+    from .models import ArticleSemesterStat
+    from .series_codec import pack_series
+
+    converted = skipped = 0
+    after_id = 0
+    while True:
+        with get_session() as session:
+            rows = session.execute(
+                select(ArticleSemesterStat.id, ArticleSemesterStat.series)
+                .where(
+                    ArticleSemesterStat.id > after_id,
+                    ArticleSemesterStat.series_data.is_(None),
+                    ArticleSemesterStat.series.is_not(None),
+                )
+                .order_by(ArticleSemesterStat.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                packed = pack_series(row.series or [])
+                if packed is None:
+                    # Séries non datées (ancien agrégat "all-days") : laissées en JSON.
+                    skipped += 1
+                    continue
+                updates.append({"id": row.id, "series_start": packed[0], "series_data": packed[1], "series": None})
+            if updates:
+                session.execute(update(ArticleSemesterStat), updates)
+            converted += len(updates)
+            after_id = rows[-1].id
+        typer.echo(f"{converted} séries converties, {skipped} ignorées (jusqu'à l'id {after_id}).")
+    typer.echo("Migration des séries terminée.")
+
+
 @app.command()
 def seed(
     theme: Annotated[str, typer.Option("--theme", "-t")] = "Général",
     articles_file: Annotated[Optional[Path], typer.Option("--articles-file", "-f")] = None,
 ) -> None:
     """Seed d'un thème + quelques articles (titres FR)."""
+    from .config import get_settings
+    from .db import get_session
+    from .models import Article, ArticleTheme, Theme
+
+    settings = get_settings()
     rows: list[str] = []
     if articles_file and articles_file.exists():
         with articles_file.open() as f:
@@ -113,12 +383,14 @@ def compute_stat(
     semester: Annotated[str, typer.Option("--semester", "-s", help="S1 ou S2")] = "S1",
 ) -> None:
     """Calcule et stocke les stats pageviews d'un article pour un semestre."""
-    from .question_builder import ensure_article, ensure_theme
+    from .config import get_settings
+    from .db import get_session
+    from .question_builder import ensure_article, ensure_semester_stat, ensure_theme, link_article_theme
     from .wikimedia_client import WikimediaClient
 
     with get_session() as session:
         theme = ensure_theme(session, "Général")
-        article = ensure_article(session, title, project=settings.wikimedia_project)
+        article = ensure_article(session, title, project=get_settings().wikimedia_project)
         link_article_theme(session, article, theme)
         client = WikimediaClient()
         stat = ensure_semester_stat(session, article, year, semester, client)
@@ -131,8 +403,14 @@ def generate_question(
     year: Annotated[int, typer.Option("--year", "-y")] = date.today().year,
     semester: Annotated[str, typer.Option("--semester", "-s")] = "S1",
     articles: Annotated[Optional[str], typer.Option(help="Liste de titres séparés par des virgules")] = None,
+    fetch_missing: Annotated[
+        bool, typer.Option("--fetch-missing", help="Autorise la récupération réseau des stats manquantes")
+    ] = False,
 ) -> None:
     """Génère une question (4 articles) pour un thème/semestre."""
+    from .db import get_session
+    from .question_builder import QuestionPayload, build_question
+
     articles_list = [a.strip() for a in articles.split(",")] if articles else None
     with get_session() as session:
         payload: QuestionPayload = build_question(
@@ -141,6 +419,8 @@ def generate_question(
             year=year,
             semester=semester,
             articles=articles_list,
+            # Des titres imposés n'ont en général pas encore de stats : le réseau est alors autorisé.
+            allow_fetch=fetch_missing or bool(articles_list),
         )
         typer.echo(
             f"Question #{payload.id} - thème {payload.theme} {payload.year}-{payload.semester} avec {payload.articles}"
@@ -150,6 +430,11 @@ def generate_question(
 @app.command()
 def list_questions(limit: int = typer.Option(10, "-n")) -> None:
     """Liste les dernières questions générées."""
+    from tabulate import tabulate
+
+    from .db import get_session
+    from .models import Question
+
     with get_session() as session:
         qs = session.query(Question).order_by(Question.created_at.desc()).limit(limit).all()
         table = []
@@ -172,12 +457,24 @@ def generate_range(
     end_year: Annotated[int, typer.Option("--end-year", "-b")] = 2025,
     end_semester_last_year: Annotated[str, typer.Option("--end-semester-last-year", "-e")] = "S1",
     themes: Annotated[Optional[str], typer.Option(help="Liste de thèmes séparés par des virgules, sinon tous")] = None,
+    fetch_missing: Annotated[
+        bool, typer.Option("--fetch-missing", help="Autorise la récupération réseau des stats manquantes")
+    ] = False,
+    workers: Annotated[Optional[int], typer.Option("--workers", "-w", help="Téléchargements parallèles")] = None,
+    projects: Annotated[
+        Optional[str], typer.Option("--projects", help="Projets en parallèle (fr,en,de,... ; défaut WIKI_PROJECT)")
+    ] = None,
 ) -> None:
     """
     Génère des questions pour chaque thème/semestre sur la plage d'années.
-    Utilise les articles déjà importés ; saute quand il n'y a pas assez d'articles.
+    Utilise les articles déjà importés ayant une stat sur la période (sans réseau, sauf --fetch-missing) ;
+    saute quand il n'y a pas assez d'articles. Chaque question est écrite dans son propre savepoint
+    et un résumé (générées, sautées par raison, appels API, durée) est affiché à la fin.
     Les bornes peuvent aussi être pilotées via START_YEAR, END_YEAR, END_SEM_LAST.
+    Avec plusieurs --projects, chaque projet est généré en parallèle à partir de ses seuls articles et stats.
     """
+    from .generation_engine import GenerationEngine
+
     start_year = int(os.getenv("START_YEAR", start_year))
     end_year = int(os.getenv("END_YEAR", end_year))
     end_semester_last_year = os.getenv("END_SEM_LAST", end_semester_last_year)
@@ -185,23 +482,174 @@ def generate_range(
     theme_names = [t["name"] for t in THEMES] if not themes else [t.strip() for t in themes.split(",") if t.strip()]
     periods = iter_periods(start_year, end_year, end_semester_last_year)
 
+    names = project_list(projects)
+    prepare_projects(names, sorted({year for year, _ in periods}))
+
+    def run(project: str, echo):
+        generator = GenerationEngine(workers=workers, allow_fetch=fetch_missing, project=project, echo=echo)
+        report = generator.run(generator.plan(theme_names, periods))
+        for line in report.lines():
+            echo(line)
+
+    failed = {project: exc for project, exc in for_projects(names, run).items() if isinstance(exc, BaseException)}
+    for project, exc in failed.items():
+        typer.echo(f"Génération {project} interrompue : {exc}")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command("backfill-stats")
+def backfill_stats(
+    start_year: Annotated[int, typer.Option("--start-year", "-a")] = 2016,
+    end_year: Annotated[int, typer.Option("--end-year", "-b")] = 2025,
+    end_semester_last_year: Annotated[str, typer.Option("--end-semester-last-year", "-e")] = "S1",
+    themes: Annotated[Optional[str], typer.Option(help="Limiter aux articles de ces thèmes (virgules)")] = None,
+    limit: Annotated[Optional[int], typer.Option("--limit", "-n", help="Nombre max d'articles")] = None,
+    refresh: Annotated[bool, typer.Option("--refresh", help="Recalcule aussi les stats déjà présentes")] = False,
+    workers: Annotated[Optional[int], typer.Option("--workers", "-w", help="Téléchargements parallèles")] = None,
+) -> None:
+    """
+    Remplit les stats semestrielles des articles importés : une requête d'historique complet par article
+    (au lieu d'une par article et par semestre), découpée en S1/S2 puis écrite en lot.
+    """
+    from sqlalchemy import select
+
+    from . import history
+    from .config import get_settings
+    from .db import get_session
+    from .models import Article, ArticleTheme, Theme
+
+    periods = iter_periods(start_year, end_year, end_semester_last_year)
+    with get_session() as session:
+        stmt = select(Article.id, Article.slug).where(Article.project == get_settings().wikimedia_project)
+        if themes:
+            names = [t.strip() for t in themes.split(",") if t.strip()]
+            stmt = (
+                stmt.join(ArticleTheme, ArticleTheme.article_id == Article.id)
+                .join(Theme, Theme.id == ArticleTheme.theme_id)
+                .where(Theme.name.in_(names))
+                .distinct()
+            )
+        stmt = stmt.order_by(Article.id)
+        if limit:
+            stmt = stmt.limit(limit)
+        articles = [(row.id, row.slug) for row in session.execute(stmt)]
+    prepare_projects([get_settings().wikimedia_project], sorted({year for year, _ in periods}))
+    report = history.backfill_stats(
+        articles, periods, workers=workers, refresh=refresh, echo=typer.echo
+    )
+    for line in report.lines():
+        typer.echo(line)
+
+
+@app.command("generate-bank")
+def generate_bank(
+    start_year: Annotated[int, typer.Option("--start-year", "-a")] = 2015,
+    end_year: Annotated[int, typer.Option("--end-year", "-b")] = 2025,
+    end_semester_last_year: Annotated[str, typer.Option("--end-semester-last-year", "-e")] = "S1",
+    themes: Annotated[Optional[str], typer.Option(help="Liste de thèmes séparés par des virgules, sinon tous")] = None,
+    per_period: Annotated[
+        Optional[int], typer.Option("--per-period", "-n", help="Taille visée de la banque par thème/semestre")
+    ] = None,
+    mix: Annotated[
+        Optional[str], typer.Option("--mix", help="Poids par difficulté, ex. easy:1,medium:2,hard:1")
+    ] = None,
+    candidates: Annotated[
+        Optional[int], typer.Option("--candidates", help="Quartets candidats évalués par thème/semestre")
+    ] = None,
+    seed: Annotated[Optional[int], typer.Option("--seed", help="Graine aléatoire (reproductible)")] = None,
+) -> None:
+    """
+    Génère une banque de questions par thème/semestre, calibrée en difficulté (easy / medium / hard selon le plus
+    petit écart de log(vues/jour) entre deux articles). Les quartets candidats sont évalués en bloc avec numpy,
+    aucun article n'est réutilisé dans une même période et seules les stats déjà en base sont utilisées.
+    """
+    from . import question_bank
+    from .db import get_session
+
+    theme_names = [t["name"] for t in THEMES] if not themes else [t.strip() for t in themes.split(",") if t.strip()]
+    periods = iter_periods(start_year, end_year, end_semester_last_year)
+    try:
+        weights = question_bank.parse_mix(mix)
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc), param_hint="--mix")
+    with get_session() as session:
+        report = question_bank.generate_bank(
+            session,
+            theme_names,
+            periods,
+            per_period=per_period,
+            mix=weights,
+            candidates=candidates,
+            seed=seed,
+            echo=typer.echo,
+        )
+    for line in report.lines():
+        typer.echo(line)
+
+
+@app.command("generate-duel-pools")
+def generate_duel_pools(
+    start_year: Annotated[int, typer.Option("--start-year", "-a")] = 2015,
+    end_year: Annotated[int, typer.Option("--end-year", "-b")] = 2025,
+    end_semester_last_year: Annotated[str, typer.Option("--end-semester-last-year", "-e")] = "S1",
+    themes: Annotated[Optional[str], typer.Option(help="Liste de thèmes séparés par des virgules, sinon tous")] = None,
+    per_period: Annotated[
+        Optional[int], typer.Option("--per-period", "-n", help="Pools libres visés par thème/semestre")
+    ] = None,
+    top: Annotated[Optional[int], typer.Option("--top", help="Taille du top dans lequel les cartes sont tirées")] = None,
+    seed: Annotated[Optional[int], typer.Option("--seed", help="Graine aléatoire (reproductible)")] = None,
+    project: Annotated[Optional[str], typer.Option("--project", help="Projet (fr, en... ou domaine)")] = None,
+) -> None:
+    """
+    Pré-calcule des pools distincts de 10 cartes (mode duel) par thème/semestre, tirés dans le top des articles
+    par vues moyennes/jour. Chaque carte embarque titre, url, image, extrait, stats, rang et tier.
+    """
+    from . import duel_pools
+    from .db import get_session
+
+    theme_names = [t["name"] for t in THEMES] if not themes else [t.strip() for t in themes.split(",") if t.strip()]
+    periods = iter_periods(start_year, end_year, end_semester_last_year)
+    try:
+        project = project_list(project)[0]
+    except typer.BadParameter as exc:
+        raise typer.BadParameter(exc.message, param_hint="--project")
     with get_session() as session:
-        for year, sem in periods:
-            for theme_name in theme_names:
-                try:
-                    payload: QuestionPayload = build_question(
-                        session=session,
-                        theme_name=theme_name,
-                        year=year,
-                        semester=sem,
-                        articles=None,
-                    )
-                    typer.echo(f"OK question {payload.id} {theme_name} {year}-{sem}")
-                except httpx.HTTPStatusError as exc:
-                    typer.echo(f"Skip {theme_name} {year}-{sem}: HTTP {exc.response.status_code} {exc.request.url}")
-                except Exception as exc:  # noqa: BLE001
-                    typer.echo(f"Skip {theme_name} {year}-{sem}: {exc}")
+        report = duel_pools.generate_duel_pools(
+            session, theme_names, periods, per_period=per_period, top=top, seed=seed, project=project, echo=typer.echo
+        )
+    for line in report.lines():
+        typer.echo(line)
+
+
+@app.command("claim-duel-pool")
+def claim_duel_pool(
+    theme: Annotated[Optional[str], typer.Option("--theme", "-t")] = None,
+    year: Annotated[Optional[int], typer.Option("--year", "-y")] = None,
+    semester: Annotated[Optional[str], typer.Option("--semester", "-s")] = None,
+    claimed_by: Annotated[Optional[str], typer.Option("--claimed-by", help="Identifiant de la room")] = None,
+    project: Annotated[Optional[str], typer.Option("--project", help="Projet (fr, en... ou domaine)")] = None,
+) -> None:
+    """Réserve un pool de duel libre (jamais attribué deux fois) et affiche ses cartes."""
+    from tabulate import tabulate
 
+    from . import duel_pools
+    from .db import get_session
+
+    try:
+        project = project_list(project)[0]
+    except typer.BadParameter as exc:
+        raise typer.BadParameter(exc.message, param_hint="--project")
+    with get_session() as session:
+        pool = duel_pools.claim_duel_pool(
+            session, theme=theme, year=year, semester=semester, claimed_by=claimed_by, project=project
+        )
+        if pool is None:
+            typer.echo("Aucun pool libre pour ces critères.")
+            raise typer.Exit(code=1)
+        typer.echo(f"Pool {pool.id} : {pool.theme} {pool.year}-{pool.semester}")
+        rows = [[c["position"], c["title"], c["tier"], round(c["views_avg_daily"], 1)] for c in pool.cards]
+    typer.echo(tabulate(rows, headers=["#", "Article", "Tier", "Vues/jour"]))
 
 
 @app.command()
@@ -209,51 +657,39 @@ def import_top(
     year: Annotated[int, typer.Option("--year", "-y")] = date.today().year,
     semester: Annotated[str, typer.Option("--semester", "-s")] = "S1",
     limit: Annotated[int, typer.Option("--limit", "-n", help="Nombre max d'articles par thème")] = 500,
+    projects: Annotated[
+        Optional[str], typer.Option("--projects", help="Projets en parallèle (fr,en,de,... ; défaut WIKI_PROJECT)")
+    ] = None,
 ) -> None:
     """
     Importe automatiquement les articles les plus vus sur le semestre pour chaque thème défini dans THEMES.
 
     Règle de matching : si le thème a des keywords, on garde les articles dont le titre contient au moins un keyword
-    (case-insensitive). Si pas de keywords, on prend les top globaux.
+    (case-insensitive, mot entier pour les keywords courts comme "tv" ou "IA"). Si pas de keywords, on prend les
+    top globaux. Le classement est fait en une passe par ThemeClassifier.
+    Les résumés / images ne sont pas récupérés ici : lancer ensuite `enrich-metadata`.
+    Avec plusieurs --projects, chaque projet est téléchargé et écrit en parallèle dans sa propre partition.
     """
+    from .importer import describe_error, store_top
+    from .top_views_fetcher import TopViewsFetcher
+
     year = int(os.getenv("YEAR", year))
     semester = os.getenv("SEMESTER", semester)
     limit = int(os.getenv("LIMIT", limit))
-
-    fetcher = TopViewsFetcher()
-    typer.echo(f"Téléchargement des tops {settings.wikimedia_project} pour {year}-{semester}...")
-    aggregated = fetcher.fetch_semester_top(year, semester)
-    typer.echo(f"{len(aggregated)} articles agrégés depuis les tops.")
-
-    with get_session() as session:
-        for theme_cfg in THEMES:
-            name = theme_cfg["name"]
-            keywords = [kw.lower() for kw in theme_cfg.get("keywords", []) if kw]
-            theme = ensure_theme(session, name)
-
-            matched: list[tuple[str, dict]] = []
-            for title, data in aggregated.items():
-                title_l = title.lower()
-                if keywords:
-                    if not any(kw in title_l for kw in keywords):
-                        continue
-                matched.append((title, data))
-
-            matched.sort(key=lambda tup: tup[1]["views_total"], reverse=True)
-            selected = matched[:limit]
-            typer.echo(f"Thème '{name}': {len(selected)} articles retenus.")
-
-            for title, data in selected:
-                article = ensure_article(session, title, project=settings.wikimedia_project)
-                link_article_theme(session, article, theme)
-                upsert_semester_stat_from_series(
-                    session,
-                    article,
-                    year,
-                    semester,
-                    data["series"],
-                )
-
+    names = project_list(projects)
+    prepare_projects(names, [year])
+
+    def run(project: str, echo) -> int:
+        echo(f"Téléchargement des tops {project} pour {year}-{semester}...")
+        aggregate = TopViewsFetcher(project=project).fetch_semester_aggregate(year, semester)
+        return store_top(year, semester, limit, aggregate, project=project, echo=echo)
+
+    results = for_projects(names, run)
+    failed = {project: result for project, result in results.items() if isinstance(result, BaseException)}
+    for project, exc in failed.items():
+        typer.echo(f"  {project} : {describe_error(exc)}")
+    if failed:
+        raise typer.Exit(code=1)
     typer.echo("Import terminé.")
 
 
@@ -263,22 +699,238 @@ def import_range(
     end_year: Annotated[int, typer.Option("--end-year", "-b")] = 2025,
     end_semester_last_year: Annotated[str, typer.Option("--end-semester-last-year", "-e")] = "S1",
     limit: Annotated[int, typer.Option("--limit", "-n", help="Nombre max d'articles par thème")] = 500,
+    projects: Annotated[
+        Optional[str], typer.Option("--projects", help="Projets en parallèle (fr,en,de,... ; défaut WIKI_PROJECT)")
+    ] = None,
 ) -> None:
     """
     Enchaîne les imports de tops sur une plage d'années (2015..2025 par défaut).
+    Téléchargements et écritures se recouvrent ; une période en échec n'annule pas les autres.
+    Avec plusieurs --projects, un pipeline par projet tourne en parallèle (connexions HTTP partagées).
     Par défaut arrête à S1 pour la dernière année pour éviter les périodes incomplètes.
     Peut être piloté via les variables d'env START_YEAR, END_YEAR, END_SEM_LAST, LIMIT.
     """
+    from .importer import PeriodImportResult, run_import_pipeline
+
     start_year = int(os.getenv("START_YEAR", start_year))
     end_year = int(os.getenv("END_YEAR", end_year))
     end_semester_last_year = os.getenv("END_SEM_LAST", end_semester_last_year)
     limit = int(os.getenv("LIMIT", limit))
 
     periods = iter_periods(start_year, end_year, end_semester_last_year)
-    typer.echo(f"Import range {start_year}-{end_year} (fin {end_semester_last_year}), limit {limit}.")
-    for year, sem in periods:
-        typer.echo(f"== Import {year}-{sem} ==")
-        import_top(year=year, semester=sem, limit=limit)
+    names = project_list(projects)
+    typer.echo(
+        f"Import range {start_year}-{end_year} (fin {end_semester_last_year}), limit {limit}, {', '.join(names)}."
+    )
+    prepare_projects(names, sorted({year for year, _ in periods}))
+    results = for_projects(
+        names, lambda project, echo: run_import_pipeline(periods, limit, project=project, echo=echo)
+    )
+    failed_total = 0
+    for project, project_results in results.items():
+        if isinstance(project_results, BaseException):
+            project_results = [PeriodImportResult(year, sem, error=str(project_results)) for year, sem in periods]
+        failed = [r for r in project_results if r.error]
+        failed_total += len(failed)
+        imported = len(project_results) - len(failed)
+        typer.echo(f"Import {project} terminé : {imported} périodes importées, {len(failed)} en échec.")
+        for r in failed:
+            typer.echo(f"  {r.year}-{r.semester} : {r.error}")
+    if failed_total:
+        raise typer.Exit(code=1)
+
+
+@app.command("import-incremental")
+def import_incremental(
+    year: Annotated[Optional[int], typer.Option("--year", "-y")] = None,
+    semester: Annotated[Optional[str], typer.Option("--semester", "-s")] = None,
+    limit: Annotated[int, typer.Option("--limit", "-n", help="Nouveaux articles max par thème")] = 500,
+) -> None:
+    """
+    Ingestion incrémentale du semestre (en cours par défaut) : seuls les tops absents du registre ingestion_ledger
+    sont téléchargés, en tops quotidiens pour le mois en cours, et les séries existantes sont prolongées en place.
+    Prévu pour un cron quotidien : quelques requêtes par run au lieu de six mois complets.
+    """
+    from .config import get_settings
+    from .ingestion import IngestionConflict, ingest_semester
+    from .periods import semester_of
+
+    current_year, current_semester = semester_of(date.today() - timedelta(days=1))
+    year, semester = year or current_year, semester or current_semester
+    project = get_settings().wikimedia_project
+    prepare_projects([project], [year])
+    try:
+        report = ingest_semester(year, semester, limit, project=project, echo=typer.echo)
+    except IngestionConflict as exc:
+        typer.echo(str(exc))
+        raise typer.Exit(code=1)
+    for line in report.lines():
+        typer.echo(line)
+
+
+@app.command()
+def enrich_metadata(
+    limit: Annotated[Optional[int], typer.Option("--limit", "-n", help="Nombre max d'articles à enrichir")] = None,
+    window: Annotated[int, typer.Option("--window", "-w", help="Articles traités par transaction")] = 1000,
+    concurrency: Annotated[Optional[int], typer.Option("--concurrency", "-c", help="Requêtes simultanées")] = None,
+) -> None:
+    """
+    Complète titre / page_id / résumé / image des articles jamais vérifiés (metadata_checked_at vide).
+    Requêtes `action=query` groupées et parallèles, écriture en masse par fenêtre d'articles.
+    """
+    from .config import get_settings
+    from .db import get_session
+    from .metadata_enricher import EnrichmentResult, articles_missing_metadata, enrich_articles
+    from .wiki_page_client import WikiPageClient
+
+    settings = get_settings()
+    client = WikiPageClient()
+    total = EnrichmentResult()
+    after_id = 0
+    while limit is None or total.requested < limit:
+        size = window if limit is None else min(window, limit - total.requested)
+        with get_session() as session:
+            articles = articles_missing_metadata(session, settings.wikimedia_project, after_id, size)
+        if not articles:
+            break
+        # Le réseau est interrogé avant toute écriture : aucune transaction n'est ouverte pendant l'attente.
+        with get_session() as session:
+            result = enrich_articles(session, articles, client, settings.batch_size, concurrency)
+        after_id = articles[-1][0]
+        total.requested += result.requested
+        total.updated += result.updated
+        total.not_found += result.not_found
+        total.failed += result.failed
+        typer.echo(
+            f"{total.requested} articles traités ({total.updated} enrichis, {total.not_found} introuvables, "
+            f"{total.failed} en échec, redemandés au prochain passage)."
+        )
+    typer.echo("Enrichissement terminé.")
+
+
+@app.command()
+def refresh_rankings(
+    full: Annotated[bool, typer.Option("--full", help="Reconstruit toutes les périodes")] = False,
+) -> None:
+    """
+    Met à jour le classement matérialisé (thème, année, semestre, rang) des articles par vues moyennes/jour,
+    avec percentile et tier S/A/B/C. Par défaut seules les périodes dont les stats ont changé sont reconstruites.
+    """
+    from . import rankings
+    from .db import get_session
+
+    with get_session() as session:
+        periods = rankings.refresh_rankings(session, full=full)
+    if not periods:
+        typer.echo("Classements déjà à jour.")
+        return
+    typer.echo(f"Classements reconstruits pour {len(periods)} périodes : " + ", ".join(f"{y}-{s}" for y, s in periods))
+
+
+@app.command("publish-questions")
+def publish_questions(
+    full: Annotated[bool, typer.Option("--full", help="Republie toutes les questions prêtes")] = False,
+) -> None:
+    """
+    Publie les questions prêtes dans question_snapshots (articles, vues et ordre attendu dénormalisés),
+    table lue directement par le jeu. Par défaut seules les questions nouvelles ou modifiées sont publiées.
+    """
+    from sqlalchemy import select
+
+    from . import snapshots
+    from .db import get_session
+    from .models import Question
+
+    with get_session() as session:
+        removed = snapshots.unpublish_orphans(session)
+        if full:
+            ids = list(session.scalars(select(Question.id).where(Question.status == "ready").order_by(Question.id)))
+            count = snapshots.publish_questions(session, ids)
+        else:
+            count = snapshots.publish_questions(session)
+    typer.echo(f"{count} questions publiées, {removed} snapshots retirés.")
+
+
+@app.command()
+def export(
+    output: Annotated[Path, typer.Option("--output", help="Dossier de sortie (un fichier par jeu)")] = Path("exports"),
+    format: Annotated[str, typer.Option("--format", help="parquet, arrow (IPC) ou csv")] = "parquet",
+    datasets: Annotated[
+        str, typer.Option("--datasets", help="Jeux exportés : articles, stats, questions (virgules)")
+    ] = "articles,stats,questions",
+    projects: Annotated[Optional[str], typer.Option("--projects", help="Projets (fr,en,...), sinon tous")] = None,
+    themes: Annotated[Optional[str], typer.Option(help="Liste de thèmes séparés par des virgules, sinon tous")] = None,
+    start_year: Annotated[Optional[int], typer.Option("--start-year")] = None,
+    end_year: Annotated[Optional[int], typer.Option("--end-year")] = None,
+    end_semester_last_year: Annotated[str, typer.Option("--end-semester-last-year")] = "S2",
+    batch_size: Annotated[
+        int, typer.Option("--batch-size", help="Lignes lues et écrites par lot (row group Parquet)")
+    ] = 50_000,
+) -> None:
+    """
+    Exporte articles, stats semestrielles (séries décodées) et questions (une ligne par article) en Parquet,
+    Arrow IPC ou CSV. Lecture en flux par lots (curseur côté serveur) : mémoire constante quel que soit le volume.
+    Parquet / Arrow passent par pyarrow (requirements.txt), CSV par la bibliothèque standard.
+    """
+    from . import exporter
+
+    filters = exporter.ExportFilters(
+        projects=project_list(projects) if projects else None,
+        themes=[t.strip() for t in themes.split(",") if t.strip()] if themes else None,
+        start_year=start_year,
+        end_year=end_year,
+        end_semester=end_semester_last_year,
+    )
+    names = [name.strip() for name in datasets.split(",") if name.strip()]
+    try:
+        report = exporter.export(names, output, fmt=format, filters=filters, batch_size=batch_size, echo=typer.echo)
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc))
+    except RuntimeError as exc:
+        typer.echo(str(exc))
+        raise typer.Exit(code=1)
+    for line in report.lines():
+        typer.echo(line)
+
+
+@app.command()
+def serve(
+    host: Annotated[Optional[str], typer.Option("--host", help="Adresse d'écoute (WIKI_SERVE_HOST)")] = None,
+    port: Annotated[Optional[int], typer.Option("--port", help="Port d'écoute (WIKI_SERVE_PORT)")] = None,
+    project: Annotated[Optional[str], typer.Option("--project", help="Projet servi (fr, en... ou domaine)")] = None,
+    reload_interval: Annotated[
+        Optional[float], typer.Option("--reload-interval", help="Secondes entre deux relectures des questions modifiées")
+    ] = None,
+) -> None:
+    """
+    Sert les questions prêtes en HTTP depuis un index en mémoire (GET /question?theme=&year=&semester=, /metrics
+    avec latences p50 / p99, /health). L'index suit les questions modifiées (updated_at) sans redémarrage.
+    """
+    import asyncio
+    import time
+
+    from .config import get_settings
+    from .question_server import QuestionServer, load_index
+
+    settings = get_settings()
+    try:
+        served = project_list(project)[0]
+    except typer.BadParameter as exc:
+        raise typer.BadParameter(exc.message, param_hint="--project")
+    started = time.perf_counter()
+    index = load_index(served)
+    typer.echo(f"Index chargé : {len(index)} questions en {time.perf_counter() - started:.2f}s.")
+    server = QuestionServer(
+        index,
+        reload_interval=reload_interval or settings.serve_reload_seconds,
+        full_reload_interval=settings.serve_full_reload_seconds,
+        echo=typer.echo,
+    )
+    try:
+        asyncio.run(server.run(host or settings.serve_host, port or settings.serve_port))
+    except KeyboardInterrupt:
+        typer.echo("Arrêt du serveur.")
+    typer.echo(server.latency_line())
 
 
 def main() -> None:  # pragma: no cover
@@ -1,21 +1,53 @@
 from contextlib import contextmanager
+from functools import lru_cache
 from typing import Iterator
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 from .config import get_settings
 
-settings = get_settings()
-engine = create_engine(settings.db_url, echo=False, future=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False, class_=Session, future=True)
+
+def _engine_options(db_url: str) -> dict:
+    if db_url.startswith("postgresql+psycopg2"):
+        # Les INSERT multi-lignes passent par "insertmanyvalues" et les UPDATE en masse par execute_batch.
+        return {
+            "executemany_mode": "values_plus_batch",
+            "insertmanyvalues_page_size": 1000,
+            "executemany_batch_page_size": 500,
+            "pool_pre_ping": True,
+        }
+    return {}
+
+
+@lru_cache
+def get_engine() -> Engine:
+    """Moteur créé à la première utilisation : importer le module ne lit ni la configuration ni le driver SQL."""
+    db_url = get_settings().db_url
+    return create_engine(db_url, echo=False, future=True, **_engine_options(db_url))
+
+
+@lru_cache
+def get_sessionmaker() -> sessionmaker:
+    return sessionmaker(bind=get_engine(), autoflush=False, expire_on_commit=False, class_=Session, future=True)
+
+
+def __getattr__(name: str):
+    # Compatibilité : `from .db import engine, SessionLocal` crée le moteur à ce moment-là.
+    if name == "engine":
+        return get_engine()
+    if name == "SessionLocal":
+        return get_sessionmaker()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 Base = declarative_base()
 
 
 @contextmanager
 def get_session() -> Iterator[Session]:
-    session = SessionLocal()
+    session = get_sessionmaker()()
     try:
         yield session
         session.commit()
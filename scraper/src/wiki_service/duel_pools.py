@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import hashlib
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+from urllib.parse import quote
+
+import numpy as np
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.orm import Session
+
+from .bulk_writer import dialect_insert
+from .config import get_settings
+from .models import Article, ArticleSemesterStat, ArticleTheme, DuelPool, Theme
+from .rankings import tier_for
+
+DUEL_POOL_SIZE = 10
+
+PeriodKey = tuple[int, int, str]  # (theme_id, year, semester)
+
+
+def card_key(article_ids: Sequence[int]) -> str:
+    """Empreinte d'un pool indépendante de l'ordre des cartes (deux pools identiques ont la même clé)."""
+    return hashlib.sha1(",".join(str(i) for i in sorted(article_ids)).encode()).hexdigest()
+
+
+def article_url(project: str, slug: str) -> str:
+    return f"https://{project}.org/wiki/{quote(slug)}"
+
+
+@dataclass
+class DuelPoolReport:
+    created: int = 0
+    periods: int = 0
+    skipped: int = 0  # (thème, période) avec moins de DUEL_POOL_SIZE articles
+    wall_time: float = 0.0
+
+    def lines(self) -> List[str]:
+        return [
+            f"Pools créés : {self.created} sur {self.periods} thèmes/semestres, "
+            f"sautés (pas assez d'articles) : {self.skipped}, durée : {self.wall_time:.1f}s"
+        ]
+
+
+def load_top_cards(
+    session: Session, theme_ids: Sequence[int], periods: Sequence[tuple[int, str]], top: int, project: str
+) -> Dict[PeriodKey, List[dict]]:
+    """Top `top` articles de chaque (thème, période), par vues moyennes/jour, avec rang et tier. Une requête."""
+    rows = session.execute(
+        select(
+            ArticleTheme.theme_id,
+            ArticleSemesterStat.year,
+            ArticleSemesterStat.semester,
+            Article.id,
+            Article.project,
+            Article.slug,
+            Article.title,
+            Article.summary,
+            Article.image_url,
+            ArticleSemesterStat.views_total,
+            ArticleSemesterStat.views_avg_daily,
+        )
+        .join(ArticleTheme, ArticleTheme.article_id == ArticleSemesterStat.article_id)
+        .join(Article, Article.id == ArticleSemesterStat.article_id)
+        .where(
+            ArticleTheme.theme_id.in_(list(theme_ids)),
+            ArticleSemesterStat.project == project,
+            tuple_(ArticleSemesterStat.year, ArticleSemesterStat.semester).in_(list(periods)),
+        )
+    )
+    grouped: Dict[PeriodKey, list] = defaultdict(list)
+    for row in rows:
+        grouped[(row.theme_id, row.year, row.semester)].append(row)
+
+    cards: Dict[PeriodKey, List[dict]] = {}
+    for key, items in grouped.items():
+        items.sort(key=lambda row: (-row.views_avg_daily, row.id))
+        last = max(len(items) - 1, 1)
+        cards[key] = [
+            {
+                "article_id": row.id,
+                "title": row.title,
+                "url": article_url(row.project, row.slug),
+                "image_url": row.image_url,
+                "excerpt": row.summary,
+                "views_total": row.views_total,
+                "views_avg_daily": row.views_avg_daily,
+                "rank": index + 1,
+                "tier": tier_for(index / last),
+            }
+            for index, row in enumerate(items[:top])
+        ]
+    return cards
+
+
+def existing_card_keys(
+    session: Session, theme_ids: Sequence[int], periods: Sequence[tuple[int, str]], project: str
+) -> Dict[PeriodKey, set[str]]:
+    keys: Dict[PeriodKey, set[str]] = defaultdict(set)
+    for theme_id, year, semester, key in session.execute(
+        select(DuelPool.theme_id, DuelPool.year, DuelPool.semester, DuelPool.card_key).where(
+            DuelPool.project == project,
+            DuelPool.theme_id.in_(list(theme_ids)),
+            tuple_(DuelPool.year, DuelPool.semester).in_(list(periods)),
+        )
+    ):
+        keys[(theme_id, year, semester)].add(key)
+    return keys
+
+
+def draw_pools(cards: Sequence[dict], count: int, known: set[str], rng: np.random.Generator) -> List[List[dict]]:
+    """
+    Tire jusqu'à `count` pools distincts de DUEL_POOL_SIZE cartes parmi `cards` (et absents de `known`).
+    Les tirages sont faits en bloc : un argsort de clés aléatoires donne une permutation par ligne.
+    """
+    size = len(cards)
+    if size < DUEL_POOL_SIZE or count <= 0:
+        return []
+    ids = np.fromiter((card["article_id"] for card in cards), dtype=np.int64, count=size)
+    draws = np.argsort(rng.random((count * 2, size)), axis=1)[:, :DUEL_POOL_SIZE]
+    seen = set(known)
+    pools: List[List[dict]] = []
+    for draw in draws:
+        key = card_key(ids[draw].tolist())
+        if key in seen:
+            continue
+        seen.add(key)
+        pools.append([{"position": position + 1, **cards[index]} for position, index in enumerate(draw)])
+        if len(pools) == count:
+            break
+    return pools
+
+
+def generate_duel_pools(
+    session: Session,
+    theme_names: Sequence[str],
+    periods: Sequence[tuple[int, str]],
+    per_period: Optional[int] = None,
+    top: Optional[int] = None,
+    seed: Optional[int] = None,
+    project: Optional[str] = None,
+    echo: Callable[[str], None] = lambda _: None,
+) -> DuelPoolReport:
+    """
+    Complète chaque (thème, période) jusqu'à `per_period` pools non réservés de DUEL_POOL_SIZE cartes tirées
+    dans le top `top`. Chaque carte embarque ses métadonnées et ses stats : le jeu n'a plus rien à joindre.
+    """
+    settings = get_settings()
+    per_period = per_period or settings.duel_pools_per_period
+    top = top or settings.duel_pool_top
+    project = project or settings.wikimedia_project
+    rng = np.random.default_rng(seed)
+    report = DuelPoolReport()
+    started = time.perf_counter()
+
+    themes = {theme.id: theme.name for theme in session.scalars(select(Theme).where(Theme.name.in_(list(theme_names))))}
+    for name in sorted(set(theme_names) - set(themes.values())):
+        echo(f"Skip thème inconnu : {name}")
+    cards = load_top_cards(session, list(themes), periods, top, project)
+    known = existing_card_keys(session, list(themes), periods, project)
+    available: Dict[PeriodKey, int] = defaultdict(int)
+    for theme_id, year, semester in session.execute(
+        select(DuelPool.theme_id, DuelPool.year, DuelPool.semester).where(
+            DuelPool.project == project,
+            DuelPool.theme_id.in_(list(themes)),
+            tuple_(DuelPool.year, DuelPool.semester).in_(list(periods)),
+            DuelPool.claimed_at.is_(None),
+        )
+    ):
+        available[(theme_id, year, semester)] += 1
+
+    for key in sorted(cards):
+        theme_id, year, semester = key
+        if len(cards[key]) < DUEL_POOL_SIZE:
+            report.skipped += 1
+            continue
+        pools = draw_pools(cards[key], per_period - available[key], known[key], rng)
+        if not pools:
+            continue
+        # Un pool identique inséré entre-temps (génération concurrente) est ignoré : seuls les id renvoyés comptent.
+        created = session.scalars(
+            dialect_insert(session, DuelPool)
+            .values(
+                [
+                    {
+                        "project": project,
+                        "theme_id": theme_id,
+                        "theme": themes[theme_id],
+                        "year": year,
+                        "semester": semester,
+                        "card_key": card_key([card["article_id"] for card in pool]),
+                        "cards": pool,
+                        "random_key": random.random(),
+                    }
+                    for pool in pools
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=["project", "theme_id", "year", "semester", "card_key"])
+            .returning(DuelPool.id)
+        ).all()
+        if not created:
+            continue
+        report.periods += 1
+        report.created += len(created)
+        echo(f"OK {themes[theme_id]} {year}-{semester} : {len(created)} pools")
+
+    report.wall_time = time.perf_counter() - started
+    return report
+
+
+def _claim(session: Session, filters: list, claimed_by: Optional[str]) -> Optional[DuelPool]:
+    candidate = (
+        select(DuelPool.id)
+        .where(DuelPool.claimed_at.is_(None), *filters)
+        .order_by(DuelPool.random_key)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return session.scalars(
+        update(DuelPool)
+        .where(DuelPool.id == candidate, DuelPool.claimed_at.is_(None))
+        .values(claimed_at=datetime.now(timezone.utc), claimed_by=claimed_by)
+        .returning(DuelPool)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+
+def claim_duel_pool(
+    session: Session,
+    theme: Optional[str] = None,
+    year: Optional[int] = None,
+    semester: Optional[str] = None,
+    claimed_by: Optional[str] = None,
+    project: Optional[str] = None,
+) -> Optional[DuelPool]:
+    """
+    Réserve un pool libre au hasard en une instruction (UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED)) :
+    deux rooms concurrentes ne peuvent pas obtenir le même pool. Seuls les pools du projet (défaut WIKI_PROJECT)
+    sont candidats. Retourne None s'il n'en reste aucun.
+    """
+    filters = [DuelPool.project == (project or get_settings().wikimedia_project)]
+    if theme:
+        filters.append(DuelPool.theme == theme)
+    if year:
+        filters.append(DuelPool.year == year)
+    if semester:
+        filters.append(DuelPool.semester == semester)
+    # Pivot aléatoire sur random_key (indexé), puis retour au début de l'index s'il n'y a rien après.
+    pivot = random.random()
+    return _claim(session, filters + [DuelPool.random_key >= pivot], claimed_by) or _claim(
+        session, filters + [DuelPool.random_key < pivot], claimed_by
+    )
@@ -0,0 +1,328 @@
+"""
+Export en flux des articles, stats semestrielles (séries comprises) et questions vers Parquet, Arrow IPC ou CSV.
+
+Les lignes sont lues par lots avec un curseur côté serveur (yield_per : stream_results sous PostgreSQL) et chaque
+lot est écrit aussitôt (un row group Parquet / un record batch Arrow par lot) : la mémoire reste bornée par la
+taille d'un lot, quel que soit le nombre de lignes exportées. Parquet et Arrow passent par 'pyarrow' (importé à
+la demande : la CLI n'en dépend pas au démarrage) ; CSV n'utilise que la bibliothèque standard.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.sql import Select
+
+from .db import get_session
+from .metrics import span
+from .models import Article, ArticleSemesterStat, ArticleTheme, Question, QuestionArticle, Theme
+from .series_codec import MISSING, decode_values, pack_series
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv"}
+
+# (nom de colonne, type) ; types : int, float, str, date, ints (liste d'entiers, None = jour sans donnée).
+Columns = Sequence[tuple[str, str]]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as exc:  # pragma: no cover - installation sans requirements.txt
+        raise RuntimeError("Les formats parquet et arrow nécessitent le paquet 'pyarrow' (ou --format csv).") from exc
+    return pyarrow
+
+
+@dataclass
+class ExportFilters:
+    projects: Optional[List[str]] = None
+    themes: Optional[List[str]] = None
+    start_year: Optional[int] = None
+    end_year: Optional[int] = None
+    end_semester: str = "S2"  # dernier semestre de end_year inclus
+
+    def period(self, year_column, semester_column) -> list:
+        clauses = []
+        if self.start_year is not None:
+            clauses.append(year_column >= self.start_year)
+        if self.end_year is not None:
+            clauses.append(
+                or_(year_column < self.end_year, and_(year_column == self.end_year, semester_column <= self.end_semester))
+            )
+        return clauses
+
+    def theme_articles(self) -> Select:
+        return select(ArticleTheme.article_id).join(Theme, Theme.id == ArticleTheme.theme_id).where(
+            Theme.name.in_(self.themes)
+        )
+
+
+@dataclass(frozen=True)
+class Dataset:
+    name: str
+    columns: Columns
+    query: Callable[[ExportFilters], Select]
+    convert: Optional[Callable[[tuple], tuple]] = None  # ligne SQL -> ligne exportée
+
+
+def _articles_query(filters: ExportFilters) -> Select:
+    stmt = select(
+        Article.id, Article.project, Article.slug, Article.title, Article.page_id, Article.summary, Article.image_url
+    ).order_by(Article.id)
+    if filters.projects:
+        stmt = stmt.where(Article.project.in_(filters.projects))
+    if filters.themes:
+        stmt = stmt.where(Article.id.in_(filters.theme_articles()))
+    return stmt
+
+
+def _stats_query(filters: ExportFilters) -> Select:
+    stat = ArticleSemesterStat
+    stmt = (
+        select(
+            stat.id,
+            stat.project,
+            stat.article_id,
+            Article.slug,
+            stat.year,
+            stat.semester,
+            stat.views_total,
+            stat.views_avg_daily,
+            stat.series_start,
+            stat.series_data,
+            stat.series,
+        )
+        .join(Article, Article.id == stat.article_id)
+        .where(*filters.period(stat.year, stat.semester))
+        .order_by(stat.year, stat.semester, stat.id)
+    )
+    if filters.projects:
+        stmt = stmt.where(stat.project.in_(filters.projects))  # élagage des partitions sous PostgreSQL
+    if filters.themes:
+        stmt = stmt.where(stat.article_id.in_(filters.theme_articles()))
+    return stmt
+
+
+def _stat_row(row: tuple) -> tuple:
+    """Série décodée en liste d'entiers (None pour un jour sans donnée), anciennes séries JSON comprises."""
+    *head, series_start, series_data, legacy = row
+    if series_data is None and legacy:
+        packed = pack_series(legacy)
+        series_start, series_data = packed if packed else (None, None)
+    values = None
+    if series_data is not None:
+        values = [None if value == MISSING else value for value in decode_values(series_data).tolist()]
+    return (*head, series_start, values)
+
+
+def _questions_query(filters: ExportFilters) -> Select:
+    stmt = (
+        select(
+            Question.id,
+            Question.project,
+            Theme.name,
+            Question.year,
+            Question.semester,
+            Question.status,
+            Question.difficulty,
+            Question.log_gap,
+            QuestionArticle.article_id,
+            Article.title,
+            QuestionArticle.views_total,
+            QuestionArticle.views_avg_daily,
+        )
+        .join(Theme, Theme.id == Question.theme_id)
+        .join(QuestionArticle, QuestionArticle.question_id == Question.id)
+        .join(Article, Article.id == QuestionArticle.article_id)
+        .where(*filters.period(Question.year, Question.semester))
+        .order_by(Question.id, QuestionArticle.id)
+    )
+    if filters.projects:
+        stmt = stmt.where(Question.project.in_(filters.projects))
+    if filters.themes:
+        stmt = stmt.where(Theme.name.in_(filters.themes))
+    return stmt
+
+
+DATASETS: Dict[str, Dataset] = {
+    dataset.name: dataset
+    for dataset in (
+        Dataset(
+            "articles",
+            (
+                ("id", "int"),
+                ("project", "str"),
+                ("slug", "str"),
+                ("title", "str"),
+                ("page_id", "int"),
+                ("summary", "str"),
+                ("image_url", "str"),
+            ),
+            _articles_query,
+        ),
+        Dataset(
+            "stats",
+            (
+                ("id", "int"),
+                ("project", "str"),
+                ("article_id", "int"),
+                ("slug", "str"),
+                ("year", "int"),
+                ("semester", "str"),
+                ("views_total", "int"),
+                ("views_avg_daily", "float"),
+                ("series_start", "date"),
+                ("series", "ints"),
+            ),
+            _stats_query,
+            _stat_row,
+        ),
+        # Une ligne par article de question, dans l'ordre de la question.
+        Dataset(
+            "questions",
+            (
+                ("question_id", "int"),
+                ("project", "str"),
+                ("theme", "str"),
+                ("year", "int"),
+                ("semester", "str"),
+                ("status", "str"),
+                ("difficulty", "str"),
+                ("log_gap", "float"),
+                ("article_id", "int"),
+                ("title", "str"),
+                ("views_total", "int"),
+                ("views_avg_daily", "float"),
+            ),
+            _questions_query,
+        ),
+    )
+}
+
+
+class CsvSink:
+    def __init__(self, path: Path, columns: Columns) -> None:
+        self._file = path.open("w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in columns])
+        self._lists = [index for index, (_, kind) in enumerate(columns) if kind == "ints"]
+
+    def write(self, rows: List[tuple]) -> None:
+        if self._lists:
+            # Séries en JSON ([12, null, 40, ...]) dans une seule cellule.
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for index in self._lists:
+                    if row[index] is not None:
+                        row[index] = json.dumps(row[index])
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ArrowSink:
+    """Parquet (un row group par lot) ou fichier Arrow IPC (un record batch par lot)."""
+
+    def __init__(self, path: Path, columns: Columns, fmt: str) -> None:
+        pa = self._pa = _pyarrow()
+        types = {
+            "int": pa.int64(),
+            "float": pa.float64(),
+            "str": pa.string(),
+            "date": pa.date32(),
+            "ints": pa.list_(pa.int32()),
+        }
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        if fmt == "parquet":
+            self._writer = pa.parquet.ParquetWriter(str(path), self.schema, compression="zstd")
+        else:
+            self._sink = pa.OSFile(str(path), "wb")
+            self._writer = pa.ipc.new_file(self._sink, self.schema)
+
+    def write(self, rows: List[tuple]) -> None:
+        arrays = [self._pa.array(values, type=column.type) for values, column in zip(zip(*rows), self.schema)]
+        self._writer.write_batch(self._pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self._writer.close()
+        if hasattr(self, "_sink"):
+            self._sink.close()
+
+
+@dataclass
+class ExportResult:
+    dataset: str
+    path: Path
+    rows: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    def line(self) -> str:
+        size = self.path.stat().st_size / 1e6 if self.path.exists() else 0.0
+        return (
+            f"{self.dataset} : {self.rows} lignes en {self.batches} lots -> {self.path} "
+            f"({size:.1f} Mo, {self.seconds:.1f}s)"
+        )
+
+
+@dataclass
+class ExportReport:
+    results: List[ExportResult] = field(default_factory=list)
+
+    def lines(self) -> List[str]:
+        return [result.line() for result in self.results]
+
+
+def export_dataset(
+    dataset: Dataset, filters: ExportFilters, path: Path, fmt: str, batch_size: int
+) -> ExportResult:
+    """Lit le jeu de données par lots (curseur côté serveur) et écrit chaque lot dès sa réception."""
+    result = ExportResult(dataset=dataset.name, path=path)
+    started = time.perf_counter()
+    sink = CsvSink(path, dataset.columns) if fmt == "csv" else ArrowSink(path, dataset.columns, fmt)
+    try:
+        with get_session() as session:
+            rows = session.execute(dataset.query(filters).execution_options(yield_per=batch_size))
+            for partition in rows.partitions():
+                with span("export"):
+                    batch = [dataset.convert(tuple(row)) if dataset.convert else tuple(row) for row in partition]
+                    sink.write(batch)
+                result.rows += len(batch)
+                result.batches += 1
+    finally:
+        sink.close()
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def export(
+    datasets: Sequence[str],
+    output: Path,
+    fmt: str = "parquet",
+    filters: Optional[ExportFilters] = None,
+    batch_size: int = 50_000,
+    echo: Callable[[str], None] = print,
+) -> ExportReport:
+    """Exporte les jeux de données demandés dans output/<jeu>.<format>."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt} (parquet, arrow ou csv).")
+    unknown = [name for name in datasets if name not in DATASETS]
+    if unknown:
+        raise ValueError(f"Jeux de données inconnus : {', '.join(unknown)} ({', '.join(DATASETS)}).")
+    if fmt != "csv":
+        _pyarrow()  # échoue avant d'ouvrir la moindre requête
+    output.mkdir(parents=True, exist_ok=True)
+    report = ExportReport()
+    for name in datasets:
+        path = output / f"{name}{FORMATS[fmt]}"
+        echo(f"Export {name} -> {path}...")
+        report.results.append(export_dataset(DATASETS[name], filters or ExportFilters(), path, fmt, max(1, batch_size)))
+    return report
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+import httpx
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .db import get_session
+from .models import Article, ArticleSemesterStat
+from .history import NoViewsData, fetch_semesters, request_count
+from .metrics import span
+from .question_builder import (
+    QuestionPayload,
+    create_question,
+    ensure_theme,
+    find_question,
+    load_semester_stats,
+    pick_random_articles,
+    upsert_semester_stat_from_series,
+)
+from .wikimedia_client import WikimediaClient
+
+StatKey = tuple[int, int, str]  # (article_id, year, semester)
+
+
+@dataclass
+class GenerationJob:
+    theme_name: str
+    year: int
+    semester: str
+    articles: List[Article] = field(default_factory=list)
+    stats: Dict[int, ArticleSemesterStat] = field(default_factory=dict)
+    skip_reason: Optional[str] = None
+    payload: Optional[QuestionPayload] = None
+
+    @property
+    def label(self) -> str:
+        return f"{self.theme_name} {self.year}-{self.semester}"
+
+
+@dataclass
+class GenerationReport:
+    generated: int = 0
+    existing: int = 0
+    skipped: Counter = field(default_factory=Counter)
+    api_calls: int = 0
+    wall_time: float = 0.0
+
+    def lines(self) -> List[str]:
+        lines = [
+            f"Questions générées : {self.generated}, déjà existantes : {self.existing}, "
+            f"sautées : {sum(self.skipped.values())}",
+        ]
+        lines += [f"  skip {reason} : {count}" for reason, count in self.skipped.most_common()]
+        lines.append(f"Appels API : {self.api_calls}, durée : {self.wall_time:.1f}s")
+        return lines
+
+
+def skip_reason(exc: BaseException) -> str:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"HTTP {exc.response.status_code}"
+    if isinstance(exc, ValueError):
+        return str(exc)
+    return exc.__class__.__name__
+
+
+class GenerationEngine:
+    """
+    Génération en lot des questions (thème x période) en trois étapes :
+
+    1. planification : tirage des articles de chaque job, repérage des stats manquantes ;
+    2. préchargement : les stats manquantes (si autorisé) sont téléchargées en parallèle par `workers` threads,
+       avec un seul client HTTP partagé ;
+    3. écriture : chaque question est écrite dans son propre savepoint, un échec n'affecte que son job.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        allow_fetch: bool = False,
+        project: Optional[str] = None,
+        client: Optional[WikimediaClient] = None,
+        echo: Callable[[str], None] = print,
+    ) -> None:
+        settings = get_settings()
+        self.workers = max(1, workers or settings.generation_workers)
+        self.allow_fetch = allow_fetch
+        self.project = project or settings.wikimedia_project
+        self._client = client
+        self.echo = echo
+        self._api_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> WikimediaClient:
+        if self._client is None:
+            self._client = WikimediaClient(project=self.project)
+        return self._client
+
+    @staticmethod
+    def plan(theme_names: Sequence[str], periods: Sequence[tuple[int, str]]) -> List[GenerationJob]:
+        return [GenerationJob(theme_name=name, year=year, semester=sem) for year, sem in periods for name in theme_names]
+
+    def run(self, jobs: Sequence[GenerationJob]) -> GenerationReport:
+        report = GenerationReport()
+        started = time.perf_counter()
+        with get_session() as session:
+            with span("prepare"):
+                pending = self._prepare(session, jobs, report)
+            fetched = self._prefetch(pending) if self.allow_fetch else {}
+            with span("write"):
+                self._write(session, pending, fetched, report)
+        report.api_calls = self._api_calls
+        report.wall_time = time.perf_counter() - started
+        return report
+
+    def _prepare(self, session: Session, jobs: Sequence[GenerationJob], report: GenerationReport) -> List[GenerationJob]:
+        pending = []
+        for job in jobs:
+            theme = ensure_theme(session, job.theme_name)
+            existing = find_question(session, theme, job.year, job.semester, self.project)
+            if existing:
+                job.payload = existing
+                report.existing += 1
+                continue
+            try:
+                job.articles = pick_random_articles(
+                    session, theme, 4, job.year, job.semester, allow_fetch=self.allow_fetch, project=self.project
+                )
+            except ValueError as exc:
+                self._skip(job, skip_reason(exc), report)
+                continue
+            job.stats = load_semester_stats(session, job.articles, job.year, job.semester)
+            if not self.allow_fetch and len(job.stats) < len(job.articles):
+                self._skip(job, "stats absentes", report)
+                continue
+            pending.append(job)
+        return pending
+
+    def _fetch(self, slug: str, periods: Sequence[tuple[int, str]]) -> Dict[tuple[int, str], list[dict]]:
+        with self._lock:
+            self._api_calls += request_count(periods)
+        return fetch_semesters(self.client, slug, periods)
+
+    def _prefetch(self, jobs: Sequence[GenerationJob]) -> Dict[StatKey, list[dict] | BaseException]:
+        # Regroupé par article : un seul historique couvre tous ses semestres manquants.
+        needed: Dict[int, tuple[str, set[tuple[int, str]]]] = {}
+        for job in jobs:
+            for article in job.articles:
+                if article.id not in job.stats:
+                    needed.setdefault(article.id, (article.slug, set()))[1].add((job.year, job.semester))
+        if not needed:
+            return {}
+        count = sum(len(periods) for _, periods in needed.values())
+        self.echo(f"Préchargement de {count} stats manquantes, {len(needed)} articles ({self.workers} workers)...")
+
+        def fetch(item: tuple[int, tuple[str, set[tuple[int, str]]]]) -> Dict[StatKey, list[dict] | BaseException]:
+            article_id, (slug, periods) = item
+            periods = sorted(periods)
+            try:
+                series = self._fetch(slug, periods)
+            except Exception as exc:  # noqa: BLE001
+                return {(article_id, *period): exc for period in periods}
+            return {
+                (article_id, *period): values or NoViewsData("No pageviews for this period.")
+                for period, values in series.items()
+            }
+
+        fetched: Dict[StatKey, list[dict] | BaseException] = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for result in pool.map(fetch, needed.items()):
+                fetched.update(result)
+        return fetched
+
+    def _write(
+        self,
+        session: Session,
+        jobs: Sequence[GenerationJob],
+        fetched: Dict[StatKey, list[dict] | BaseException],
+        report: GenerationReport,
+    ) -> None:
+        batch_size = get_settings().batch_size
+        for job in jobs:
+            try:
+                with session.begin_nested():
+                    theme = ensure_theme(session, job.theme_name)
+                    for article in job.articles:
+                        if article.id in job.stats:
+                            continue
+                        result = fetched[(article.id, job.year, job.semester)]
+                        if isinstance(result, BaseException):
+                            raise result
+                        # La stat peut avoir été écrite par un job précédent partageant l'article et la période.
+                        job.stats[article.id] = upsert_semester_stat_from_series(
+                            session, article, job.year, job.semester, result
+                        )
+                    job.payload = create_question(session, theme, job.year, job.semester, job.articles, job.stats)
+            except Exception as exc:  # noqa: BLE001
+                self._skip(job, skip_reason(exc), report)
+                continue
+            report.generated += 1
+            self.echo(f"OK question {job.payload.id} {job.label}")
+            if report.generated % batch_size == 0:
+                session.commit()
+
+    def _skip(self, job: GenerationJob, reason: str, report: GenerationReport) -> None:
+        job.skip_reason = reason
+        report.skipped[reason] += 1
+        self.echo(f"Skip {job.label}: {reason}")
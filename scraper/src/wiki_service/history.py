@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import httpx
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+from .bulk_writer import chunked, dialect_insert, insert_semester_stats, upsert_semester_stats
+from .config import get_settings
+from .db import get_session
+from .metrics import span
+from .models import ArticleSemesterStat, EmptySemester
+from .periods import chunk_ranges, semester_dates, semester_of
+from .series_codec import pack_series, parse_timestamp
+from .wikimedia_client import WikimediaClient
+
+Period = tuple[int, str]
+
+
+class NoViewsData(ValueError):
+    """L'historique de l'article ne contient aucun jour pour le semestre demandé."""
+
+
+def history_range(periods: Iterable[Period]) -> tuple[date, date]:
+    """Plage couvrant tous les semestres, bornée à hier (les pageviews du jour ne sont pas encore publiées)."""
+    bounds = [semester_dates(year, semester) for year, semester in periods]
+    start = min(bound[0] for bound in bounds)
+    end = min(max(bound[1] for bound in bounds), date.today() - timedelta(days=1))
+    return start, end
+
+
+def slice_by_semester(daily_views: Iterable[dict]) -> Dict[Period, List[dict]]:
+    """Répartit une série quotidienne [{"timestamp", "views"}] par semestre (ordre conservé)."""
+    sliced: Dict[Period, List[dict]] = defaultdict(list)
+    for item in daily_views:
+        sliced[semester_of(parse_timestamp(item["timestamp"]))].append(item)
+    return sliced
+
+
+def fetch_semesters(client: WikimediaClient, slug: str, periods: Sequence[Period]) -> Dict[Period, List[dict]]:
+    """Série de chaque semestre demandé, depuis un seul historique couvrant toute la plage."""
+    start, end = history_range(periods)
+    history = client.fetch_history(slug, start, end)
+    with span("aggregate"):
+        sliced = slice_by_semester(history)
+    return {period: sliced.get(period, []) for period in periods}
+
+
+def is_closed(period: Period) -> bool:
+    """Semestre entièrement publié : un historique vide ne peut plus se remplir."""
+    return semester_dates(*period)[1] < date.today() - timedelta(days=1)
+
+
+def request_count(periods: Sequence[Period]) -> int:
+    """Nombre de requêtes que coûte fetch_semesters pour ces périodes."""
+    start, end = history_range(periods)
+    return len(chunk_ranges(start, end, get_settings().history_chunk_days))
+
+
+def semester_stat_row(project: str, article_id: int, period: Period, series: List[dict]) -> dict:
+    """Stat prête à insérer, mêmes règles que ensure_semester_stat (moyenne sur les jours présents)."""
+    total = sum(item["views"] for item in series)
+    row = {
+        "project": project,
+        "article_id": article_id,
+        "year": period[0],
+        "semester": period[1],
+        "views_total": total,
+        "views_avg_daily": total / max(len(series), 1),
+        "series": None,
+        "series_start": None,
+        "series_data": None,
+    }
+    packed = pack_series(series)
+    if packed is None:
+        row["series"] = series or None
+    else:
+        row["series_start"], row["series_data"] = packed
+    return row
+
+
+@dataclass
+class BackfillReport:
+    articles: int = 0
+    requests: int = 0
+    stats_written: int = 0
+    empty: int = 0  # couples (article, semestre) sans aucune vue dans l'historique
+    empty_recorded: int = 0  # dont semestres révolus, inscrits dans empty_semesters
+    failed: Counter = field(default_factory=Counter)
+    wall_time: float = 0.0
+
+    def lines(self) -> List[str]:
+        lines = [
+            f"Articles : {self.articles}, requêtes : {self.requests}, stats écrites : {self.stats_written}, "
+            f"semestres sans données : {self.empty} (dont {self.empty_recorded} mémorisés), "
+            f"durée : {self.wall_time:.1f}s"
+        ]
+        lines += [f"  échec {reason} : {count}" for reason, count in self.failed.most_common()]
+        return lines
+
+
+def missing_periods(
+    session: Session, article_ids: Sequence[int], periods: Sequence[Period], project: str
+) -> Dict[int, List[Period]]:
+    """
+    Semestres sans stat pour chaque article, hors semestres déjà connus comme vides (deux requêtes par lot
+    d'articles).
+    """
+    present: Dict[int, set[Period]] = defaultdict(set)
+    for chunk in chunked(list(article_ids), 1000):
+        for model in (ArticleSemesterStat, EmptySemester):
+            for article_id, year, semester in session.execute(
+                select(model.article_id, model.year, model.semester).where(
+                    model.project == project,
+                    model.article_id.in_(list(chunk)),
+                    tuple_(model.year, model.semester).in_(list(periods)),
+                )
+            ):
+                present[article_id].add((year, semester))
+    missing = {
+        article_id: [period for period in periods if period not in present[article_id]] for article_id in article_ids
+    }
+    return {article_id: wanted for article_id, wanted in missing.items() if wanted}
+
+
+def backfill_stats(
+    articles: Sequence[tuple[int, str]],
+    periods: Sequence[Period],
+    client: Optional[WikimediaClient] = None,
+    workers: Optional[int] = None,
+    refresh: bool = False,
+    project: Optional[str] = None,
+    echo: Callable[[str], None] = print,
+) -> BackfillReport:
+    """
+    Complète les stats semestrielles des articles (article_id, slug) du projet : un historique complet par article,
+    découpé en semestres, puis écrit en lot. Sans refresh, seuls les semestres absents sont demandés et écrits ;
+    avec refresh, tous les semestres sont recalculés et remplacés. Les semestres révolus sans aucune vue sont
+    mémorisés (empty_semesters) pour ne pas être redemandés.
+    """
+    settings = get_settings()
+    report = BackfillReport()
+    started = time.perf_counter()
+    project = project or settings.wikimedia_project
+    client = client or WikimediaClient(project=project)
+    slugs = dict(articles)
+    with get_session() as session:
+        if refresh:
+            todo = {article_id: list(periods) for article_id in slugs}
+        else:
+            todo = missing_periods(session, list(slugs), periods, project)
+    report.articles = len(todo)
+    if not todo:
+        report.wall_time = time.perf_counter() - started
+        return report
+    echo(f"Historique de {len(todo)} articles...")
+
+    def fetch(item: tuple[int, List[Period]]):
+        article_id, wanted = item
+        try:
+            return article_id, wanted, fetch_semesters(client, slugs[article_id], wanted)
+        except Exception as exc:  # noqa: BLE001
+            return article_id, wanted, exc
+
+    write = upsert_semester_stats if refresh else insert_semester_stats
+    rows: List[dict] = []
+    empties: List[dict] = []
+
+    def flush() -> None:
+        with span("write"), get_session() as session:
+            if rows:
+                write(session, rows)
+            for chunk in chunked(empties, 1000):
+                stmt = dialect_insert(session, EmptySemester).values(list(chunk))
+                session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["project", "article_id", "year", "semester"],
+                        set_={"checked_at": stmt.excluded.checked_at},
+                    )
+                )
+        report.stats_written += len(rows)
+        report.empty_recorded += len(empties)
+        rows.clear()
+        empties.clear()
+
+    workers = max(1, workers or settings.generation_workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Par tranches : les historiques téléchargés d'avance restent en nombre borné.
+        for window in chunked(list(todo.items()), workers * 8):
+            for article_id, wanted, result in pool.map(fetch, window):
+                report.requests += request_count(wanted)
+                if isinstance(result, httpx.HTTPStatusError):
+                    report.failed[f"HTTP {result.response.status_code}"] += 1
+                    continue
+                if isinstance(result, BaseException):
+                    report.failed[result.__class__.__name__] += 1
+                    continue
+                for period, series in result.items():
+                    if not series:
+                        report.empty += 1
+                        if is_closed(period):
+                            empties.append(
+                                {
+                                    "project": project,
+                                    "article_id": article_id,
+                                    "year": period[0],
+                                    "semester": period[1],
+                                    "checked_at": datetime.now(timezone.utc),
+                                }
+                            )
+                        continue
+                    rows.append(semester_stat_row(project, article_id, period, series))
+            if len(rows) + len(empties) >= settings.batch_size * 20:
+                flush()
+    if rows or empties:
+        flush()
+    report.wall_time = time.perf_counter() - started
+    return report
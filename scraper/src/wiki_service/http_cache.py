@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import calendar
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Optional
+
+import httpx
+
+from .config import get_settings
+
+# Les pageviews d'une journée sont consolidées après ~24h : une période est "close" avec cette marge.
+CLOSED_PERIOD_MARGIN = timedelta(days=2)
+CHUNK_SIZE = 64 * 1024
+
+_TOP_RE = re.compile(r"/pageviews/top/[^/]+/[^/]+/(\d{4})/(\d{2})/(all-days|\d{2})")
+_PER_ARTICLE_RE = re.compile(r"/pageviews/per-article/.+/daily/\d{8,10}/(\d{8})\d{0,2}$")
+
+
+class OfflineCacheMiss(httpx.TransportError):
+    """Requête absente du cache alors que le mode hors-ligne interdit le réseau."""
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    offline_misses: int = 0
+
+    def as_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+def period_end(url: str) -> Optional[date]:
+    """Dernier jour couvert par une URL pageviews, ou None si l'URL ne porte pas sur une période."""
+    path = httpx.URL(url).path
+    match = _TOP_RE.search(path)
+    if match:
+        year, month, day = int(match.group(1)), int(match.group(2)), match.group(3)
+        if day == "all-days":
+            return date(year, month, calendar.monthrange(year, month)[1])
+        return date(year, month, int(day))
+    match = _PER_ARTICLE_RE.search(path)
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d").date()
+    return None
+
+
+class HttpCache:
+    """
+    Cache disque des réponses GET : corps compressés (zlib) dans des fichiers, index SQLite pour l'expiration,
+    la taille totale et l'éviction LRU.
+
+    Les périodes closes (top mensuels/quotidiens, séries par article terminées) sont gardées sans expiration ;
+    le reste (périodes ouvertes, résumés, action=query) expire après `ttl` secondes.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int, ttl: int, offline: bool = False) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.offline = offline
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.directory / "index.sqlite", check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL, headers TEXT NOT NULL,"
+            " size INTEGER NOT NULL, stored_at REAL NOT NULL, expires_at REAL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access)")
+        self._db.commit()
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    @staticmethod
+    def key_for(request: httpx.Request) -> str:
+        return hashlib.sha256(f"{request.method} {request.url}".encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.z"
+
+    def expires_at(self, url: str, status: int, now: float) -> Optional[float]:
+        if status == 200:
+            end = period_end(url)
+            if end is not None and end + CLOSED_PERIOD_MARGIN < datetime.now(timezone.utc).date():
+                return None
+        return now + self.ttl
+
+    def lookup(self, request: httpx.Request) -> Optional[tuple[int, dict, Path]]:
+        if request.method != "GET":
+            return None
+        key = self.key_for(request)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, headers, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            path = self._path(key)
+            # Hors-ligne, une entrée expirée reste préférable à une erreur.
+            usable = row is not None and path.exists() and (self.offline or row[2] is None or row[2] > now)
+            if not usable:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return row[0], json.loads(row[1]), path
+
+    def should_store(self, request: httpx.Request, response: httpx.Response) -> bool:
+        return request.method == "GET" and response.status_code in (200, 404)
+
+    def store(self, request: httpx.Request, response: httpx.Response, tmp_path: Path, size: int) -> None:
+        key = self.key_for(request)
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, path)
+        now = time.time()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in ("content-length", "transfer-encoding")}
+        with self._lock:
+            previous = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, url, status, headers, size, stored_at, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    str(request.url),
+                    response.status_code,
+                    json.dumps(headers),
+                    size,
+                    now,
+                    self.expires_at(str(request.url), response.status_code, now),
+                    now,
+                ),
+            )
+            self._total += size - (previous[0] if previous else 0)
+            self.stats.stores += 1
+            if self._total > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        target = int(self.max_bytes * 0.9)
+        rows = self._db.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall()
+        for key, size in rows:
+            if self._total <= target:
+                break
+            self._path(key).unlink(missing_ok=True)
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._total -= size
+            self.stats.evictions += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": size, **self.stats.as_dict()}
+
+    def offline_miss(self, request: httpx.Request) -> OfflineCacheMiss:
+        self.stats.offline_misses += 1
+        return OfflineCacheMiss(f"Hors-ligne : {request.url} absent du cache.", request=request)
+
+    def _new_tmp(self) -> Path:
+        tmp_dir = self.directory / "tmp"
+        tmp_dir.mkdir(exist_ok=True)
+        return tmp_dir / f"{os.getpid()}-{threading.get_ident()}-{time.monotonic_ns()}.part"
+
+
+def _iter_cached(path: Path) -> Iterator[bytes]:
+    decompressor = zlib.decompressobj()
+    with path.open("rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+
+class _CachedStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    def __init__(self, path: Path) -> None:
+        self._path = path
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from _iter_cached(self._path)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for chunk in _iter_cached(self._path):
+            yield chunk
+
+
+class _Recorder:
+    """Compresse au fil de l'eau les morceaux lus par l'appelant ; l'entrée n'est validée que si le corps est complet."""
+
+    def __init__(self, cache: HttpCache, request: httpx.Request, response: httpx.Response) -> None:
+        self.cache = cache
+        self.request = request
+        self.response = response
+        self.tmp_path = cache._new_tmp()
+        self._file = self.tmp_path.open("wb")
+        self._compressor = zlib.compressobj(6)
+        self._size = 0
+        self._done = False
+
+    def write(self, chunk: bytes) -> None:
+        self._size += self._file.write(self._compressor.compress(chunk))
+
+    def finish(self) -> None:
+        self._size += self._file.write(self._compressor.flush())
+        self._file.close()
+        self._done = True
+        self.cache.store(self.request, self.response, self.tmp_path, self._size)
+
+    def discard(self) -> None:
+        if not self._done:
+            self._file.close()
+            self.tmp_path.unlink(missing_ok=True)
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, inner: httpx.SyncByteStream, recorder: _Recorder) -> None:
+        self._inner = inner
+        self._recorder = recorder
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._inner:
+            self._recorder.write(chunk)
+            yield chunk
+        self._recorder.finish()
+
+    def close(self) -> None:
+        self._recorder.discard()
+        self._inner.close()
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, recorder: _Recorder) -> None:
+        self._inner = inner
+        self._recorder = recorder
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._inner:
+            self._recorder.write(chunk)
+            yield chunk
+        self._recorder.finish()
+
+    async def aclose(self) -> None:
+        self._recorder.discard()
+        await self._inner.aclose()
+
+
+def _cached_response(request: httpx.Request, status: int, headers: dict, path: Path) -> httpx.Response:
+    return httpx.Response(status, headers={**headers, "x-cache": "hit"}, stream=_CachedStream(path), request=request)
+
+
+class CachingTransport(httpx.BaseTransport):
+    def __init__(self, cache: HttpCache, inner: Optional[httpx.BaseTransport] = None) -> None:
+        self.cache = cache
+        self.inner = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        hit = self.cache.lookup(request)
+        if hit:
+            return _cached_response(request, *hit)
+        if self.cache.offline:
+            raise self.cache.offline_miss(request)
+        response = self.inner.handle_request(request)
+        if not self.cache.should_store(request, response):
+            return response
+        recorder = _Recorder(self.cache, request, response)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, recorder),
+            extensions=response.extensions,
+            request=request,
+        )
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class AsyncCachingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cache: HttpCache, inner: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self.cache = cache
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        hit = self.cache.lookup(request)
+        if hit:
+            return _cached_response(request, *hit)
+        if self.cache.offline:
+            raise self.cache.offline_miss(request)
+        response = await self.inner.handle_async_request(request)
+        if not self.cache.should_store(request, response):
+            return response
+        recorder = _Recorder(self.cache, request, response)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_AsyncRecordingStream(response.stream, recorder),
+            extensions=response.extensions,
+            request=request,
+        )
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+@lru_cache
+def get_http_cache() -> Optional[HttpCache]:
+    settings = get_settings()
+    if not settings.http_cache_enabled:
+        if settings.offline:
+            raise RuntimeError("Le mode hors-ligne nécessite le cache HTTP (WIKI_HTTP_CACHE).")
+        return None
+    return HttpCache(
+        settings.http_cache_dir,
+        max_bytes=settings.http_cache_max_mb * 1024 * 1024,
+        ttl=settings.http_cache_ttl,
+        offline=settings.offline,
+    )
@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+import httpx
+
+from .config import get_settings
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+THROTTLE_STATUSES = frozenset({429, 503})
+# Attente maximale entre deux tentatives de prise de créneau de concurrence.
+SLOT_POLL_INTERVAL = 0.02
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Trop d'échecs consécutifs sur l'hôte : les requêtes sont refusées sans appel réseau pendant le cooldown."""
+
+
+@dataclass
+class SchedulerStats:
+    requests: int = 0
+    retries: int = 0
+    throttled: int = 0  # réponses 429 / 503
+    server_errors: int = 0
+    transport_errors: int = 0
+    circuit_rejections: int = 0
+    circuit_opens: int = 0
+    wait_seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    """Délai demandé par l'en-tête Retry-After (secondes ou date HTTP), ou None."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostScheduler:
+    """
+    Ordonnanceur d'un hôte, partagé par tous les clients (threads et boucles asyncio) :
+
+    - seau à jetons : au plus `rate` requêtes/s, rafales de `burst` ;
+    - concurrence adaptative AIMD : +1/limite par succès, x`decrease` sur 429/503, bornée à [1, max_concurrency] ;
+    - pause globale de l'hôte quand le serveur envoie Retry-After ;
+    - disjoncteur : après `failure_threshold` échecs consécutifs, refus immédiat pendant `cooldown` secondes,
+      puis une seule requête d'essai (half-open).
+
+    L'état est protégé par un verrou de thread ; `reserve()` ne bloque jamais et renvoie le temps à attendre,
+    ce qui permet d'attendre avec time.sleep comme avec asyncio.sleep.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_concurrency: int,
+        initial_concurrency: Optional[int] = None,
+        decrease: float = 0.5,
+        failure_threshold: int = 10,
+        cooldown: float = 30.0,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.limit = float(initial_concurrency or max_concurrency)
+        self.decrease = decrease
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.stats = SchedulerStats()
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def reserve(self) -> float:
+        """Prend un jeton et un créneau si possible (renvoie 0.0), sinon renvoie le délai avant de réessayer."""
+        with self._lock:
+            now = time.monotonic()
+            if self._open_until:
+                if now < self._open_until:
+                    self.stats.circuit_rejections += 1
+                    raise CircuitOpenError(f"Circuit ouvert encore {self._open_until - now:.1f}s")
+                if self._probing:
+                    return SLOT_POLL_INTERVAL
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._in_flight >= int(self.limit):
+                return SLOT_POLL_INTERVAL
+            self._refill(now)
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+            self._in_flight += 1
+            self._probing = bool(self._open_until)
+            self.stats.requests += 1
+            return 0.0
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def abort(self) -> None:
+        """
+        Requête interrompue sans issue (annulation, erreur inattendue) : libère le créneau. Si c'était l'essai
+        half-open, le disjoncteur est réarmé pour un cooldown, sinon plus aucune requête ne passerait.
+        """
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            if self._probing:
+                self._probing = False
+                self._open_until = time.monotonic() + self.cooldown
+
+    def record(self, response: Optional[httpx.Response]) -> None:
+        """Met à jour AIMD et disjoncteur d'après l'issue d'une requête (None = erreur de transport)."""
+        with self._lock:
+            status = response.status_code if response is not None else None
+            if status is None:
+                self.stats.transport_errors += 1
+            elif status in THROTTLE_STATUSES:
+                self.stats.throttled += 1
+            elif status >= 500:
+                self.stats.server_errors += 1
+            if status in THROTTLE_STATUSES:
+                self.limit = max(1.0, self.limit * self.decrease)
+                delay = retry_after(response)
+                if delay:
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            if status is None or status in RETRY_STATUSES:
+                self._failures += 1
+                if self._failures >= self.failure_threshold or self._probing:
+                    if not self._open_until or self._probing:
+                        self.stats.circuit_opens += 1
+                    self._open_until = time.monotonic() + self.cooldown
+                    self._probing = False
+                return
+            self._failures = 0
+            self._open_until = 0.0
+            self._probing = False
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+
+    def acquire(self) -> None:
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return
+            self.stats.wait_seconds += wait
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return
+            self.stats.wait_seconds += wait
+            await asyncio.sleep(wait)
+
+    def summary(self) -> dict:
+        return {**self.stats.as_dict(), "concurrency_limit": round(self.limit, 2)}
+
+
+class RequestScheduler:
+    """Un HostScheduler par hôte, plus la politique de retry (backoff exponentiel avec jitter complet)."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_concurrency: int,
+        retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        failure_threshold: int,
+        cooldown: float,
+    ) -> None:
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._host_options = dict(
+            rate=rate,
+            burst=burst,
+            max_concurrency=max_concurrency,
+            failure_threshold=failure_threshold,
+            cooldown=cooldown,
+        )
+        self._hosts: Dict[str, HostScheduler] = {}
+        self._lock = threading.Lock()
+
+    def host(self, name: str) -> HostScheduler:
+        with self._lock:
+            if name not in self._hosts:
+                self._hosts[name] = HostScheduler(**self._host_options)
+            return self._hosts[name]
+
+    def backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        hinted = retry_after(response) if response is not None else None
+        return max(delay, min(hinted, self.backoff_max)) if hinted else delay
+
+    def should_retry(self, attempt: int, response: Optional[httpx.Response]) -> bool:
+        if attempt >= self.retries:
+            return False
+        return response is None or response.status_code in RETRY_STATUSES
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: host.summary() for name, host in self._hosts.items()}
+
+
+class _ReleasingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Libère le créneau de concurrence quand le corps de la réponse est fermé (réponses en streaming)."""
+
+    def __init__(self, inner, host: HostScheduler) -> None:
+        self.inner = inner
+        self.host = host
+        self._released = False
+
+    def _release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.host.release()
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.inner
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.inner:
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self.inner.close()
+        finally:
+            self._release()
+
+    async def aclose(self) -> None:
+        try:
+            await self.inner.aclose()
+        finally:
+            self._release()
+
+
+def _wrap(request: httpx.Request, response: httpx.Response, host: HostScheduler) -> httpx.Response:
+    return httpx.Response(
+        response.status_code,
+        headers=response.headers,
+        stream=_ReleasingStream(response.stream, host),
+        extensions=response.extensions,
+        request=request,
+    )
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    def __init__(self, scheduler: RequestScheduler, inner: Optional[httpx.BaseTransport] = None) -> None:
+        self.scheduler = scheduler
+        self.inner = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        host = self.scheduler.host(request.url.host)
+        attempt = 0
+        while True:
+            host.acquire()
+            try:
+                response = self.inner.handle_request(request)
+            except httpx.TransportError:
+                host.release()
+                host.record(None)
+                if not self.scheduler.should_retry(attempt, None):
+                    raise
+                response = None
+            except BaseException:
+                # Annulation (CancelledError, KeyboardInterrupt...) : le créneau ne doit pas rester occupé.
+                host.abort()
+                raise
+            else:
+                host.record(response)
+                if not self.scheduler.should_retry(attempt, response):
+                    return _wrap(request, response, host)
+                try:
+                    response.close()
+                finally:
+                    host.release()
+            host.stats.retries += 1
+            time.sleep(self.scheduler.backoff(attempt, response))
+            attempt += 1
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class AsyncScheduledTransport(httpx.AsyncBaseTransport):
+    def __init__(self, scheduler: RequestScheduler, inner: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self.scheduler = scheduler
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = self.scheduler.host(request.url.host)
+        attempt = 0
+        while True:
+            await host.acquire_async()
+            try:
+                response = await self.inner.handle_async_request(request)
+            except httpx.TransportError:
+                host.release()
+                host.record(None)
+                if not self.scheduler.should_retry(attempt, None):
+                    raise
+                response = None
+            except BaseException:
+                # Annulation (CancelledError, KeyboardInterrupt...) : le créneau ne doit pas rester occupé.
+                host.abort()
+                raise
+            else:
+                host.record(response)
+                if not self.scheduler.should_retry(attempt, response):
+                    return _wrap(request, response, host)
+                try:
+                    await response.aclose()
+                finally:
+                    host.release()
+            host.stats.retries += 1
+            await asyncio.sleep(self.scheduler.backoff(attempt, response))
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+@lru_cache
+def get_scheduler() -> RequestScheduler:
+    """Ordonnanceur unique du process : tous les clients Wikimedia partagent les mêmes budgets par hôte."""
+    settings = get_settings()
+    return RequestScheduler(
+        rate=settings.http_rate_limit,
+        burst=settings.http_burst,
+        max_concurrency=settings.http_max_concurrency,
+        retries=settings.http_retries,
+        backoff_base=settings.http_backoff_base,
+        backoff_max=settings.http_backoff_max,
+        failure_threshold=settings.http_circuit_threshold,
+        cooldown=settings.http_circuit_cooldown,
+    )
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import importlib.util
+import logging
+import threading
+from concurrent.futures import Future
+from typing import AsyncIterator, Awaitable, Optional, TypeVar
+
+import httpx
+
+from .config import get_settings
+from .http_cache import AsyncCachingTransport, CachingTransport, get_http_cache
+from .http_scheduler import AsyncScheduledTransport, ScheduledTransport, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class _BorrowedTransport(httpx.BaseTransport):
+    """Vue d'un client sur le transport partagé : fermer le client ne ferme pas le pool de connexions."""
+
+    def __init__(self, inner: httpx.BaseTransport) -> None:
+        self.inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.inner.handle_request(request)
+
+    def close(self) -> None:
+        pass
+
+
+class _BridgedStream(httpx.AsyncByteStream):
+    """Corps d'une réponse lue sur la boucle du runtime, consommé depuis une autre boucle."""
+
+    def __init__(self, inner: httpx.AsyncByteStream, runtime: "HttpRuntime") -> None:
+        self.inner = inner
+        self.runtime = runtime
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        iterator = self.inner.__aiter__()
+        while True:
+            try:
+                yield await asyncio.wrap_future(self.runtime.submit(iterator.__anext__()))
+            except StopAsyncIteration:
+                return
+
+    async def aclose(self) -> None:
+        await asyncio.wrap_future(self.runtime.submit(self.inner.aclose()))
+
+
+class _BorrowedAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    Vue asynchrone du transport partagé. Le pool asynchrone appartient à la boucle du runtime :
+    appelé depuis une autre boucle, l'échange est relayé vers elle au lieu de casser le pool.
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, runtime: "HttpRuntime") -> None:
+        self.inner = inner
+        self.runtime = runtime
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.runtime.in_loop():
+            return await self.inner.handle_async_request(request)
+        response = await asyncio.wrap_future(self.runtime.submit(self.inner.handle_async_request(request)))
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_BridgedStream(response.stream, self.runtime),
+            extensions=response.extensions,
+            request=request,
+        )
+
+    async def aclose(self) -> None:
+        pass
+
+
+class HttpRuntime:
+    """
+    Transports HTTP du process, créés à la première utilisation et partagés par tous les clients :
+    cache disque -> ordonnanceur (débit, retries) -> pool de connexions keep-alive (HTTP/2 si `h2` est installé).
+
+    Le pool asynchrone vit sur une boucle asyncio dédiée (thread démon) : les appels synchrones
+    (`run`) y soumettent leurs coroutines, si bien que les connexions survivent d'un appel à l'autre.
+    """
+
+    def __init__(self) -> None:
+        settings = get_settings()
+        self.http2 = settings.http2 and http2_available()
+        if settings.http2 and not self.http2:
+            logger.warning("HTTP/2 demandé mais le paquet h2 est absent (pip install httpx[http2]) : HTTP/1.1.")
+        self.limits = httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        )
+        self._lock = threading.Lock()
+        self._transport: Optional[httpx.BaseTransport] = None
+        self._async_transport: Optional[httpx.AsyncBaseTransport] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _stack(self, network, scheduled, caching):
+        inner = scheduled(get_scheduler(), network)
+        cache = get_http_cache()
+        return caching(cache, inner) if cache else inner
+
+    def transport(self) -> httpx.BaseTransport:
+        with self._lock:
+            if self._transport is None:
+                network = httpx.HTTPTransport(http2=self.http2, limits=self.limits)
+                self._transport = self._stack(network, ScheduledTransport, CachingTransport)
+            return _BorrowedTransport(self._transport)
+
+    def async_transport(self) -> httpx.AsyncBaseTransport:
+        self.loop()
+        with self._lock:
+            if self._async_transport is None:
+                network = httpx.AsyncHTTPTransport(http2=self.http2, limits=self.limits)
+                self._async_transport = self._stack(network, AsyncScheduledTransport, AsyncCachingTransport)
+            return _BorrowedAsyncTransport(self._async_transport, self)
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="http-loop", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def submit(self, coro: Awaitable[T]) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop())
+
+    def run(self, coro: Awaitable[T]) -> T:
+        """Exécute une coroutine sur la boucle du runtime et attend son résultat (à appeler hors de cette boucle)."""
+        if self.in_loop():
+            raise RuntimeError("HttpRuntime.run appelé depuis la boucle du runtime : utiliser await.")
+        return self.submit(coro).result()
+
+    def close(self) -> None:
+        with self._lock:
+            transport, self._transport = self._transport, None
+            async_transport, self._async_transport = self._async_transport, None
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+        if transport is not None:
+            transport.close()
+        if loop is not None:
+            if async_transport is not None:
+                asyncio.run_coroutine_threadsafe(async_transport.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+
+_runtime: Optional[HttpRuntime] = None
+_runtime_lock = threading.Lock()
+
+
+def get_http_runtime() -> HttpRuntime:
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = HttpRuntime()
+        return _runtime
+
+
+def shared_transport() -> httpx.BaseTransport:
+    """Transport synchrone partagé, à passer aux clients (httpx.Client(transport=...))."""
+    return get_http_runtime().transport()
+
+
+def shared_async_transport() -> httpx.AsyncBaseTransport:
+    return get_http_runtime().async_transport()
+
+
+def run_async(coro: Awaitable[T]) -> T:
+    """Remplace asyncio.run pour le code HTTP : la boucle (et ses connexions) reste vivante entre les appels."""
+    return get_http_runtime().run(coro)
+
+
+@atexit.register
+def close_http() -> None:
+    """Ferme les pools de connexions et arrête la boucle HTTP (fin de commande ou de process)."""
+    global _runtime
+    with _runtime_lock:
+        runtime, _runtime = _runtime, None
+    if runtime is not None:
+        runtime.close()
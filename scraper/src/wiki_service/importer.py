@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+
+import httpx
+import numpy as np
+
+from .bulk_writer import insert_semester_stats, link_articles_theme, upsert_articles
+from .config import get_settings
+from .db import get_session
+from .http_transport import run_async
+from .ingestion import record_units
+from .metrics import span
+from .question_builder import ensure_theme
+from .theme_classifier import get_classifier
+from .themes import THEMES
+from .titles import TitleResolver, canonicalize
+from .top_aggregate import SemesterTopAggregate
+from .top_views_fetcher import TopViewsFetcher
+
+_DONE = object()
+
+
+def describe_error(exc: BaseException) -> str:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"HTTP {exc.response.status_code} {exc.request.url}"
+    return str(exc) or exc.__class__.__name__
+
+
+@dataclass
+class PeriodImportResult:
+    year: int
+    semester: str
+    articles: int = 0
+    error: Optional[str] = None
+
+
+def store_top(
+    year: int,
+    semester: str,
+    limit: int,
+    aggregate: SemesterTopAggregate,
+    project: str,
+    echo: Callable[[str], None] = print,
+    resolver: Optional[TitleResolver] = None,
+) -> int:
+    """
+    Classe les articles agrégés par thème et enregistre les meilleurs (articles, liens, stats).
+    Les redirections sont d'abord fusionnées avec leur page canonique (resolver, ou celui du projet si
+    WIKI_RESOLVE_REDIRECTS est actif).
+
+    Chaque thème est écrit dans sa propre transaction puis la session est fermée : l'identity map ne grossit
+    pas au fil des thèmes et un thème déjà écrit reste acquis si un suivant échoue (les écritures sont idempotentes).
+    """
+    echo(f"{len(aggregate)} articles agrégés depuis les tops ({aggregate.nbytes / 1e6:.1f} Mo).")
+    if resolver is None and get_settings().resolve_redirects:
+        resolver = TitleResolver(project)
+    page_ids = canonicalize(aggregate, resolver, echo=echo) if resolver else {}
+    with span("classify"):
+        classification = get_classifier().classify_indices(aggregate.titles)
+    stored = 0
+    for theme_cfg in THEMES:
+        name = theme_cfg["name"]
+        selected = aggregate.top_indices(np.asarray(classification[name], dtype=np.int64), limit)
+        echo(f"Thème '{name}': {len(selected)} articles retenus.")
+
+        with span("write"), get_session() as session:
+            theme = ensure_theme(session, name)
+            titles = [aggregate.titles[index] for index in selected]
+            slug_ids = upsert_articles(session, titles, project=project, page_ids=page_ids)
+            article_ids = [slug_ids[title.replace(" ", "_")] for title in titles]
+            link_articles_theme(session, article_ids, theme.id)
+            # La série n'est encodée que pour les titres retenus, directement depuis la matrice.
+            insert_semester_stats(
+                session,
+                [
+                    {
+                        "project": project,
+                        "article_id": article_id,
+                        "year": year,
+                        "semester": semester,
+                        **aggregate.stat_row(index),
+                    }
+                    for article_id, index in zip(article_ids, selected)
+                ],
+            )
+        stored += len(selected)
+    # Tops inscrits au registre : l'ingestion incrémentale ne les retélécharge pas.
+    with get_session() as session:
+        record_units(session, project, aggregate.units())
+    return stored
+
+
+def run_import_pipeline(
+    periods: Sequence[tuple[int, str]],
+    limit: int,
+    project: str,
+    fetcher: Optional[TopViewsFetcher] = None,
+    queue_size: Optional[int] = None,
+    echo: Callable[[str], None] = print,
+) -> List[PeriodImportResult]:
+    """
+    Import producteur / consommateur : un thread télécharge les semestres (asyncio) pendant que le thread
+    appelant écrit en base les semestres déjà reçus.
+
+    La file bornée entre les deux étages limite le nombre d'agrégats en mémoire. Chaque période est écrite
+    indépendamment : un échec n'annule pas les périodes précédentes et n'arrête pas les suivantes.
+    """
+    settings = get_settings()
+    fetcher = fetcher or TopViewsFetcher(project=project)
+    # Un seul résolveur pour toutes les périodes : les titres résolus pour un semestre servent aux suivants.
+    resolver = TitleResolver(project) if settings.resolve_redirects else None
+    handoff: queue.Queue = queue.Queue(maxsize=max(1, queue_size or settings.import_queue_size))
+
+    def produce() -> None:
+        async def run() -> None:
+            loop = asyncio.get_running_loop()
+            async for period, result in fetcher.iter_semesters_aggregate_async(periods):
+                # put bloquant déporté hors de la boucle : les téléchargements en cours continuent.
+                await loop.run_in_executor(None, handoff.put, (period, result))
+
+        try:
+            run_async(run())
+        except BaseException as exc:  # noqa: BLE001
+            handoff.put((None, exc))
+        finally:
+            handoff.put(_DONE)
+
+    producer = threading.Thread(target=produce, name="top-fetch", daemon=True)
+    producer.start()
+
+    results: List[PeriodImportResult] = []
+    while True:
+        item = handoff.get()
+        if item is _DONE:
+            break
+        period, payload = item
+        if period is None:
+            echo(f"Téléchargement interrompu : {describe_error(payload)}")
+            break
+        year, semester = period
+        result = PeriodImportResult(year=year, semester=semester)
+        echo(f"== Import {year}-{semester} ==")
+        if isinstance(payload, Exception):
+            result.error = f"téléchargement : {describe_error(payload)}"
+        else:
+            try:
+                result.articles = store_top(year, semester, limit, payload, project, echo=echo, resolver=resolver)
+            except Exception as exc:  # noqa: BLE001
+                result.error = f"écriture : {describe_error(exc)}"
+        if result.error:
+            echo(f"Echec {year}-{semester} ({result.error}), on continue.")
+        results.append(result)
+        del payload
+    producer.join(timeout=1)
+    return results
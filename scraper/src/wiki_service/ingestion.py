@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import calendar
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .bulk_writer import chunked, dialect_insert, insert_semester_stats, link_articles_theme, upsert_articles
+from .config import get_settings
+from .db import get_session
+from .metrics import span
+from .models import Article, ArticleSemesterStat, IngestionLedger
+from .periods import months_for_semester
+from .question_builder import ensure_theme
+from .theme_classifier import get_classifier
+from .themes import THEMES
+from .titles import TitleResolver, canonicalize
+from .top_aggregate import SemesterTopAggregate
+from .top_views_fetcher import TopViewsFetcher
+
+# (année, mois, jour) ; jour = 0 pour un top mensuel "all-days".
+Unit = tuple[int, int, int]
+
+
+class IngestionConflict(ValueError):
+    """Un autre process a ingéré les mêmes tops pendant ce run : rien n'est écrit."""
+
+
+def ingested_units(session: Session, project: str, year: int, semester: str) -> set[Unit]:
+    months = months_for_semester(semester)
+    return {
+        (row.year, row.month, row.day)
+        for row in session.execute(
+            select(IngestionLedger.year, IngestionLedger.month, IngestionLedger.day).where(
+                IngestionLedger.project == project,
+                IngestionLedger.year == year,
+                IngestionLedger.month.in_(months),
+            )
+        )
+    }
+
+
+def planned_units(year: int, semester: str, ingested: set[Unit], today: date) -> List[Unit]:
+    """
+    Tops qui manquent au semestre : le top mensuel de chaque mois terminé jamais ingéré, et un top quotidien
+    par jour publié (jusqu'à hier) pour le mois en cours. Un mois commencé au jour le jour est terminé au jour
+    le jour : son top mensuel compterait une seconde fois les jours déjà versés.
+    """
+    last_day = today - timedelta(days=1)
+    units: List[Unit] = []
+    for month in months_for_semester(semester):
+        if date(year, month, 1) > last_day:
+            break
+        if (year, month, 0) in ingested:
+            continue
+        month_end = date(year, month, calendar.monthrange(year, month)[1])
+        daily = any(unit[:2] == (year, month) and unit[2] for unit in ingested)
+        if month_end <= last_day and not daily:
+            units.append((year, month, 0))
+            continue
+        units += [
+            (year, month, day)
+            for day in range(1, min(month_end, last_day).day + 1)
+            if (year, month, day) not in ingested
+        ]
+    return units
+
+
+def record_units(session: Session, project: str, units: Iterable[tuple[int, int, int, int]]) -> int:
+    """
+    Inscrit les tops (année, mois, jour, articles) au registre dans la transaction des écritures qu'ils ont produites.
+    Retourne le nombre de lignes réellement insérées (les tops déjà inscrits sont ignorés).
+    """
+    rows = [
+        {"project": project, "year": year, "month": month, "day": day, "articles": articles}
+        for year, month, day, articles in units
+    ]
+    if not rows:
+        return 0
+    stmt = (
+        dialect_insert(session, IngestionLedger)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["project", "year", "month", "day"])
+        .returning(IngestionLedger.day)
+    )
+    return len(session.execute(stmt).all())
+
+
+def existing_stats(
+    session: Session, project: str, year: int, semester: str, slugs: Sequence[str]
+) -> Dict[str, ArticleSemesterStat]:
+    """Stats du semestre déjà en base pour ces slugs (une requête par lot)."""
+    stats: Dict[str, ArticleSemesterStat] = {}
+    for chunk in chunked(list(slugs), 1000):
+        for slug, stat in session.execute(
+            select(Article.slug, ArticleSemesterStat)
+            .join(ArticleSemesterStat, ArticleSemesterStat.article_id == Article.id)
+            .where(
+                Article.project == project,
+                Article.slug.in_(list(chunk)),
+                ArticleSemesterStat.project == project,
+                ArticleSemesterStat.year == year,
+                ArticleSemesterStat.semester == semester,
+            )
+        ):
+            stats[slug] = stat
+    return stats
+
+
+@dataclass
+class IngestionReport:
+    year: int
+    semester: str
+    planned: int = 0
+    fetched: int = 0
+    appended: int = 0  # stats existantes prolongées
+    inserted: int = 0  # nouvelles stats
+    wall_time: float = 0.0
+
+    def lines(self) -> List[str]:
+        if not self.planned:
+            return [f"{self.year}-{self.semester} déjà à jour."]
+        return [
+            f"{self.year}-{self.semester} : {self.fetched}/{self.planned} tops publiés ingérés, "
+            f"{self.appended} stats prolongées, {self.inserted} nouvelles, durée : {self.wall_time:.1f}s"
+        ]
+
+
+def apply_top(
+    session: Session,
+    year: int,
+    semester: str,
+    limit: int,
+    aggregate: SemesterTopAggregate,
+    project: str,
+    report: IngestionReport,
+    page_ids: Optional[Mapping[str, int]] = None,
+) -> None:
+    """
+    Verse un agrégat partiel dans le semestre : les stats existantes reçoivent les jours postérieurs à leur série,
+    et les meilleurs nouveaux articles de chaque thème (comme store_top) reçoivent une stat.
+    """
+    with span("classify"):
+        classification = get_classifier().classify_indices(aggregate.titles)
+    slugs = [title.replace(" ", "_") for title in aggregate.titles]
+    rows_by_slug = {slug: index for index, slug in enumerate(slugs)}
+    with span("write"):
+        stats = existing_stats(session, project, year, semester, slugs)
+        for slug, stat in stats.items():
+            report.appended += stat.append_days(aggregate.points(rows_by_slug[slug]))
+        session.flush()
+        rows: Dict[int, dict] = {}
+        for theme_cfg in THEMES:
+            selected = aggregate.top_indices(np.asarray(classification[theme_cfg["name"]], dtype=np.int64), limit)
+            if not len(selected):
+                continue
+            theme = ensure_theme(session, theme_cfg["name"])
+            titles = [aggregate.titles[index] for index in selected]
+            slug_ids = upsert_articles(session, titles, project=project, page_ids=page_ids)
+            link_articles_theme(session, [slug_ids[slugs[index]] for index in selected], theme.id)
+            for index in selected:
+                article_id = slug_ids[slugs[index]]
+                if slugs[index] not in stats and article_id not in rows:
+                    rows[article_id] = {
+                        "project": project,
+                        "article_id": article_id,
+                        "year": year,
+                        "semester": semester,
+                        **aggregate.stat_row(index),
+                    }
+        insert_semester_stats(session, list(rows.values()))
+        report.inserted += len(rows)
+
+
+def ingest_semester(
+    year: int,
+    semester: str,
+    limit: int,
+    project: str,
+    fetcher: Optional[TopViewsFetcher] = None,
+    today: Optional[date] = None,
+    echo: Callable[[str], None] = print,
+    resolver: Optional[TitleResolver] = None,
+) -> IngestionReport:
+    """
+    Ingestion incrémentale d'un semestre : seuls les tops absents du registre sont téléchargés (quotidiens pour le
+    mois en cours), puis versés dans les stats et inscrits au registre dans une même transaction.
+    """
+    report = IngestionReport(year=year, semester=semester)
+    started = time.perf_counter()
+    with get_session() as session:
+        units = planned_units(year, semester, ingested_units(session, project, year, semester), today or date.today())
+    report.planned = len(units)
+    if not units:
+        return report
+    echo(f"{year}-{semester} : {len(units)} tops à télécharger ({units[0]} .. {units[-1]}).")
+    fetcher = fetcher or TopViewsFetcher(project=project)
+    aggregate, found = fetcher.fetch_units_aggregate(year, semester, units)
+    report.fetched = len(found)
+    if found:
+        # Résolution des redirections (réseau) avant d'ouvrir la transaction d'écriture.
+        if resolver is None and get_settings().resolve_redirects:
+            resolver = TitleResolver(project)
+        page_ids = canonicalize(aggregate, resolver, echo=echo) if resolver else {}
+        with get_session() as session:
+            # Registre d'abord : un run concurrent qui a déjà inscrit ces tops fait tout annuler ici.
+            counts = {unit[:3]: unit[3] for unit in aggregate.units()}
+            if record_units(session, project, [(*unit, counts.get(unit, 0)) for unit in found]) != len(found):
+                raise IngestionConflict(f"Tops {year}-{semester} déjà ingérés par un autre process.")
+            apply_top(session, year, semester, limit, aggregate, project, report, page_ids=page_ids)
+    report.wall_time = time.perf_counter() - started
+    return report
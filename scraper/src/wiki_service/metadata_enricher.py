@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import and_, bindparam, case, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from .bulk_writer import chunked
+from .metrics import span
+from .models import Article
+from .wiki_page_client import WikiPageClient
+
+
+@dataclass
+class EnrichmentResult:
+    requested: int = 0
+    updated: int = 0
+    not_found: int = 0
+    failed: int = 0  # lots en échec : metadata_checked_at reste vide, redemandés au prochain passage
+
+
+def articles_missing_metadata(
+    session: Session, project: str, after_id: int = 0, limit: Optional[int] = None
+) -> List[tuple[int, str]]:
+    stmt = (
+        select(Article.id, Article.slug)
+        .where(
+            Article.project == project,
+            Article.id > after_id,
+            Article.metadata_checked_at.is_(None),
+        )
+        .order_by(Article.id)
+    )
+    if limit:
+        stmt = stmt.limit(limit)
+    return [(row.id, row.slug) for row in session.execute(stmt)]
+
+
+def write_metadata(session: Session, rows: List[dict], batch_size: int) -> None:
+    """
+    UPDATE en masse par id ; COALESCE conserve les valeurs existantes quand l'API ne renvoie rien. updated_at
+    n'avance que si une valeur change : il déclenche la republication des snapshots (publish-questions).
+    """
+    table = Article.__table__
+    columns = {"title": "b_title", "page_id": "b_page_id", "summary": "b_summary", "image_url": "b_image_url"}
+    changed = or_(
+        *(
+            and_(bindparam(param).is_not(None), bindparam(param).is_distinct_from(table.c[column]))
+            for column, param in columns.items()
+        )
+    )
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(
+            **{column: func.coalesce(bindparam(param), table.c[column]) for column, param in columns.items()},
+            updated_at=case((changed, func.now()), else_=table.c.updated_at),
+        )
+    )
+    for chunk in chunked(rows, batch_size):
+        session.connection().execute(stmt, list(chunk))
+
+
+def mark_checked(session: Session, article_ids: List[int]) -> None:
+    """
+    Note les articles interrogés, trouvés ou non : une page sans extrait ni image n'est plus redemandée.
+    updated_at est conservé (seul un changement de métadonnées republie les questions).
+    """
+    table = Article.__table__
+    for chunk in chunked(article_ids, 1000):
+        session.connection().execute(
+            update(table)
+            .where(table.c.id.in_(list(chunk)))
+            .values(metadata_checked_at=func.now(), updated_at=table.c.updated_at)
+        )
+
+
+def enrich_articles(
+    session: Session,
+    articles: List[tuple[int, str]],
+    client: WikiPageClient,
+    batch_size: int,
+    max_concurrency: Optional[int] = None,
+) -> EnrichmentResult:
+    """Récupère les métadonnées d'une fenêtre d'articles (id, slug) en parallèle puis les écrit en masse."""
+    with span("enrich"):
+        fetched = client.fetch_summaries([slug for _, slug in articles], max_concurrency=max_concurrency)
+    failed = set(fetched.failed)
+    rows = []
+    for article_id, slug in articles:
+        data = fetched.get(slug)
+        if not data:
+            continue
+        rows.append(
+            {
+                "b_id": article_id,
+                "b_title": data.get("title"),
+                "b_page_id": data.get("page_id"),
+                "b_summary": data.get("summary"),
+                "b_image_url": data.get("image_url"),
+            }
+        )
+    with span("write"):
+        write_metadata(session, rows, batch_size)
+        mark_checked(session, [article_id for article_id, slug in articles if slug not in failed])
+    failures = sum(1 for _, slug in articles if slug in failed)
+    return EnrichmentResult(
+        requested=len(articles),
+        updated=len(rows),
+        not_found=len(articles) - len(rows) - failures,
+        failed=failures,
+    )
@@ -0,0 +1,421 @@
+from __future__ import annotations
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import get_settings
+
+_NOOP = contextlib.nullcontext()
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)")
+_REPEATED_GROUPS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACES = re.compile(r"\s+")
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def normalize_sql(statement: str) -> str:
+    """Forme canonique d'une requête : listes IN et VALUES multi-lignes réduites, pour regrouper les exécutions."""
+    sql = _SPACES.sub(" ", statement.strip())
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return _REPEATED_GROUPS.sub("(...)", sql)
+
+
+def call_site() -> Optional[str]:
+    """Premier appelant dans wiki_service (hors ce module) : d'où part la requête."""
+    for frame in reversed(traceback.extract_stack(limit=60)):
+        if frame.filename.startswith(_PACKAGE_DIR) and not frame.filename.endswith("metrics.py"):
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} ({frame.name})"
+    return None
+
+
+@dataclass
+class SpanStat:
+    calls: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+@dataclass
+class HttpStat:
+    requests: int = 0
+    cache_hits: int = 0
+    errors: int = 0  # statut >= 400 ou erreur réseau
+    bytes: int = 0
+    seconds: float = 0.0  # jusqu'aux en-têtes de réponse
+
+
+@dataclass
+class SqlStat:
+    kind: str
+    executions: int = 0
+    executemany: int = 0
+    seconds: float = 0.0
+    origin: Optional[str] = None
+
+
+class Metrics:
+    """
+    Mesures d'une commande : durée cumulée par étape (spans), compteurs HTTP par client et requêtes SQL
+    regroupées par forme normalisée. Les spans de threads ou de coroutines concurrents se cumulent :
+    leur total peut dépasser la durée de la commande.
+    """
+
+    def __init__(self, n_plus_one: int) -> None:
+        self.n_plus_one_threshold = n_plus_one
+        self.command: Optional[str] = None
+        self.started = time.perf_counter()
+        self.spans: Dict[str, SpanStat] = defaultdict(SpanStat)
+        self.http: Dict[str, HttpStat] = defaultdict(HttpStat)
+        self.sql: Dict[str, SqlStat] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stat = self.spans[name]
+            stat.calls += 1
+            stat.seconds += seconds
+            stat.max_seconds = max(stat.max_seconds, seconds)
+
+    def add_response(self, client: str, response: Optional[httpx.Response], seconds: float) -> None:
+        with self._lock:
+            stat = self.http[client]
+            stat.requests += 1
+            stat.seconds += seconds
+            if response is None or response.status_code >= 400:
+                stat.errors += 1
+            elif response.headers.get("x-cache") == "hit":
+                stat.cache_hits += 1
+
+    def add_bytes(self, client: str, size: int) -> None:
+        with self._lock:
+            self.http[client].bytes += size
+
+    def add_statement(self, statement: str, seconds: float, executemany: bool) -> None:
+        key = normalize_sql(statement)
+        stat = self.sql.get(key)
+        if stat is None:
+            # Site d'appel relevé une seule fois par forme de requête : coût négligeable.
+            origin = call_site()
+            with self._lock:
+                stat = self.sql.setdefault(key, SqlStat(kind=key.split(" ", 1)[0].upper(), origin=origin))
+        with self._lock:
+            stat.executions += 1
+            stat.executemany += int(executemany)
+            stat.seconds += seconds
+
+    def n_plus_one(self) -> List[tuple[str, SqlStat]]:
+        """SELECT unitaires répétés au moins n_plus_one_threshold fois : boucle de requêtes probable."""
+        suspects = [
+            (sql, stat)
+            for sql, stat in self.sql.items()
+            if stat.kind == "SELECT" and stat.executions - stat.executemany >= self.n_plus_one_threshold
+        ]
+        return sorted(suspects, key=lambda item: item[1].executions, reverse=True)
+
+    def sql_by_kind(self) -> Dict[str, SqlStat]:
+        kinds: Dict[str, SqlStat] = {}
+        for stat in self.sql.values():
+            total = kinds.setdefault(stat.kind, SqlStat(kind=stat.kind))
+            total.executions += stat.executions
+            total.executemany += stat.executemany
+            total.seconds += stat.seconds
+        return kinds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> dict:
+        return {
+            "command": self.command,
+            "seconds": self.elapsed(),
+            "spans": {name: asdict(stat) for name, stat in sorted(self.spans.items())},
+            "http": {client: asdict(stat) for client, stat in sorted(self.http.items())},
+            "sql": {
+                "statements": sum(stat.executions for stat in self.sql.values()),
+                "seconds": sum(stat.seconds for stat in self.sql.values()),
+                "by_kind": {kind: asdict(stat) for kind, stat in sorted(self.sql_by_kind().items())},
+                "top": [
+                    {"sql": sql, **asdict(stat)}
+                    for sql, stat in sorted(self.sql.items(), key=lambda item: item[1].seconds, reverse=True)[:20]
+                ],
+                "n_plus_one": [{"sql": sql, **asdict(stat)} for sql, stat in self.n_plus_one()],
+            },
+        }
+
+    def lines(self) -> List[str]:
+        lines = [f"Mesures {self.command or ''} : {self.elapsed():.2f}s"]
+        for name, stat in sorted(self.spans.items(), key=lambda item: item[1].seconds, reverse=True):
+            lines.append(
+                f"  étape {name} : {stat.seconds:.2f}s cumulées, {stat.calls} appels, max {stat.max_seconds * 1000:.1f} ms"
+            )
+        for client, stat in sorted(self.http.items()):
+            lines.append(
+                f"  HTTP {client} : {stat.requests} requêtes, {stat.cache_hits} hits cache, {stat.errors} erreurs, "
+                f"{stat.bytes / 1e6:.1f} Mo, {stat.seconds:.2f}s jusqu'aux en-têtes"
+            )
+        for kind, stat in sorted(self.sql_by_kind().items()):
+            lines.append(
+                f"  SQL {kind} : {stat.executions} requêtes ({stat.executemany} executemany), {stat.seconds:.2f}s"
+            )
+        for sql, stat in self.n_plus_one():
+            lines.append(
+                f"  N+1 probable ({stat.executions} fois, {stat.origin or 'origine inconnue'}) : {sql[:160]}"
+            )
+        return lines
+
+    def prometheus(self) -> str:
+        """Format texte Prometheus (textfile collector de node_exporter)."""
+        command = self.command or "unknown"
+        out: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[tuple[dict, float]]) -> None:
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                rendered = ",".join(f'{key}="{label}"' for key, label in {"command": command, **labels}.items())
+                out.append(f"{name}{{{rendered}}} {value}")
+
+        metric("wiki_command_duration_seconds", "gauge", "Durée de la commande.", [({}, self.elapsed())])
+        spans = sorted(self.spans.items())
+        metric("wiki_stage_seconds_total", "counter", "Temps cumulé par étape.",
+               [({"stage": name}, stat.seconds) for name, stat in spans])
+        metric("wiki_stage_calls_total", "counter", "Passages par étape.",
+               [({"stage": name}, stat.calls) for name, stat in spans])
+        http = sorted(self.http.items())
+        metric("wiki_http_requests_total", "counter", "Requêtes HTTP par client.",
+               [({"client": client}, stat.requests) for client, stat in http])
+        metric("wiki_http_cache_hits_total", "counter", "Réponses servies par le cache HTTP.",
+               [({"client": client}, stat.cache_hits) for client, stat in http])
+        metric("wiki_http_errors_total", "counter", "Réponses >= 400 et erreurs réseau.",
+               [({"client": client}, stat.errors) for client, stat in http])
+        metric("wiki_http_response_bytes_total", "counter", "Octets de corps de réponse lus.",
+               [({"client": client}, stat.bytes) for client, stat in http])
+        kinds = sorted(self.sql_by_kind().items())
+        metric("wiki_sql_statements_total", "counter", "Requêtes SQL exécutées.",
+               [({"kind": kind}, stat.executions) for kind, stat in kinds])
+        metric("wiki_sql_seconds_total", "counter", "Temps passé dans les requêtes SQL.",
+               [({"kind": kind}, stat.seconds) for kind, stat in kinds])
+        metric("wiki_sql_n_plus_one_suspects", "gauge", "Formes de SELECT répétées unitairement.",
+               [({}, len(self.n_plus_one()))])
+        return "\n".join(out) + "\n"
+
+    def write_json(self, path: Path) -> None:
+        path.write_text(json.dumps(self.as_dict(), indent=2, ensure_ascii=False))
+
+    def write_prometheus(self, path: Path) -> None:
+        # Écriture atomique : le collecteur ne lit jamais un fichier à moitié écrit.
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.prometheus())
+        os.replace(tmp, path)
+
+
+_metrics: Optional[Metrics] = None
+_engines: List[Engine] = []
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    metrics = _metrics
+    if metrics is None:
+        return
+    started = getattr(context, "_metrics_started", None)
+    metrics.add_statement(statement, time.perf_counter() - started if started else 0.0, executemany)
+
+
+def enable_metrics(engine: Optional[Engine] = None, n_plus_one: Optional[int] = None) -> Metrics:
+    """Active les mesures pour le process ; les requêtes de `engine` sont comptées via les events SQLAlchemy."""
+    global _metrics
+    _metrics = Metrics(n_plus_one or get_settings().metrics_n_plus_one)
+    if engine is not None and engine not in _engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        _engines.append(engine)
+    return _metrics
+
+
+def disable_metrics() -> None:
+    global _metrics
+    _metrics = None
+    while _engines:
+        engine = _engines.pop()
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def get_metrics() -> Optional[Metrics]:
+    return _metrics
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics: Metrics, name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.metrics.add_span(self.name, time.perf_counter() - self.started)
+
+
+def span(name: str) -> contextlib.AbstractContextManager:
+    """Chronomètre une étape (fetch, parse, aggregate, classify, enrich, write) ; sans effet si inactif."""
+    metrics = _metrics
+    return _NOOP if metrics is None else _Span(metrics, name)
+
+
+class _MeteredStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    def __init__(self, inner, metrics: Metrics, client: str) -> None:
+        self.inner = inner
+        self.metrics = metrics
+        self.client = client
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.inner:
+            self.metrics.add_bytes(self.client, len(chunk))
+            yield chunk
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.inner:
+            self.metrics.add_bytes(self.client, len(chunk))
+            yield chunk
+
+    def close(self) -> None:
+        self.inner.close()
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+def _metered_response(response: httpx.Response, request: httpx.Request, metrics: Metrics, client: str) -> httpx.Response:
+    return httpx.Response(
+        response.status_code,
+        headers=response.headers,
+        stream=_MeteredStream(response.stream, metrics, client),
+        extensions=response.extensions,
+        request=request,
+    )
+
+
+class MeteredTransport(httpx.BaseTransport):
+    def __init__(self, inner: httpx.BaseTransport, client: str, metrics: Metrics) -> None:
+        self.inner = inner
+        self.client = client
+        self.metrics = metrics
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = self.inner.handle_request(request)
+        except Exception:
+            self.metrics.add_response(self.client, None, time.perf_counter() - started)
+            raise
+        self.metrics.add_response(self.client, response, time.perf_counter() - started)
+        return _metered_response(response, request, self.metrics, self.client)
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class AsyncMeteredTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, client: str, metrics: Metrics) -> None:
+        self.inner = inner
+        self.client = client
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except Exception:
+            self.metrics.add_response(self.client, None, time.perf_counter() - started)
+            raise
+        self.metrics.add_response(self.client, response, time.perf_counter() - started)
+        return _metered_response(response, request, self.metrics, self.client)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+def metered(transport: httpx.BaseTransport, client: str) -> httpx.BaseTransport:
+    """Compte requêtes, octets et hits cache du client ; renvoie le transport tel quel si les mesures sont inactives."""
+    metrics = _metrics
+    return transport if metrics is None else MeteredTransport(transport, client, metrics)
+
+
+def metered_async(transport: httpx.AsyncBaseTransport, client: str) -> httpx.AsyncBaseTransport:
+    metrics = _metrics
+    return transport if metrics is None else AsyncMeteredTransport(transport, client, metrics)
+
+
+@dataclass
+class CommandProfile:
+    """Profileur du thread principal, plus un par thread démarré ensuite (boucle http-loop, pools de workers)."""
+
+    main: cProfile.Profile
+    threads: List[cProfile.Profile] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def _thread_hook(self, frame, event, arg) -> None:
+        # Premier événement d'un nouveau thread : son profileur dédié remplace ce hook.
+        profiler = cProfile.Profile()
+        with self.lock:
+            self.threads.append(profiler)
+        profiler.enable()
+
+
+def start_profile() -> CommandProfile:
+    """
+    Profile la commande, tous threads confondus. Avant Python 3.12, cProfile ne suit que le thread qui l'active :
+    chaque thread démarré ensuite reçoit son profileur via threading.setprofile. Depuis 3.12 (sys.monitoring),
+    un seul profileur voit déjà tous les threads et un second ne peut pas être activé.
+    """
+    profile = CommandProfile(cProfile.Profile())
+    if sys.version_info < (3, 12):
+        threading.setprofile(profile._thread_hook)
+    profile.main.enable()
+    return profile
+
+
+def stop_profile(profile: CommandProfile, path: Path, echo: Callable[[str], None] = print, top: int = 15) -> None:
+    """
+    Arrête les profileurs, fusionne leurs stats (pstats.Stats.add), écrit le dump (pstats / snakeviz) et affiche
+    les fonctions les plus coûteuses. À appeler une fois les threads de la commande terminés (close_http).
+    """
+    profile.main.disable()
+    threading.setprofile(None)
+    with profile.lock:
+        threads = list(profile.threads)
+    buffer = io.StringIO()
+    stats = pstats.Stats(profile.main, stream=buffer)
+    if threads:
+        stats.add(*threads)
+    stats.dump_stats(str(path))
+    stats.sort_stats("cumulative").print_stats(top)
+    echo(buffer.getvalue().rstrip())
+    if threads:
+        echo(f"Threads secondaires fusionnés dans le profil : {len(threads)}.")
+    echo(f"Profil écrit dans {path} (python -m pstats {path}).")
@@ -1,10 +1,16 @@
-from datetime import datetime, timezone
-from typing import List, Optional
+from __future__ import annotations
 
-from sqlalchemy import Column, DateTime, Integer, String, UniqueConstraint, ForeignKey, Float, JSON, Text
+from datetime import date, datetime, timezone
+from typing import TYPE_CHECKING, Iterable, List, Optional
+
+from sqlalchemy import Column, Date, DateTime, Index, Integer, PrimaryKeyConstraint, LargeBinary, String, UniqueConstraint, ForeignKey, Float, JSON, Text, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .db import Base
+from .series_codec import MISSING, append_points, decode_values, encode_values, pack_series, unpack_series
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
 class TimestampMixin:
@@ -30,7 +36,17 @@ class Theme(Base, TimestampMixin):
 
 class Article(Base, TimestampMixin):
     __tablename__ = "articles"
-    __table_args__ = (UniqueConstraint("project", "slug", name="uq_project_slug"),)
+    __table_args__ = (
+        UniqueConstraint("project", "slug", name="uq_project_slug"),
+        # Index partiel : enrich-metadata ne parcourt que les articles jamais vérifiés.
+        Index(
+            "ix_article_metadata_unchecked",
+            "project",
+            "id",
+            postgresql_where=text("metadata_checked_at IS NULL"),
+            sqlite_where=text("metadata_checked_at IS NULL"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     project: Mapped[str] = mapped_column(String(50), default="fr.wikipedia", nullable=False)
@@ -39,6 +55,8 @@ class Article(Base, TimestampMixin):
     page_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     image_url: Mapped[Optional[str]] = mapped_column(String(1024), nullable=True)
+    # Dernière interrogation de l'API par enrich-metadata, que la page ait un extrait / une image ou non.
+    metadata_checked_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
     themes: Mapped[List["ArticleTheme"]] = relationship("ArticleTheme", back_populates="article")
     stats: Mapped[List["ArticleSemesterStat"]] = relationship("ArticleSemesterStat", back_populates="article")
@@ -58,31 +76,99 @@ class ArticleTheme(Base):
 
 
 class ArticleSemesterStat(Base, TimestampMixin):
+    """Sous PostgreSQL, table partitionnée par projet puis par année (voir partitions.py)."""
+
     __tablename__ = "article_semester_stats"
     __table_args__ = (
-        UniqueConstraint("article_id", "year", "semester", name="uq_article_semester"),
+        # project et year figurent dans la contrainte : PostgreSQL l'exige des tables partitionnées.
+        UniqueConstraint("project", "article_id", "year", "semester", name="uq_article_project_semester"),
+        Index("ix_stat_period", "year", "semester", "article_id"),
     )
 
     id: Mapped[int] = mapped_column(primary_key=True)
+    project: Mapped[str] = mapped_column(String(50), nullable=False)  # = articles.project, clé de partition
     article_id: Mapped[int] = mapped_column(ForeignKey("articles.id"), nullable=False)
     year: Mapped[int] = mapped_column(Integer, nullable=False)
     semester: Mapped[str] = mapped_column(String(2), nullable=False)  # S1 or S2
     views_total: Mapped[int] = mapped_column(Integer, nullable=False)
     views_avg_daily: Mapped[float] = mapped_column(Float, nullable=False)
-    series: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)  # optional daily series for graphs
+    series: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)  # legacy JSON series, see series_data
+    series_start: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    series_data: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)  # packed int32, see series_codec
 
     article: Mapped[Article] = relationship("Article", back_populates="stats")
 
+    @property
+    def daily_series(self) -> List[dict]:
+        """Série quotidienne au format historique [{"timestamp", "views"}], quel que soit le stockage."""
+        if self.series_data is not None and self.series_start is not None:
+            return unpack_series(self.series_start, self.series_data)
+        return list(self.series or [])
+
+    def daily_values(self) -> Optional[tuple[date, "np.ndarray"]]:
+        """(date de début, tableau int32 quotidien) sans passer par des dicts ; -1 = jour sans donnée."""
+        if self.series_data is None or self.series_start is None:
+            return None
+        return self.series_start, decode_values(self.series_data)
+
+    def set_series(self, series: List[dict]) -> None:
+        packed = pack_series(series)
+        if packed is None:
+            self.series, self.series_start, self.series_data = series or None, None, None
+        else:
+            self.series = None
+            self.series_start, self.series_data = packed
+
+    def _covered_days(self) -> int:
+        """Jours déjà couverts, déduits de la moyenne stockée (un top mensuel couvre tout son mois)."""
+        return round(self.views_total / self.views_avg_daily) if self.views_avg_daily else 0
+
+    def is_daily(self) -> bool:
+        """
+        Série strictement quotidienne : un point par jour couvert. Faux pour une stat bâtie sur des tops mensuels,
+        dont chaque point (1er du mois) porte les vues du mois entier.
+        """
+        current = self.daily_values()
+        points = int((current[1] != MISSING).sum()) if current is not None else len(self.series or [])
+        return points == self._covered_days()
+
+    def append_days(self, points: Iterable[tuple[date, int, int]]) -> bool:
+        """
+        Ajoute les points (jour, vues, jours couverts) postérieurs au dernier jour stocké, puis recalcule total
+        et moyenne quotidienne en place. False si rien n'est nouveau ou si l'ancienne série JSON n'est pas datée.
+        """
+        current = self.daily_values()
+        if current is None and self.series:
+            packed = pack_series(self.series)
+            if packed is None:
+                return False
+            current = packed[0], decode_values(packed[1])
+        merged = append_points(*(current or (None, None)), points)
+        if merged is None:
+            return False
+        start, values, views, days = merged
+        covered = self._covered_days()
+        self.views_total += views
+        self.views_avg_daily = self.views_total / max(covered + days, 1)
+        self.series = None
+        self.series_start, self.series_data = start, encode_values(values)
+        return True
+
 
 class Question(Base, TimestampMixin):
     __tablename__ = "questions"
-    __table_args__ = (UniqueConstraint("theme_id", "year", "semester", name="uq_question_theme_period"),)
+    # Plusieurs questions par (thème, période) : la banque en génère une par palier de difficulté.
+    # Non partitionnée : question_articles et question_snapshots la référencent par id seul.
+    __table_args__ = (Index("ix_question_project_period", "project", "theme_id", "year", "semester"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
+    project: Mapped[str] = mapped_column(String(50), nullable=False)
     theme_id: Mapped[int] = mapped_column(ForeignKey("themes.id"), nullable=False)
     year: Mapped[int] = mapped_column(Integer, nullable=False)
     semester: Mapped[str] = mapped_column(String(2), nullable=False)
     status: Mapped[str] = mapped_column(String(20), default="ready", nullable=False)
+    difficulty: Mapped[Optional[str]] = mapped_column(String(10), nullable=True)  # easy / medium / hard (banque)
+    log_gap: Mapped[Optional[float]] = mapped_column(Float, nullable=True)  # plus petit écart de log(vues/jour)
 
     theme: Mapped[Theme] = relationship("Theme", back_populates="questions")
     articles: Mapped[List["QuestionArticle"]] = relationship("QuestionArticle", back_populates="question")
@@ -100,3 +186,167 @@ class QuestionArticle(Base):
 
     question: Mapped[Question] = relationship("Question", back_populates="articles")
     article: Mapped[Article] = relationship("Article", back_populates="question_links")
+
+
+class ThemePeriodRanking(Base):
+    """Classement matérialisé des articles d'un thème sur un semestre (voir rankings.refresh_rankings)."""
+
+    __tablename__ = "theme_period_rankings"
+    __table_args__ = (
+        PrimaryKeyConstraint("project", "theme_id", "year", "semester", "rank", name="pk_theme_period_rankings"),
+        Index("ix_ranking_tier", "theme_id", "year", "semester", "tier", "rank"),
+        Index("ix_ranking_article", "article_id"),
+    )
+
+    project: Mapped[str] = mapped_column(String(50), nullable=False)
+    theme_id: Mapped[int] = mapped_column(ForeignKey("themes.id"), nullable=False)
+    year: Mapped[int] = mapped_column(Integer, nullable=False)
+    semester: Mapped[str] = mapped_column(String(2), nullable=False)
+    rank: Mapped[int] = mapped_column(Integer, nullable=False)  # 1 = article le plus vu
+    article_id: Mapped[int] = mapped_column(ForeignKey("articles.id"), nullable=False)
+    views_avg_daily: Mapped[float] = mapped_column(Float, nullable=False)
+    percentile: Mapped[float] = mapped_column(Float, nullable=False)  # 1.0 = meilleur article du thème
+    tier: Mapped[str] = mapped_column(String(1), nullable=False)  # S / A / B / C
+
+    article: Mapped[Article] = relationship("Article")
+
+
+class RankingRefresh(Base):
+    """Empreinte des stats d'une période au dernier refresh, pour ne reconstruire que les périodes modifiées."""
+
+    __tablename__ = "ranking_refreshes"
+    __table_args__ = (PrimaryKeyConstraint("year", "semester", name="pk_ranking_refreshes"),)
+
+    year: Mapped[int] = mapped_column(Integer, nullable=False)
+    semester: Mapped[str] = mapped_column(String(2), nullable=False)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    stats_updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    refreshed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+
+class IngestionLedger(Base):
+    """Tops déjà ingérés par projet : un top mensuel "all-days" (day = 0) ou quotidien (voir ingestion.py)."""
+
+    __tablename__ = "ingestion_ledger"
+    __table_args__ = (PrimaryKeyConstraint("project", "year", "month", "day", name="pk_ingestion_ledger"),)
+
+    project: Mapped[str] = mapped_column(String(50), nullable=False)
+    year: Mapped[int] = mapped_column(Integer, nullable=False)
+    month: Mapped[int] = mapped_column(Integer, nullable=False)
+    day: Mapped[int] = mapped_column(Integer, nullable=False)
+    articles: Mapped[int] = mapped_column(Integer, nullable=False)  # entrées du top versées dans l'agrégat
+    ingested_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+
+class EmptySemester(Base):
+    """
+    Semestres révolus sans aucune vue dans l'historique d'un article (voir history.backfill_stats) : ils n'ont pas
+    de stat, et ne sont plus redemandés à l'API aux passages suivants (sauf refresh).
+    """
+
+    __tablename__ = "empty_semesters"
+    __table_args__ = (
+        PrimaryKeyConstraint("project", "article_id", "year", "semester", name="pk_empty_semesters"),
+    )
+
+    project: Mapped[str] = mapped_column(String(50), nullable=False)
+    article_id: Mapped[int] = mapped_column(ForeignKey("articles.id"), nullable=False)
+    year: Mapped[int] = mapped_column(Integer, nullable=False)
+    semester: Mapped[str] = mapped_column(String(2), nullable=False)
+    checked_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+
+class TitleResolution(Base):
+    """
+    Cache persistant des titres de tops résolus par projet (voir titles.TitleResolver) : redirection vers la page
+    canonique, ou page absente. Un titre déjà résolu n'est plus demandé à l'API.
+    """
+
+    __tablename__ = "title_resolutions"
+    __table_args__ = (PrimaryKeyConstraint("project", "title", name="pk_title_resolutions"),)
+
+    project: Mapped[str] = mapped_column(String(50), nullable=False)
+    title: Mapped[str] = mapped_column(String(255), nullable=False)  # slug normalisé, tel que dans les tops
+    canonical: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)  # slug cible, None si absente
+    page_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    resolved_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+
+class QuestionSnapshot(Base):
+    """
+    Question prête à servir, dénormalisée pour le backend de jeu (voir snapshots.publish_questions).
+    Sous PostgreSQL, table partitionnée par projet : le jeu ne lit que la partition de son projet.
+    """
+
+    __tablename__ = "question_snapshots"
+    __table_args__ = (
+        Index("ix_snapshot_random", "random_key"),
+        Index("ix_snapshot_theme", "theme", "random_key"),
+        Index("ix_snapshot_period", "year", "semester", "random_key"),
+        Index("ix_snapshot_theme_period", "theme", "year", "semester", "random_key"),
+    )
+
+    question_id: Mapped[int] = mapped_column(ForeignKey("questions.id"), primary_key=True, autoincrement=False)
+    project: Mapped[str] = mapped_column(String(50), primary_key=True)  # clé de partition
+    theme_id: Mapped[int] = mapped_column(ForeignKey("themes.id"), nullable=False)
+    theme: Mapped[str] = mapped_column(String(255), nullable=False)
+    year: Mapped[int] = mapped_column(Integer, nullable=False)
+    semester: Mapped[str] = mapped_column(String(2), nullable=False)
+    # [{title, summary, image_url, views_total, views_avg_daily}] dans l'ordre de la question.
+    articles: Mapped[list] = mapped_column(JSON, nullable=False)
+    correct_order: Mapped[list] = mapped_column(JSON, nullable=False)  # titres du moins au plus vu
+    random_key: Mapped[float] = mapped_column(Float, nullable=False)
+    published_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+
+class DuelPool(Base):
+    """Pool de 10 cartes pré-calculé pour le mode duel, réservé une seule fois via duel_pools.claim_duel_pool."""
+
+    __tablename__ = "duel_pools"
+    __table_args__ = (
+        UniqueConstraint("project", "theme_id", "year", "semester", "card_key", name="uq_duel_pool_cards"),
+        # Index partiels : seuls les pools encore libres sont parcourus lors d'une réservation.
+        Index(
+            "ix_duel_pool_available",
+            "project",
+            "theme",
+            "year",
+            "semester",
+            "random_key",
+            postgresql_where=text("claimed_at IS NULL"),
+            sqlite_where=text("claimed_at IS NULL"),
+        ),
+        Index(
+            "ix_duel_pool_available_any",
+            "project",
+            "random_key",
+            postgresql_where=text("claimed_at IS NULL"),
+            sqlite_where=text("claimed_at IS NULL"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    project: Mapped[str] = mapped_column(String(50), nullable=False)  # projet des articles du pool
+    theme_id: Mapped[int] = mapped_column(ForeignKey("themes.id"), nullable=False)
+    theme: Mapped[str] = mapped_column(String(255), nullable=False)
+    year: Mapped[int] = mapped_column(Integer, nullable=False)
+    semester: Mapped[str] = mapped_column(String(2), nullable=False)
+    card_key: Mapped[str] = mapped_column(String(40), nullable=False)  # empreinte des article_id triés
+    # [{position, article_id, title, url, image_url, excerpt, views_total, views_avg_daily, rank, tier}]
+    cards: Mapped[list] = mapped_column(JSON, nullable=False)
+    random_key: Mapped[float] = mapped_column(Float, nullable=False)
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    claimed_by: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
+    )
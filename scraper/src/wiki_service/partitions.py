@@ -0,0 +1,200 @@
+"""
+Partitionnement déclaratif PostgreSQL des tables lues par projet.
+
+- article_semester_stats : LIST (project) puis RANGE (year), une partition par projet et par année ;
+- question_snapshots : LIST (project), le jeu ne lit que la partition de son projet.
+
+Chaque niveau a une partition DEFAULT : une ligne d'un projet ou d'une année sans partition est acceptée, mais
+la partition dédiée ne peut plus être créée tant que la DEFAULT contient ses lignes. Les commandes d'import
+créent donc les partitions de leurs projets / années avant d'écrire (ensure_partitions). Sous SQLite
+(développement, benchmarks) les tables restent simples et ces fonctions ne font rien.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence
+
+from sqlalchemy import MetaData, PrimaryKeyConstraint, Table, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from .models import ArticleSemesterStat, Base, QuestionSnapshot
+
+_PROJECT = re.compile(r"^[a-z0-9-]+(\.[a-z0-9-]+)+$")
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    table: Table
+    # La clé primaire doit contenir les colonnes de partitionnement.
+    primary_key: tuple[str, ...]
+    by_year: bool
+
+    @property
+    def name(self) -> str:
+        return self.table.name
+
+
+SPECS = (
+    PartitionSpec(ArticleSemesterStat.__table__, ("id", "project", "year"), by_year=True),
+    PartitionSpec(QuestionSnapshot.__table__, ("question_id", "project"), by_year=False),
+)
+
+
+def check_project(project: str) -> str:
+    """Le projet entre dans des noms de tables et des littéraux SQL : seuls les domaines Wikimedia sont admis."""
+    if not _PROJECT.match(project):
+        raise ValueError(f"Projet Wikimedia invalide : {project!r}")
+    return project
+
+
+def partition_name(table: str, project: Optional[str] = None) -> str:
+    """Partition d'un projet (fr.wikipedia -> <table>_fr_wikipedia), ou partition DEFAULT de la table."""
+    if project is None:
+        return f"{table}_default"
+    return f"{table}_{check_project(project).replace('.', '_').replace('-', '_')}"
+
+
+def parent_ddl(spec: PartitionSpec) -> List[str]:
+    """CREATE TABLE partitionnée (et ses index) compilée depuis le modèle, clé primaire élargie à la partition."""
+    metadata = MetaData()
+    for other in spec.table.metadata.sorted_tables:
+        other.to_metadata(metadata)  # tables référencées par les clés étrangères
+    table = metadata.tables[spec.name]
+    for name in spec.primary_key:
+        table.c[name].primary_key = True
+    table.append_constraint(PrimaryKeyConstraint(*spec.primary_key, name=f"{spec.name}_pkey"))
+    if "id" in spec.primary_key:
+        table.c.id.autoincrement = True  # SERIAL malgré la clé composite
+    table.dialect_options["postgresql"]["partition_by"] = "LIST (project)"
+    dialect = postgresql.dialect()
+    statements = [str(CreateTable(table).compile(dialect=dialect)).strip()]
+    indexes = sorted(table.indexes, key=lambda index: index.name)
+    statements += [str(CreateIndex(index).compile(dialect=dialect)) for index in indexes]
+    return statements
+
+
+def table_kind(conn: Connection, name: str) -> Optional[str]:
+    """'p' pour une table partitionnée, 'r' pour une table simple, None si elle n'existe pas."""
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND relnamespace = 'public'::regnamespace"),
+        {"name": name},
+    ).scalar()
+
+
+def existing_partitions(conn: Connection) -> set[str]:
+    query = "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+    return set(conn.execute(text(query)).scalars())
+
+
+def ensure_partitions(conn: Connection, projects: Iterable[str], years: Iterable[int] = ()) -> List[str]:
+    """
+    Crée les partitions manquantes des projets (et années) donnés et retourne leurs noms. Un projet ou une année
+    dont des lignes sont déjà dans la partition DEFAULT y reste : créer sa partition échouerait.
+    """
+    if conn.dialect.name != "postgresql":
+        return []
+    projects = sorted({check_project(project) for project in projects})
+    years = sorted({int(year) for year in years})
+    existing = existing_partitions(conn)
+    created: List[str] = []
+
+    def create(name: str, ddl: str) -> None:
+        if name not in existing:
+            conn.execute(text(ddl))
+            existing.add(name)
+            created.append(name)
+
+    def in_default(default: str, column: str, value) -> bool:
+        return conn.execute(
+            text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {column} = :value)"), {"value": value}
+        ).scalar()
+
+    for spec in SPECS:
+        if table_kind(conn, spec.name) != "p":
+            continue  # table simple : voir partition_tables
+        table_default = partition_name(spec.name)
+        create(table_default, f"CREATE TABLE {table_default} PARTITION OF {spec.name} DEFAULT")
+        for project in projects:
+            parent = partition_name(spec.name, project)
+            if parent not in existing and in_default(table_default, "project", project):
+                continue
+            sub = " PARTITION BY RANGE (year)" if spec.by_year else ""
+            create(parent, f"CREATE TABLE {parent} PARTITION OF {spec.name} FOR VALUES IN ('{project}'){sub}")
+            if not spec.by_year:
+                continue
+            default = f"{parent}_default"
+            create(default, f"CREATE TABLE {default} PARTITION OF {parent} DEFAULT")
+            for year in years:
+                name = f"{parent}_{int(year)}"
+                if name in existing or in_default(default, "year", int(year)):
+                    continue
+                create(name, f"CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM ({year}) TO ({year + 1})")
+    return created
+
+
+def _convert(conn: Connection, spec: PartitionSpec, projects: Sequence[str], years: Sequence[int]) -> None:
+    """Remplace une table simple par sa version partitionnée : renommage, création, copie, suppression."""
+    old = f"{spec.name}_unpartitioned"
+    conn.execute(text(f"ALTER TABLE {spec.name} RENAME TO {old}"))
+    # Les noms d'index, de contraintes et de séquence sont globaux au schéma : on libère ceux du modèle.
+    conn.execute(text(f"ALTER TABLE {old} DROP CONSTRAINT IF EXISTS {spec.name}_pkey"))
+    for constraint in spec.table.constraints:
+        if constraint.name and not isinstance(constraint, PrimaryKeyConstraint):
+            conn.execute(text(f"ALTER TABLE {old} DROP CONSTRAINT IF EXISTS {constraint.name}"))
+            conn.execute(text(f"DROP INDEX IF EXISTS {constraint.name}"))
+    for index in spec.table.indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    if "id" in spec.primary_key:
+        conn.execute(text(f"ALTER SEQUENCE IF EXISTS {spec.name}_id_seq RENAME TO {old}_id_seq"))
+
+    for ddl in parent_ddl(spec):
+        conn.execute(text(ddl))
+    found = conn.execute(text(f"SELECT DISTINCT project, {'year' if spec.by_year else 'NULL'} FROM {old}")).all()
+    ensure_partitions(
+        conn,
+        [*projects, *(project for project, _ in found)],
+        [*years, *(year for _, year in found if year is not None)],
+    )
+    columns = ", ".join(column.name for column in spec.table.columns)
+    conn.execute(text(f"INSERT INTO {spec.name} ({columns}) SELECT {columns} FROM {old}"))
+    if "id" in spec.primary_key:
+        sequence = f"pg_get_serial_sequence('{spec.name}', 'id')"
+        conn.execute(text(f"SELECT setval({sequence}, COALESCE(MAX(id), 0) + 1, false) FROM {spec.name}"))
+    conn.execute(text(f"DROP TABLE {old}"))
+
+
+def partition_tables(
+    conn: Connection, projects: Iterable[str], years: Iterable[int] = (), convert: bool = False
+) -> List[str]:
+    """
+    Crée les tables partitionnées absentes (à appeler avant Base.metadata.create_all, qui ne recrée pas une table
+    existante) puis leurs partitions. Avec convert=True, les tables simples existantes sont converties (copie
+    complète, sous verrou exclusif : à lancer hors des imports). Retourne les tables créées ou converties.
+    """
+    if conn.dialect.name != "postgresql":
+        return []
+    projects, years = list(projects), list(years)
+    changed: List[str] = []
+    for spec in SPECS:
+        kind = table_kind(conn, spec.name)
+        if kind is None:
+            for ddl in parent_ddl(spec):
+                conn.execute(text(ddl))
+            changed.append(spec.name)
+        elif kind == "r" and convert:
+            _convert(conn, spec, projects, years)
+            changed.append(spec.name)
+    ensure_partitions(conn, projects, years)
+    return changed
+
+
+def create_schema(conn: Connection, projects: Iterable[str]) -> None:
+    """Base.metadata.create_all, avec les tables partitionnées sous PostgreSQL (créées après les tables référencées)."""
+    partitioned = {spec.table for spec in SPECS}
+    Base.metadata.create_all(bind=conn, tables=[t for t in Base.metadata.sorted_tables if t not in partitioned])
+    partition_tables(conn, projects)
+    Base.metadata.create_all(bind=conn)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import List
+
+
+def months_for_semester(semester: str) -> List[int]:
+    if semester not in ("S1", "S2"):
+        raise ValueError("Semester must be S1 or S2.")
+    return list(range(1, 7)) if semester == "S1" else list(range(7, 13))
+
+
+def semester_dates(year: int, semester: str) -> tuple[date, date]:
+    if semester not in ("S1", "S2"):
+        raise ValueError("Semester must be S1 or S2.")
+    if semester == "S1":
+        return date(year, 1, 1), date(year, 6, 30)
+    return date(year, 7, 1), date(year, 12, 31)
+
+
+def semester_of(day: date) -> tuple[int, str]:
+    return day.year, "S1" if day.month <= 6 else "S2"
+
+
+def chunk_ranges(start: date, end: date, days: int) -> List[tuple[date, date]]:
+    """Découpe [start, end] (bornes incluses) en tranches d'au plus `days` jours."""
+    ranges = []
+    cursor = start
+    while cursor <= end:
+        stop = min(end, cursor + timedelta(days=days - 1))
+        ranges.append((cursor, stop))
+        cursor = stop + timedelta(days=1)
+    return ranges
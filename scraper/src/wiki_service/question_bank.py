@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import math
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .models import ArticleSemesterStat, ArticleTheme, Question, QuestionArticle, Theme
+from .snapshots import publish_questions
+
+ARTICLES_PER_QUESTION = 4
+
+# Paliers sur le plus petit écart entre deux log(vues/jour) voisins de la question (ln 2 ≈ 0.69 = un facteur 2).
+# En dessous de MIN_LOG_GAP (~5 %), deux articles sont à égalité : l'ordre tiendrait du hasard.
+MIN_LOG_GAP = 0.05
+DIFFICULTIES = (("hard", MIN_LOG_GAP, 0.25), ("medium", 0.25, 0.7), ("easy", 0.7, math.inf))
+DEFAULT_MIX = {"easy": 1, "medium": 2, "hard": 1}
+
+PeriodKey = tuple[int, int, str]  # (theme_id, year, semester)
+
+
+def parse_mix(value: Optional[str]) -> Dict[str, int]:
+    """'easy:1,medium:2,hard:1' -> poids par palier."""
+    if not value:
+        return dict(DEFAULT_MIX)
+    known = {label for label, _, _ in DIFFICULTIES}
+    mix: Dict[str, int] = {}
+    for part in value.split(","):
+        label, _, weight = part.strip().partition(":")
+        if label not in known:
+            raise ValueError(f"Unknown difficulty '{label}' (expected one of {', '.join(sorted(known))})")
+        mix[label] = int(weight or 1)
+    return mix
+
+
+def allocate(total: int, mix: Dict[str, int]) -> Dict[str, int]:
+    """Répartit `total` questions selon les poids du mix (plus forts restes)."""
+    weight_sum = sum(mix.values())
+    if weight_sum <= 0:
+        return {label: 0 for label in mix}
+    exact = {label: total * weight / weight_sum for label, weight in mix.items()}
+    quotas = {label: int(value) for label, value in exact.items()}
+    remaining = total - sum(quotas.values())
+    for label in sorted(exact, key=lambda label: exact[label] - quotas[label], reverse=True)[:remaining]:
+        quotas[label] += 1
+    return quotas
+
+
+@dataclass
+class CandidatePool:
+    """Articles d'un (thème, période) triés par vues moyennes/jour croissantes."""
+
+    article_ids: np.ndarray
+    views_total: np.ndarray
+    views_avg: np.ndarray
+    log_views: np.ndarray
+    used: np.ndarray  # articles déjà présents dans une question de la période
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[tuple[int, int, float]], used_ids: set[int]) -> "CandidatePool":
+        rows = sorted(rows, key=lambda row: row[2])
+        article_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        views_avg = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+        return cls(
+            article_ids=article_ids,
+            views_total=np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)),
+            views_avg=views_avg,
+            log_views=np.log(views_avg),
+            used=np.isin(article_ids, np.fromiter(used_ids, dtype=np.int64, count=len(used_ids))),
+        )
+
+    def __len__(self) -> int:
+        return len(self.article_ids)
+
+
+def score_candidates(log_views: np.ndarray, count: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Tire `count` quartets au hasard et calcule pour tous, d'un bloc, le plus petit écart de log(vues/jour)
+    entre deux articles voisins. Le pool étant trié, trier les indices suffit à ordonner les vues.
+    Retourne (indices des quartets (k, 4), écart minimal (k,)) sans doublon d'article dans un quartet.
+    """
+    size = len(log_views)
+    if size < ARTICLES_PER_QUESTION:
+        return np.empty((0, ARTICLES_PER_QUESTION), dtype=np.int64), np.empty(0)
+    quartets = np.sort(rng.integers(0, size, size=(count, ARTICLES_PER_QUESTION)), axis=1)
+    quartets = quartets[(np.diff(quartets, axis=1) > 0).all(axis=1)]
+    gaps = np.diff(log_views[quartets], axis=1).min(axis=1)
+    return quartets, gaps
+
+
+def select_quartets(
+    pool: CandidatePool,
+    quotas: Dict[str, int],
+    candidates: int,
+    rng: np.random.Generator,
+) -> List[tuple[str, np.ndarray, float]]:
+    """Choisit, palier par palier, des quartets du bon écart sans réutiliser un article de la période."""
+    quartets, gaps = score_candidates(pool.log_views, candidates, rng)
+    used = pool.used.copy()
+    chosen: List[tuple[str, np.ndarray, float]] = []
+    for label, low, high in DIFFICULTIES:
+        wanted = quotas.get(label, 0)
+        if wanted <= 0:
+            continue
+        in_bucket = np.flatnonzero((gaps >= low) & (gaps < high))
+        for index in in_bucket:
+            quartet = quartets[index]
+            if used[quartet].any():
+                continue
+            used[quartet] = True
+            chosen.append((label, quartet, float(gaps[index])))
+            wanted -= 1
+            if wanted == 0:
+                break
+    return chosen
+
+
+@dataclass
+class BankReport:
+    generated: Counter = field(default_factory=Counter)
+    existing: int = 0
+    short: Counter = field(default_factory=Counter)  # questions manquantes par palier (pas assez de candidats)
+    periods: int = 0
+    wall_time: float = 0.0
+
+    def lines(self) -> List[str]:
+        by_level = ", ".join(f"{label} {self.generated[label]}" for label, _, _ in DIFFICULTIES)
+        lines = [
+            f"Questions générées : {sum(self.generated.values())} ({by_level}), déjà en banque : {self.existing}, "
+            f"périodes : {self.periods}, durée : {self.wall_time:.1f}s",
+        ]
+        if self.short:
+            lines.append("Manquantes faute de candidats : " + ", ".join(f"{k} {v}" for k, v in self.short.items()))
+        return lines
+
+
+def load_pools(
+    session: Session, theme_ids: Sequence[int], periods: Sequence[tuple[int, str]], project: str
+) -> Dict[PeriodKey, CandidatePool]:
+    """Charge en une requête les stats de tous les (thème, période), plus les articles déjà mis en question."""
+    rows = session.execute(
+        select(
+            ArticleTheme.theme_id,
+            ArticleSemesterStat.year,
+            ArticleSemesterStat.semester,
+            ArticleSemesterStat.article_id,
+            ArticleSemesterStat.views_total,
+            ArticleSemesterStat.views_avg_daily,
+        )
+        .join(ArticleTheme, ArticleTheme.article_id == ArticleSemesterStat.article_id)
+        .where(
+            ArticleTheme.theme_id.in_(list(theme_ids)),
+            ArticleSemesterStat.project == project,
+            tuple_(ArticleSemesterStat.year, ArticleSemesterStat.semester).in_(list(periods)),
+            ArticleSemesterStat.views_avg_daily > 0,
+        )
+    )
+    grouped: Dict[PeriodKey, list] = defaultdict(list)
+    for theme_id, year, semester, article_id, views_total, views_avg in rows:
+        grouped[(theme_id, year, semester)].append((article_id, views_total, views_avg))
+
+    used: Dict[PeriodKey, set[int]] = defaultdict(set)
+    for theme_id, year, semester, article_id in session.execute(
+        select(Question.theme_id, Question.year, Question.semester, QuestionArticle.article_id)
+        .join(QuestionArticle, QuestionArticle.question_id == Question.id)
+        .where(
+            Question.project == project,
+            Question.theme_id.in_(list(theme_ids)),
+            tuple_(Question.year, Question.semester).in_(list(periods)),
+        )
+    ):
+        used[(theme_id, year, semester)].add(article_id)
+
+    return {key: CandidatePool.from_rows(rows, used[key]) for key, rows in grouped.items()}
+
+
+def existing_counts(
+    session: Session, theme_ids: Sequence[int], periods: Sequence[tuple[int, str]], project: str
+) -> Dict[PeriodKey, Counter]:
+    counts: Dict[PeriodKey, Counter] = defaultdict(Counter)
+    for theme_id, year, semester, difficulty, count in session.execute(
+        select(Question.theme_id, Question.year, Question.semester, Question.difficulty, func.count())
+        .where(
+            Question.project == project,
+            Question.theme_id.in_(list(theme_ids)),
+            tuple_(Question.year, Question.semester).in_(list(periods)),
+        )
+        .group_by(Question.theme_id, Question.year, Question.semester, Question.difficulty)
+    ):
+        counts[(theme_id, year, semester)][difficulty] += count
+    return counts
+
+
+def write_questions(
+    session: Session,
+    key: PeriodKey,
+    pool: CandidatePool,
+    chosen: Sequence[tuple[str, np.ndarray, float]],
+    rng: np.random.Generator,
+    project: str,
+) -> List[int]:
+    theme_id, year, semester = key
+    questions = [
+        Question(
+            project=project,
+            theme_id=theme_id,
+            year=year,
+            semester=semester,
+            status="ready",
+            difficulty=label,
+            log_gap=gap,
+        )
+        for label, _, gap in chosen
+    ]
+    session.add_all(questions)
+    session.flush()
+    session.execute(
+        insert(QuestionArticle),
+        [
+            {
+                "question_id": question.id,
+                "article_id": int(pool.article_ids[index]),
+                "views_total": int(pool.views_total[index]),
+                "views_avg_daily": float(pool.views_avg[index]),
+            }
+            for question, (_, quartet, _) in zip(questions, chosen)
+            # Ordre de présentation mélangé : le quartet est trié par vues.
+            for index in rng.permutation(quartet)
+        ],
+    )
+    return [question.id for question in questions]
+
+
+def generate_bank(
+    session: Session,
+    theme_names: Sequence[str],
+    periods: Sequence[tuple[int, str]],
+    per_period: Optional[int] = None,
+    mix: Optional[Dict[str, int]] = None,
+    candidates: Optional[int] = None,
+    seed: Optional[int] = None,
+    project: Optional[str] = None,
+    echo: Callable[[str], None] = lambda _: None,
+) -> BankReport:
+    """
+    Complète la banque de questions de chaque (thème, période) jusqu'à `per_period` questions réparties
+    selon `mix`. Les questions déjà présentes comptent dans les quotas, leurs articles ne sont pas réutilisés.
+    Les nouvelles questions sont publiées dans question_snapshots dans la même transaction.
+    """
+    settings = get_settings()
+    per_period = per_period or settings.question_bank_size
+    candidates = candidates or settings.question_bank_candidates
+    mix = mix or dict(DEFAULT_MIX)
+    project = project or settings.wikimedia_project
+    rng = np.random.default_rng(seed)
+    report = BankReport()
+    started = time.perf_counter()
+
+    themes = list(session.scalars(select(Theme).where(Theme.name.in_(list(theme_names)))))
+    missing = set(theme_names) - {theme.name for theme in themes}
+    for name in sorted(missing):
+        echo(f"Skip thème inconnu : {name}")
+    names = {theme.id: theme.name for theme in themes}
+    pools = load_pools(session, list(names), periods, project)
+    existing = existing_counts(session, list(names), periods, project)
+
+    for key in sorted(pools):
+        pool = pools[key]
+        done = existing.get(key, Counter())
+        report.existing += sum(done.values())
+        quotas = {
+            label: max(0, quota - done[label]) for label, quota in allocate(per_period, mix).items()
+        }
+        if not any(quotas.values()):
+            continue
+        report.periods += 1
+        chosen = select_quartets(pool, quotas, candidates, rng)
+        got = Counter(label for label, _, _ in chosen)
+        for label, quota in quotas.items():
+            if got[label] < quota:
+                report.short[label] += quota - got[label]
+        if not chosen:
+            continue
+        ids = write_questions(session, key, pool, chosen, rng, project)
+        publish_questions(session, ids)
+        report.generated.update(got)
+        theme_id, year, semester = key
+        echo(f"OK {names[theme_id]} {year}-{semester} : {len(ids)} questions ({dict(got)})")
+
+    report.wall_time = time.perf_counter() - started
+    return report
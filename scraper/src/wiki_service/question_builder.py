@@ -1,16 +1,19 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import date
 from random import sample
-from typing import List, Sequence
+from typing import List, Optional, Sequence
 
 import httpx
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
 from .config import get_settings
-from .models import Article, ArticleSemesterStat, ArticleTheme, Question, QuestionArticle, Theme
+from .models import Article, ArticleSemesterStat, ArticleTheme, Question, QuestionArticle, Theme, ThemePeriodRanking
+from .periods import semester_dates
+from .rankings import ranking_size
+from .series_codec import parse_timestamp
+from .snapshots import publish_questions
 from .wikimedia_client import WikimediaClient
 from .wiki_page_client import WikiPageClient
 
@@ -24,14 +27,6 @@ class QuestionPayload:
     articles: List[str]
 
 
-def semester_dates(year: int, semester: str) -> tuple[date, date]:
-    if semester not in ("S1", "S2"):
-        raise ValueError("Semester must be S1 or S2.")
-    if semester == "S1":
-        return date(year, 1, 1), date(year, 6, 30)
-    return date(year, 7, 1), date(year, 12, 31)
-
-
 def ensure_theme(session: Session, name: str) -> Theme:
     theme = session.scalar(select(Theme).where(Theme.name == name))
     if theme:
@@ -98,6 +93,7 @@ def ensure_semester_stat(
 ) -> ArticleSemesterStat:
     stat = session.scalar(
         select(ArticleSemesterStat).where(
+            ArticleSemesterStat.project == article.project,
             ArticleSemesterStat.article_id == article.id,
             ArticleSemesterStat.year == year,
             ArticleSemesterStat.semester == semester,
@@ -116,13 +112,14 @@ def ensure_semester_stat(
     days = max(len(daily_views), 1)
     avg_daily = total / days
     stat = ArticleSemesterStat(
+        project=article.project,
         article=article,
         year=year,
         semester=semester,
         views_total=total,
         views_avg_daily=avg_daily,
-        series=daily_views,
     )
+    stat.set_series(daily_views)
     session.add(stat)
     session.flush()
     return stat
@@ -134,33 +131,126 @@ def upsert_semester_stat_from_series(
     year: int,
     semester: str,
     series: list[dict],
+    views_avg_daily: float | None = None,
 ) -> ArticleSemesterStat:
     stat = session.scalar(
         select(ArticleSemesterStat).where(
+            ArticleSemesterStat.project == article.project,
             ArticleSemesterStat.article_id == article.id,
             ArticleSemesterStat.year == year,
             ArticleSemesterStat.semester == semester,
         )
     )
     if stat:
+        # Semestre en cours : seuls les jours postérieurs à la série stockée sont ajoutés. Une stat issue des tops
+        # mensuels reste telle quelle : son dernier point couvre tout le mois, les jours de ce mois y sont déjà.
+        if not stat.is_daily():
+            return stat
+        days = [(parse_timestamp(point.get("timestamp", "")), int(point.get("views", 0))) for point in series]
+        if stat.append_days((day, views, 1) for day, views in days if day is not None):
+            session.flush()
         return stat
     total = sum(point.get("views", 0) for point in series)
     stat = ArticleSemesterStat(
+        project=article.project,
         article=article,
         year=year,
         semester=semester,
         views_total=total,
-        views_avg_daily=total / max(len(series), 1),
-        series=series,
+        views_avg_daily=views_avg_daily if views_avg_daily is not None else total / max(len(series), 1),
     )
+    stat.set_series(series)
     session.add(stat)
     session.flush()
     return stat
 
 
-def pick_random_articles(session: Session, theme: Theme, limit: int = 4) -> List[Article]:
+def find_question(
+    session: Session, theme: Theme, year: int, semester: str, project: str
+) -> Optional[QuestionPayload]:
+    existing = session.scalar(
+        select(Question)
+        .where(
+            Question.project == project,
+            Question.theme_id == theme.id,
+            Question.year == year,
+            Question.semester == semester,
+        )
+        .order_by(Question.id)
+        .limit(1)
+        .options(selectinload(Question.articles).joinedload(QuestionArticle.article))
+    )
+    if not existing:
+        return None
+    return QuestionPayload(
+        id=existing.id,
+        theme=theme.name,
+        year=year,
+        semester=semester,
+        articles=[qa.article.title for qa in existing.articles],
+    )
+
+
+class MissingStatError(ValueError):
+    """Stat absente pour la période alors que la récupération réseau n'est pas autorisée."""
+
+
+def _articles_with_stats(
+    session: Session, theme: Theme, year: int, semester: str, limit: int, project: str
+) -> List[Article]:
+    # Classement matérialisé disponible : on tire des rangs au hasard, une seule requête indexée.
+    size = ranking_size(session, theme.id, year, semester, project)
+    if size >= limit:
+        ranks = sample(range(1, size + 1), limit)
+        return session.scalars(
+            select(Article)
+            .join(ThemePeriodRanking, ThemePeriodRanking.article_id == Article.id)
+            .where(
+                ThemePeriodRanking.project == project,
+                ThemePeriodRanking.theme_id == theme.id,
+                ThemePeriodRanking.year == year,
+                ThemePeriodRanking.semester == semester,
+                ThemePeriodRanking.rank.in_(ranks),
+            )
+        ).all()
+    article_ids = session.scalars(
+        select(ArticleSemesterStat.article_id)
+        .join(ArticleTheme, ArticleTheme.article_id == ArticleSemesterStat.article_id)
+        .where(
+            ArticleTheme.theme_id == theme.id,
+            ArticleSemesterStat.project == project,
+            ArticleSemesterStat.year == year,
+            ArticleSemesterStat.semester == semester,
+        )
+    ).all()
+    if len(article_ids) < limit:
+        return []
+    chosen_ids = sample(article_ids, limit)
+    return session.scalars(select(Article).where(Article.id.in_(chosen_ids))).all()
+
+
+def pick_random_articles(
+    session: Session,
+    theme: Theme,
+    limit: int = 4,
+    year: int | None = None,
+    semester: str | None = None,
+    allow_fetch: bool = False,
+    project: str | None = None,
+) -> List[Article]:
+    """
+    Tire `limit` articles du thème (et du projet). Avec une période, seuls les articles ayant déjà une stat pour ce
+    semestre sont candidats ; allow_fetch=True autorise à retomber sur tout le thème (stats récupérées ensuite).
+    """
+    project = project or get_settings().wikimedia_project
+    if year is not None and semester is not None:
+        chosen = _articles_with_stats(session, theme, year, semester, limit, project)
+        if chosen:
+            return chosen
+        if not allow_fetch:
+            raise ValueError("Not enough articles with stats for this theme and period.")
     article_ids = session.scalars(
-        select(Article.id).join(ArticleTheme).where(ArticleTheme.theme_id == theme.id)
+        select(Article.id).join(ArticleTheme).where(ArticleTheme.theme_id == theme.id, Article.project == project)
     ).all()
     if len(article_ids) < limit:
         raise ValueError("Not enough articles linked to this theme.")
@@ -168,48 +258,86 @@ def pick_random_articles(session: Session, theme: Theme, limit: int = 4) -> List
     return session.scalars(select(Article).where(Article.id.in_(chosen_ids))).all()
 
 
+def load_semester_stats(
+    session: Session, articles: Sequence[Article], year: int, semester: str
+) -> dict[int, ArticleSemesterStat]:
+    return {
+        stat.article_id: stat
+        for stat in session.scalars(
+            select(ArticleSemesterStat).where(
+                # Filtre redondant avec article_id mais nécessaire pour n'ouvrir que la partition du projet.
+                ArticleSemesterStat.project.in_({article.project for article in articles}),
+                ArticleSemesterStat.article_id.in_([article.id for article in articles]),
+                ArticleSemesterStat.year == year,
+                ArticleSemesterStat.semester == semester,
+            )
+        )
+    }
+
+
 def build_question(
     session: Session,
     theme_name: str,
     year: int,
     semester: str,
     articles: Sequence[str] | None = None,
+    allow_fetch: bool = False,
+    client: WikimediaClient | None = None,
+    project: str | None = None,
 ) -> QuestionPayload:
-    settings = get_settings()
+    """
+    Crée (ou retourne) la question d'un thème / semestre.
+
+    Sans allow_fetch, seules les stats déjà en base sont utilisées : aucun appel réseau et un nombre constant
+    de requêtes SQL. Avec allow_fetch, les stats manquantes sont récupérées via l'API pageviews.
+    """
+    project = project or get_settings().wikimedia_project
     theme = ensure_theme(session, theme_name)
-    client = WikimediaClient(project=settings.wikimedia_project)
+
+    existing = find_question(session, theme, year, semester, project)
+    if existing:
+        return existing
 
     if articles:
         article_objs = []
         for title in articles:
-            art = ensure_article(session, title, project=settings.wikimedia_project)
+            art = ensure_article(session, title, project=project)
             link_article_theme(session, art, theme)
             article_objs.append(art)
     else:
-        article_objs = pick_random_articles(session, theme, 4)
-
-    existing = session.scalar(
-        select(Question).where(
-            Question.theme_id == theme.id,
-            Question.year == year,
-            Question.semester == semester,
+        article_objs = pick_random_articles(
+            session, theme, 4, year, semester, allow_fetch=allow_fetch, project=project
         )
-    )
-    if existing:
-        return QuestionPayload(
-            id=existing.id,
-            theme=theme.name,
-            year=year,
-            semester=semester,
-            articles=[qa.article.title for qa in existing.articles],
+
+    stats = load_semester_stats(session, article_objs, year, semester)
+    missing = [article for article in article_objs if article.id not in stats]
+    if missing and not allow_fetch:
+        raise MissingStatError(
+            f"Stats {year}-{semester} absentes pour : {', '.join(article.title for article in missing)}."
         )
+    if missing:
+        client = client or WikimediaClient(project=project)
+        for article in missing:
+            stats[article.id] = ensure_semester_stat(session, article, year, semester, client)
 
-    question = Question(theme=theme, year=year, semester=semester, status="ready")
+    return create_question(session, theme, year, semester, article_objs, stats)
+
+
+def create_question(
+    session: Session,
+    theme: Theme,
+    year: int,
+    semester: str,
+    article_objs: Sequence[Article],
+    stats: dict[int, ArticleSemesterStat],
+) -> QuestionPayload:
+    """Insère la question et ses articles à partir de stats déjà connues (aucun accès réseau)."""
+    question = Question(project=article_objs[0].project, theme=theme, year=year, semester=semester, status="ready")
     session.add(question)
     session.flush()
 
     for article in article_objs:
-        stat = ensure_semester_stat(session, article, year, semester, client)
+        stat = stats[article.id]
         qa = QuestionArticle(
             question=question,
             article=article,
@@ -219,6 +347,8 @@ def build_question(
         session.add(qa)
 
     session.flush()
+    # Le snapshot suit la question dans la même transaction : le jeu ne voit jamais l'une sans l'autre.
+    publish_questions(session, [question.id])
     return QuestionPayload(
         id=question.id,
         theme=theme.name,
@@ -0,0 +1,362 @@
+"""
+Serveur HTTP asyncio en lecture seule des questions prêtes (commande `serve`).
+
+Les questions prêtes d'un projet et leurs articles (tables questions / question_articles, même contenu que les
+snapshots publiés) sont chargés dans un index en mémoire : chaque question est rangée sous les 8 combinaisons de
+filtres (thème, année, semestre, chacun optionnel) et sa réponse JSON est sérialisée une fois pour toutes. Un
+tirage est un choix aléatoire dans le bon panier, sans requête SQL.
+
+L'index est rechargé de façon incrémentale : les questions dont updated_at a bougé depuis le dernier passage
+sont relues (ajoutées, remplacées ou retirées si elles ne sont plus prêtes), et un rechargement complet est fait
+périodiquement par sécurité.
+
+    GET /question?theme=Sport&year=2024&semester=S1   question aléatoire (404 si aucune)
+    GET /metrics                                       taille de l'index, latences p50 / p99 des tirages
+    GET /health
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from sqlalchemy import select
+
+from .bulk_writer import chunked
+from .db import get_session
+from .models import Question
+from .snapshots import build_snapshot_rows
+
+# (thème, année, semestre) ; None = filtre absent.
+FilterKey = tuple[Optional[str], Optional[int], Optional[str]]
+
+# Marge de relecture autour du dernier updated_at vu : une transaction validée après le passage précédent peut
+# porter un horodatage légèrement antérieur. Les questions relues sont simplement remplacées.
+RELOAD_OVERLAP = timedelta(seconds=60)
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+@dataclass
+class IndexChanges:
+    rows: List[dict] = field(default_factory=list)  # questions prêtes et complètes (voir build_snapshot_rows)
+    removed: List[int] = field(default_factory=list)  # questions qui ne sont plus servables
+    watermark: Optional[datetime] = None
+
+
+def fetch_changes(project: str, since: Optional[datetime] = None) -> IndexChanges:
+    """Questions du projet modifiées depuis `since` (toutes si None), avec leurs articles."""
+    changes = IndexChanges(watermark=since)
+    with get_session() as session:
+        query = select(Question.id, Question.status, Question.updated_at).where(Question.project == project)
+        if since is not None:
+            query = query.where(Question.updated_at >= since - RELOAD_OVERLAP)
+        questions = session.execute(query).all()
+        ready = [row.id for row in questions if row.status == "ready"]
+        for chunk in chunked(ready, 1000):
+            changes.rows += build_snapshot_rows(session, chunk)
+    built = {row["question_id"] for row in changes.rows}
+    changes.removed = [row.id for row in questions if row.id not in built]
+    stamps = [row.updated_at for row in questions if row.updated_at is not None]
+    if stamps:
+        changes.watermark = max(stamps) if since is None else max(since, *stamps)
+    return changes
+
+
+class _Bucket:
+    """Identifiants d'un panier : ajout, retrait (échange avec le dernier) et tirage en O(1)."""
+
+    __slots__ = ("ids", "positions")
+
+    def __init__(self) -> None:
+        self.ids: List[int] = []
+        self.positions: Dict[int, int] = {}
+
+    def add(self, question_id: int) -> None:
+        if question_id not in self.positions:
+            self.positions[question_id] = len(self.ids)
+            self.ids.append(question_id)
+
+    def discard(self, question_id: int) -> None:
+        position = self.positions.pop(question_id, None)
+        if position is None:
+            return
+        last = self.ids.pop()
+        if last != question_id:
+            self.ids[position] = last
+            self.positions[last] = position
+
+
+class QuestionIndex:
+    """Questions servables d'un projet, indexées par (thème, année, semestre) avec réponses pré-sérialisées."""
+
+    def __init__(self, project: str) -> None:
+        self.project = project
+        self.watermark: Optional[datetime] = None
+        self.loaded_at: Optional[datetime] = None
+        self._payloads: Dict[int, bytes] = {}
+        self._keys: Dict[int, FilterKey] = {}
+        self._buckets: Dict[FilterKey, _Bucket] = {}
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    @staticmethod
+    def filter_keys(key: FilterKey) -> List[FilterKey]:
+        theme, year, semester = key
+        return list(itertools.product((theme, None), (year, None), (semester, None)))
+
+    def put(self, row: dict) -> bool:
+        """Ajoute ou remplace une question ; False si elle était déjà indexée à l'identique."""
+        question_id = row["question_id"]
+        key = (row["theme"], row["year"], row["semester"])
+        payload = {
+            "id": question_id,
+            "theme": row["theme"],
+            "year": row["year"],
+            "semester": row["semester"],
+            "articles": row["articles"],
+            "correct_order": row["correct_order"],
+        }
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        if self._keys.get(question_id) == key and self._payloads[question_id] == body:
+            return False
+        self.remove(question_id)
+        self._payloads[question_id] = body
+        self._keys[question_id] = key
+        for filter_key in self.filter_keys(key):
+            self._buckets.setdefault(filter_key, _Bucket()).add(question_id)
+        return True
+
+    def remove(self, question_id: int) -> bool:
+        key = self._keys.pop(question_id, None)
+        if key is None:
+            return False
+        del self._payloads[question_id]
+        for filter_key in self.filter_keys(key):
+            bucket = self._buckets[filter_key]
+            bucket.discard(question_id)
+            if not bucket.ids:
+                del self._buckets[filter_key]
+        return True
+
+    def apply(self, changes: IndexChanges) -> tuple[int, int]:
+        """Verse des changements dans l'index ; retourne (questions ajoutées ou modifiées, retirées)."""
+        updated = sum(self.put(row) for row in changes.rows)
+        removed = sum(self.remove(question_id) for question_id in changes.removed)
+        self.watermark = changes.watermark
+        self.loaded_at = datetime.now(timezone.utc)
+        return updated, removed
+
+    def pick(
+        self,
+        theme: Optional[str] = None,
+        year: Optional[int] = None,
+        semester: Optional[str] = None,
+        rng: Optional[random.Random] = None,
+    ) -> Optional[bytes]:
+        """Réponse JSON d'une question tirée au hasard parmi celles qui correspondent aux filtres, ou None."""
+        bucket = self._buckets.get((theme, year, semester))
+        if bucket is None:
+            return None
+        return self._payloads[bucket.ids[int((rng or random).random() * len(bucket.ids))]]
+
+    def question_ids(self) -> List[int]:
+        return list(self._payloads)
+
+    def counts(self) -> Dict[str, int]:
+        """Questions servables par thème."""
+        return {key[0]: len(bucket.ids) for key, bucket in self._buckets.items() if key[1:] == (None, None) and key[0]}
+
+
+def load_index(project: str) -> QuestionIndex:
+    index = QuestionIndex(project)
+    index.apply(fetch_changes(project))
+    return index
+
+
+class LatencyRecorder:
+    """Latences des dernières requêtes (fenêtre bornée) ; percentiles calculés à la demande."""
+
+    def __init__(self, window: int = 10_000) -> None:
+        self.samples: deque[float] = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self) -> Dict[str, float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"requests": self.count, "p50_us": 0.0, "p99_us": 0.0, "max_us": 0.0}
+
+        def at(fraction: float) -> float:
+            return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1e6
+
+        return {"requests": self.count, "p50_us": at(0.50), "p99_us": at(0.99), "max_us": ordered[-1] * 1e6}
+
+
+def _response(status: int, body: bytes, keep_alive: bool, head_only: bool = False) -> bytes:
+    """Réponse complète ; pour HEAD (head_only), les en-têtes du GET (Content-Length compris) sans le corps."""
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode() if head_only else head.encode() + body
+
+
+def _error(message: str) -> bytes:
+    return json.dumps({"error": message}, ensure_ascii=False).encode()
+
+
+class QuestionServer:
+    def __init__(
+        self,
+        index: QuestionIndex,
+        reload_interval: float,
+        full_reload_interval: float,
+        report_interval: float = 60.0,
+        echo: Callable[[str], None] = print,
+    ) -> None:
+        self.index = index
+        self.reload_interval = reload_interval
+        self.full_reload_interval = full_reload_interval
+        self.report_interval = report_interval
+        self.echo = echo
+        self.latency = LatencyRecorder()
+        self.reloads = 0
+        self.reload_errors = 0
+        self._rng = random.Random()
+
+    def metrics(self) -> dict:
+        return {
+            "project": self.index.project,
+            "questions": len(self.index),
+            "themes": self.index.counts(),
+            "loaded_at": self.index.loaded_at.isoformat() if self.index.loaded_at else None,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            **self.latency.summary(),
+        }
+
+    def respond(self, method: str, target: str) -> tuple[int, bytes]:
+        if method not in ("GET", "HEAD"):
+            return 405, _error("Méthode non supportée.")
+        url = urlsplit(target)
+        if url.path == "/question":
+            params = dict(parse_qsl(url.query))
+            try:
+                year = int(params["year"]) if params.get("year") else None
+            except ValueError:
+                return 400, _error("year doit être un entier.")
+            body = self.index.pick(params.get("theme") or None, year, params.get("semester") or None, self._rng)
+            return (200, body) if body is not None else (404, _error("Aucune question pour ces critères."))
+        if url.path == "/metrics":
+            return 200, json.dumps(self.metrics(), ensure_ascii=False).encode()
+        if url.path == "/health":
+            return 200, json.dumps({"status": "ok", "questions": len(self.index)}).encode()
+        return 404, _error("Route inconnue.")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Une connexion HTTP/1.1 (keep-alive) : requêtes GET sans corps, réponses JSON."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                started = time.perf_counter()
+                request_line, *lines = head.decode("latin-1").split("\r\n")
+                headers = {
+                    name.strip().lower(): value.strip() for name, _, value in (line.partition(":") for line in lines)
+                }
+                parts = request_line.split(" ")
+                if len(parts) != 3:
+                    writer.write(_response(400, _error("Requête invalide."), False))
+                    break
+                method, target, version = parts
+                length = headers.get("content-length") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    writer.write(_response(400, _error("Content-Length invalide."), False))
+                    break
+                if int(length):
+                    try:
+                        await reader.readexactly(int(length))
+                    except asyncio.IncompleteReadError:
+                        break
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                status, body = self.respond(method, target)
+                writer.write(_response(status, body, keep_alive, head_only=method == "HEAD"))
+                if target.startswith("/question"):
+                    self.latency.add(time.perf_counter() - started)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def reload(self, full: bool = False) -> None:
+        """Relit les questions modifiées (ou toutes) hors de la boucle, puis met l'index à jour dans la boucle."""
+        loop = asyncio.get_running_loop()
+        project = self.index.project
+        try:
+            changes = await loop.run_in_executor(None, fetch_changes, project, None if full else self.index.watermark)
+            if full:
+                # Rechargement complet : les questions indexées absentes de la relecture sont retirées.
+                current = {row["question_id"] for row in changes.rows}
+                changes.removed += [qid for qid in self.index.question_ids() if qid not in current]
+            added, removed = self.index.apply(changes)
+        except Exception as exc:  # noqa: BLE001
+            self.reload_errors += 1
+            self.echo(f"Rechargement impossible ({exc.__class__.__name__}: {exc}), index conservé.")
+            return
+        self.reloads += 1
+        if full or removed or added:
+            kind = "complet" if full else "incrémental"
+            self.echo(f"Index {kind} : {added} questions à jour, {removed} retirées, {len(self.index)} servables.")
+
+    async def reload_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        last_full = last_report = loop.time()
+        reported = self.latency.count
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            now = loop.time()
+            full = now - last_full >= self.full_reload_interval
+            await self.reload(full=full)
+            if full:
+                last_full = now
+            if now - last_report >= self.report_interval and self.latency.count != reported:
+                self.echo(self.latency_line())
+                last_report, reported = now, self.latency.count
+
+    def latency_line(self) -> str:
+        summary = self.latency.summary()
+        return (
+            f"{summary['requests']} tirages, p50 {summary['p50_us']:.0f} µs, p99 {summary['p99_us']:.0f} µs, "
+            f"max {summary['max_us']:.0f} µs."
+        )
+
+    async def run(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        reloader = asyncio.create_task(self.reload_loop())
+        self.echo(f"{len(self.index)} questions {self.index.project} servies sur http://{host}:{port}/question")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            reloader.cancel()
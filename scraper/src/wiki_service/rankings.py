@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+
+from sqlalchemy import case, delete, func, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from .models import ArticleSemesterStat, ArticleTheme, RankingRefresh, ThemePeriodRanking
+
+# Seuils de percent_rank (0 = meilleur) : top 10 % en S, puis A jusqu'à 30 %, B jusqu'à 60 %, le reste en C.
+TIERS = (("S", 0.10), ("A", 0.30), ("B", 0.60))
+DEFAULT_TIER = "C"
+
+
+def tier_for(pct: float) -> str:
+    """Tier d'un percent_rank (0 = meilleur), mêmes seuils que le classement matérialisé."""
+    for label, threshold in TIERS:
+        if pct < threshold:
+            return label
+    return DEFAULT_TIER
+
+
+def period_fingerprints(session: Session) -> dict[tuple[int, str], tuple[int, Optional[datetime]]]:
+    """(nombre de couples stat x thème, dernière mise à jour des stats) par période."""
+    rows = session.execute(
+        select(
+            ArticleSemesterStat.year,
+            ArticleSemesterStat.semester,
+            func.count(),
+            func.max(ArticleSemesterStat.updated_at),
+        )
+        .join(ArticleTheme, ArticleTheme.article_id == ArticleSemesterStat.article_id)
+        .group_by(ArticleSemesterStat.year, ArticleSemesterStat.semester)
+    )
+    return {(year, semester): (count, updated_at) for year, semester, count, updated_at in rows}
+
+
+def _same_instant(a: Optional[datetime], b: Optional[datetime]) -> bool:
+    if a is None or b is None:
+        return a is b
+    # SQLite renvoie des datetimes naïfs : on compare en UTC.
+    a = a if a.tzinfo else a.replace(tzinfo=timezone.utc)
+    b = b if b.tzinfo else b.replace(tzinfo=timezone.utc)
+    return a == b
+
+
+def stale_periods(session: Session) -> List[tuple[int, str]]:
+    fingerprints = period_fingerprints(session)
+    refreshed = {
+        (row.year, row.semester): (row.row_count, row.stats_updated_at)
+        for row in session.scalars(select(RankingRefresh))
+    }
+    stale = []
+    for period, (count, updated_at) in sorted(fingerprints.items()):
+        previous = refreshed.get(period)
+        if previous is None or previous[0] != count or not _same_instant(previous[1], updated_at):
+            stale.append(period)
+    # Périodes qui n'ont plus aucune stat : leur classement doit disparaître.
+    stale.extend(sorted(set(refreshed) - set(fingerprints)))
+    return stale
+
+
+def _ranking_select(periods: Sequence[tuple[int, str]]):
+    partition = (
+        ArticleSemesterStat.project, ArticleTheme.theme_id, ArticleSemesterStat.year, ArticleSemesterStat.semester
+    )
+    order = (ArticleSemesterStat.views_avg_daily.desc(), ArticleSemesterStat.article_id)
+    ranked = (
+        select(
+            ArticleSemesterStat.project.label("project"),
+            ArticleTheme.theme_id.label("theme_id"),
+            ArticleSemesterStat.year.label("year"),
+            ArticleSemesterStat.semester.label("semester"),
+            func.row_number().over(partition_by=partition, order_by=order).label("rank"),
+            ArticleSemesterStat.article_id.label("article_id"),
+            ArticleSemesterStat.views_avg_daily.label("views_avg_daily"),
+            func.percent_rank().over(partition_by=partition, order_by=order).label("pct"),
+        )
+        .join(ArticleTheme, ArticleTheme.article_id == ArticleSemesterStat.article_id)
+        .where(tuple_(ArticleSemesterStat.year, ArticleSemesterStat.semester).in_(list(periods)))
+        .subquery()
+    )
+    tier = case(*((ranked.c.pct < threshold, label) for label, threshold in TIERS), else_=DEFAULT_TIER)
+    return select(
+        ranked.c.project,
+        ranked.c.theme_id,
+        ranked.c.year,
+        ranked.c.semester,
+        ranked.c.rank,
+        ranked.c.article_id,
+        ranked.c.views_avg_daily,
+        (1 - ranked.c.pct).label("percentile"),
+        tier.label("tier"),
+    )
+
+
+def refresh_rankings(
+    session: Session, full: bool = False, periods: Optional[Sequence[tuple[int, str]]] = None
+) -> List[tuple[int, str]]:
+    """
+    Reconstruit en masse (fonctions de fenêtre, INSERT ... SELECT) le classement des périodes modifiées
+    depuis le dernier refresh, ou de toutes les périodes avec full=True. Retourne les périodes traitées.
+    """
+    fingerprints = period_fingerprints(session)
+    if periods is None:
+        periods = sorted(fingerprints) if full else stale_periods(session)
+    periods = list(periods)
+    for year, semester in periods:
+        session.execute(
+            delete(ThemePeriodRanking).where(
+                ThemePeriodRanking.year == year, ThemePeriodRanking.semester == semester
+            )
+        )
+        session.execute(
+            delete(RankingRefresh).where(RankingRefresh.year == year, RankingRefresh.semester == semester)
+        )
+    present = [period for period in periods if period in fingerprints]
+    if present:
+        columns = [
+            "project", "theme_id", "year", "semester", "rank", "article_id", "views_avg_daily", "percentile", "tier"
+        ]
+        session.execute(insert(ThemePeriodRanking).from_select(columns, _ranking_select(present)))
+        for period in present:
+            count, updated_at = fingerprints[period]
+            session.add(
+                RankingRefresh(year=period[0], semester=period[1], row_count=count, stats_updated_at=updated_at)
+            )
+        session.flush()
+    return periods
+
+
+def ranked_articles(
+    session: Session,
+    theme_id: int,
+    year: int,
+    semester: str,
+    project: str,
+    limit: Optional[int] = None,
+    tier: Optional[str] = None,
+) -> List[ThemePeriodRanking]:
+    """Top-N (ou un tier) d'un thème sur une période : parcours de la clé (projet, thème, période, rang)."""
+    stmt = select(ThemePeriodRanking).where(
+        ThemePeriodRanking.project == project,
+        ThemePeriodRanking.theme_id == theme_id,
+        ThemePeriodRanking.year == year,
+        ThemePeriodRanking.semester == semester,
+    )
+    if tier:
+        stmt = stmt.where(ThemePeriodRanking.tier == tier)
+    stmt = stmt.order_by(ThemePeriodRanking.rank)
+    if limit:
+        stmt = stmt.limit(limit)
+    return list(session.scalars(stmt))
+
+
+def ranking_size(session: Session, theme_id: int, year: int, semester: str, project: str) -> int:
+    return session.scalar(
+        select(func.max(ThemePeriodRanking.rank)).where(
+            ThemePeriodRanking.project == project,
+            ThemePeriodRanking.theme_id == theme_id,
+            ThemePeriodRanking.year == year,
+            ThemePeriodRanking.semester == semester,
+        )
+    ) or 0
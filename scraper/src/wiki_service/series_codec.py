@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .config import get_settings
+
+# Octet d'en-tête : version (4 bits hauts) + drapeaux.
+VERSION = 1
+FLAG_DELTA = 0x01
+FLAG_ZLIB = 0x02
+FLAG_ZSTD = 0x04
+# Jour sans donnée dans la série (l'article n'apparaissait pas dans le top ce jour-là).
+MISSING = -1
+
+CODECS = ("raw", "zlib", "zstd")
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as exc:  # pragma: no cover - dépendance optionnelle
+        raise RuntimeError("Le codec zstd nécessite le paquet 'zstandard'.") from exc
+    return zstandard
+
+
+def encode_values(values: np.ndarray, codec: Optional[str] = None) -> bytes:
+    """
+    Encode un tableau quotidien (int32, MISSING pour les jours absents) en binaire compact.
+
+    raw : int32 little-endian tels quels (décodage sans copie via memoryview / np.frombuffer).
+    zlib / zstd : deltas successifs puis compression.
+    """
+    codec = codec or get_settings().series_codec
+    if codec not in CODECS:
+        raise ValueError(f"Codec de série inconnu : {codec}.")
+    array = np.ascontiguousarray(values, dtype="<i4")
+    flags = 0
+    if codec != "raw":
+        array = np.diff(array, prepend=np.int32(0)).astype("<i4")
+        flags |= FLAG_DELTA
+    payload = array.tobytes()
+    if codec == "zlib":
+        payload = zlib.compress(payload, 6)
+        flags |= FLAG_ZLIB
+    elif codec == "zstd":
+        payload = _zstd().ZstdCompressor(level=6).compress(payload)
+        flags |= FLAG_ZSTD
+    return bytes([(VERSION << 4) | flags]) + payload
+
+
+def decode_values(blob: bytes | memoryview) -> np.ndarray:
+    view = memoryview(blob)
+    header = view[0]
+    if header >> 4 != VERSION:
+        raise ValueError(f"Version de série inconnue : {header >> 4}.")
+    payload = view[1:]
+    if header & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    elif header & FLAG_ZSTD:
+        payload = _zstd().ZstdDecompressor().decompress(bytes(payload))
+    values = np.frombuffer(payload, dtype="<i4")
+    if header & FLAG_DELTA:
+        values = np.cumsum(values, dtype=np.int64).astype(np.int32)
+    return values
+
+
+def parse_timestamp(timestamp: str) -> Optional[date]:
+    """"2024010100" (API per-article) ou "20240101" ; None pour un timestamp non daté ("all-days")."""
+    try:
+        return datetime.strptime(str(timestamp)[:8], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def pack_series(series: Sequence[dict], codec: Optional[str] = None) -> Optional[tuple[date, bytes]]:
+    """Série historique [{"timestamp", "views"}] -> (date de début, binaire) ; None si la série est vide ou non datée."""
+    points = []
+    for point in series:
+        day = parse_timestamp(point.get("timestamp", ""))
+        if day is None:
+            return None
+        points.append((day, int(point.get("views", 0))))
+    if not points:
+        return None
+    start = min(day for day, _ in points)
+    end = max(day for day, _ in points)
+    values = np.full((end - start).days + 1, MISSING, dtype=np.int32)
+    for day, views in points:
+        offset = (day - start).days
+        values[offset] = views if values[offset] == MISSING else values[offset] + views
+    return start, encode_values(values, codec)
+
+
+def append_points(
+    start: Optional[date], values: Optional[np.ndarray], points: Iterable[tuple[date, int, int]]
+) -> Optional[tuple[date, np.ndarray, int, int]]:
+    """
+    Ajoute à une série quotidienne (début, tableau) les points (jour, vues, jours couverts) postérieurs à son
+    dernier jour ; les autres sont ignorés, si bien qu'un même jour n'est jamais compté deux fois.
+
+    Retourne (début, tableau, vues ajoutées, jours couverts ajoutés), ou None si aucun point n'est nouveau.
+    """
+    last = None
+    if start is not None and values is not None and len(values):
+        last = start + timedelta(days=len(values) - 1)
+    fresh = sorted(point for point in points if point[1] > 0 and (last is None or point[0] > last))
+    if not fresh:
+        return None
+    if last is None:
+        start, values = fresh[0][0], np.empty(0, dtype=np.int32)
+    merged = np.full((fresh[-1][0] - start).days + 1, MISSING, dtype=np.int32)
+    merged[: len(values)] = values
+    for day, views, _ in fresh:
+        offset = (day - start).days
+        merged[offset] = views if merged[offset] == MISSING else merged[offset] + views
+    return start, merged, sum(views for _, views, _ in fresh), sum(span for _, _, span in fresh)
+
+
+def unpack_series(start: date, blob: bytes | memoryview) -> List[dict]:
+    """Reconstruit la forme historique, pour les appelants qui en ont besoin."""
+    values = decode_values(blob)
+    return [
+        {"timestamp": (start + timedelta(days=int(offset))).strftime("%Y%m%d00"), "views": int(values[offset])}
+        for offset in np.flatnonzero(values != MISSING)
+    ]
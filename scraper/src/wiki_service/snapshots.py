@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import random
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, or_, select
+from sqlalchemy.orm import Session
+
+from .bulk_writer import chunked, dialect_insert
+from .config import get_settings
+from .models import Article, Question, QuestionArticle, QuestionSnapshot, Theme
+
+ARTICLES_PER_QUESTION = 4
+
+
+def questions_to_publish(session: Session) -> list[int]:
+    """
+    Questions prêtes sans snapshot, ou modifiées depuis leur dernière publication : la question elle-même ou l'un
+    de ses articles (titre, extrait, image recopiés dans le snapshot, cf. enrich-metadata).
+    """
+    article_changed = (
+        select(QuestionArticle.id)
+        .join(Article, Article.id == QuestionArticle.article_id)
+        .where(QuestionArticle.question_id == Question.id, Article.updated_at > QuestionSnapshot.published_at)
+        .exists()
+    )
+    return list(
+        session.scalars(
+            select(Question.id)
+            .outerjoin(QuestionSnapshot, QuestionSnapshot.question_id == Question.id)
+            .where(
+                Question.status == "ready",
+                or_(
+                    QuestionSnapshot.question_id.is_(None),
+                    Question.updated_at > QuestionSnapshot.published_at,
+                    article_changed,
+                ),
+            )
+            .order_by(Question.id)
+        )
+    )
+
+
+def build_snapshot_rows(session: Session, question_ids: Iterable[int]) -> list[dict]:
+    ids = list(question_ids)
+    if not ids:
+        return []
+    rows = session.execute(
+        select(
+            Question.id,
+            Question.project,
+            Question.theme_id,
+            Theme.name,
+            Question.year,
+            Question.semester,
+            Article.title,
+            Article.summary,
+            Article.image_url,
+            QuestionArticle.views_total,
+            QuestionArticle.views_avg_daily,
+        )
+        .join(Theme, Theme.id == Question.theme_id)
+        .join(QuestionArticle, QuestionArticle.question_id == Question.id)
+        .join(Article, Article.id == QuestionArticle.article_id)
+        .where(Question.id.in_(ids), Question.status == "ready")
+        .order_by(Question.id, QuestionArticle.id)
+    )
+    grouped: dict[int, dict] = {}
+    articles: dict[int, list[dict]] = defaultdict(list)
+    for row in rows:
+        grouped.setdefault(
+            row.id,
+            {
+                "question_id": row.id,
+                "project": row.project,
+                "theme_id": row.theme_id,
+                "theme": row.name,
+                "year": row.year,
+                "semester": row.semester,
+            },
+        )
+        articles[row.id].append(
+            {
+                "title": row.title,
+                "summary": row.summary,
+                "image_url": row.image_url,
+                "views_total": row.views_total,
+                "views_avg_daily": row.views_avg_daily,
+            }
+        )
+    now = datetime.now(timezone.utc)
+    snapshots = []
+    for question_id, base in grouped.items():
+        items = articles[question_id]
+        # Même règle que le backend de jeu : seules les questions complètes sont jouables.
+        if len(items) != ARTICLES_PER_QUESTION:
+            continue
+        snapshots.append(
+            {
+                **base,
+                "articles": items,
+                "correct_order": [a["title"] for a in sorted(items, key=lambda a: a["views_avg_daily"])],
+                "random_key": random.random(),
+                "published_at": now,
+            }
+        )
+    return snapshots
+
+
+def publish_questions(
+    session: Session, question_ids: Optional[Iterable[int]] = None, batch_size: Optional[int] = None
+) -> int:
+    """
+    Publie (insère ou remplace) les snapshots des questions données, ou de toutes celles à republier.
+    Les snapshots dont la question n'est plus prête (ou incomplète) sont retirés. Retourne le nombre publié.
+    """
+    ids = questions_to_publish(session) if question_ids is None else list(question_ids)
+    published = 0
+    for chunk in chunked(ids, batch_size or get_settings().batch_size):
+        rows = build_snapshot_rows(session, chunk)
+        ready = {row["question_id"] for row in rows}
+        stale = [question_id for question_id in chunk if question_id not in ready]
+        if stale:
+            session.execute(delete(QuestionSnapshot).where(QuestionSnapshot.question_id.in_(stale)))
+        if not rows:
+            continue
+        stmt = dialect_insert(session, QuestionSnapshot).values(rows)
+        session.execute(
+            stmt.on_conflict_do_update(
+                # Clé primaire (question_id, project) : la clé de partition doit en faire partie.
+                index_elements=["question_id", "project"],
+                set_={
+                    column: stmt.excluded[column]
+                    for column in ("theme_id", "theme", "year", "semester", "articles", "correct_order", "published_at")
+                },
+            )
+        )
+        published += len(rows)
+    return published
+
+
+def unpublish_orphans(session: Session) -> int:
+    """Supprime les snapshots dont la question n'est plus prête ou n'existe plus."""
+    result = session.execute(
+        delete(QuestionSnapshot).where(
+            ~select(Question.id)
+            .where(Question.id == QuestionSnapshot.question_id, Question.status == "ready")
+            .exists()
+        )
+    )
+    return result.rowcount or 0
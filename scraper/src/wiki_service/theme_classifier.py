@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from collections import deque
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Sequence
+
+from .themes import THEMES
+
+
+def normalize_title(title: str) -> str:
+    """Les titres du top arrivent sous forme de slug : "Star_Wars" doit matcher le keyword "star wars"."""
+    return title.replace("_", " ").lower()
+
+
+class ThemeClassifier:
+    """
+    Classifieur multi-thèmes en une passe (automate d'Aho–Corasick construit une fois depuis THEMES).
+
+    Tous les keywords sont comparés en minuscules. Les keywords courts (<= whole_word_max_len caractères,
+    ex. "tv", "pop", "ia") ne matchent qu'un mot entier ; word_boundaries=True applique la règle à tous.
+    Un thème sans keywords reçoit tous les titres (top global).
+    """
+
+    def __init__(
+        self,
+        themes: Sequence[dict] = THEMES,
+        word_boundaries: bool = False,
+        whole_word_max_len: int = 3,
+    ) -> None:
+        self.theme_names: List[str] = [theme["name"] for theme in themes]
+        self._catch_all = frozenset(i for i, theme in enumerate(themes) if not theme.get("keywords"))
+        # Par nœud : transitions, lien d'échec, sorties (indice de thème, longueur, mot entier).
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[tuple[int, int, bool]]] = [[]]
+        for theme_index, theme in enumerate(themes):
+            for keyword in theme.get("keywords", []):
+                if not keyword:
+                    continue
+                pattern = keyword.lower()
+                whole_word = word_boundaries or len(pattern.strip()) <= whole_word_max_len
+                self._add(pattern, (theme_index, len(pattern), whole_word))
+        self._build_links()
+        self._cache: Dict[str, FrozenSet[int]] = {}
+
+    def _add(self, pattern: str, output: tuple[int, int, bool]) -> None:
+        node = 0
+        for char in pattern:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        if output not in self._out[node]:
+            self._out[node].append(output)
+
+    def _build_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                # Les sorties du suffixe le plus long sont fusionnées : une seule lecture par nœud au matching.
+                self._out[child].extend(self._out[self._fail[child]])
+
+    def _match(self, text: str) -> FrozenSet[int]:
+        found = set(self._catch_all)
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for end, char in enumerate(text, start=1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for theme_index, length, whole_word in out[node]:
+                if theme_index in found:
+                    continue
+                if whole_word:
+                    # Un keyword qui porte déjà son séparateur ("né ") n'est pas contrôlé de ce côté-là.
+                    start = end - length
+                    if start > 0 and text[start].isalnum() and text[start - 1].isalnum():
+                        continue
+                    if end < len(text) and text[end - 1].isalnum() and text[end].isalnum():
+                        continue
+                found.add(theme_index)
+        return frozenset(found)
+
+    def theme_indices(self, title: str) -> FrozenSet[int]:
+        result = self._cache.get(title)
+        if result is None:
+            result = self._cache[title] = self._match(normalize_title(title))
+        return result
+
+    def themes_for(self, title: str) -> List[str]:
+        return [self.theme_names[i] for i in sorted(self.theme_indices(title))]
+
+    def classify_indices(self, titles: Sequence[str]) -> Dict[str, List[int]]:
+        """{thème: [positions dans titles]} en une seule passe sur les titres."""
+        result: Dict[str, List[int]] = {name: [] for name in self.theme_names}
+        for position, title in enumerate(titles):
+            for theme_index in self.theme_indices(title):
+                result[self.theme_names[theme_index]].append(position)
+        return result
+
+    def classify(self, titles: Iterable[str]) -> Dict[str, List[str]]:
+        titles = list(titles)
+        return {name: [titles[i] for i in positions] for name, positions in self.classify_indices(titles).items()}
+
+
+@lru_cache
+def get_classifier() -> ThemeClassifier:
+    return ThemeClassifier(THEMES)
@@ -0,0 +1,165 @@
+"""
+Normalisation des titres des tops avant agrégation et écriture.
+
+Les tops renvoient les titres tels que demandés dans l'URL : encodés en pourcentage ou non, pages spéciales et
+autres espaces de noms, redirections. normalize_title ramène chaque titre à un slug d'article (ou l'écarte) ;
+TitleResolver résout ensuite les redirections par lots, avec un cache persistant (title_resolutions), et
+canonicalize fusionne dans l'agrégat les vues des titres qui mènent à la même page.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import unquote
+
+import httpx
+from sqlalchemy import select
+
+from .bulk_writer import chunked, dialect_insert
+from .db import get_session
+from .metrics import span
+from .models import TitleResolution
+from .top_aggregate import SemesterTopAggregate, TopRecord
+from .wiki_page_client import WikiPageClient
+
+# (slug canonique, page_id) ; None pour une page absente ou un titre invalide.
+Resolution = Optional[tuple[str, Optional[int]]]
+
+# Espaces de noms hors articles (et leurs pages de discussion), comparés sans casse, espaces et "_" confondus.
+NON_ARTICLE_NAMESPACES = frozenset(
+    name.casefold()
+    for name in (
+        # Communs / anglais
+        "Media", "Special", "Talk", "User", "User talk", "Project", "Project talk", "Wikipedia", "Wikipedia talk",
+        "WP", "File", "File talk", "Image", "MediaWiki", "MediaWiki talk", "Template", "Template talk", "Help",
+        "Help talk", "Category", "Category talk", "Portal", "Portal talk", "Draft", "Draft talk", "Module",
+        "Module talk", "TimedText", "TimedText talk", "Gadget", "Gadget definition", "Topic", "Book",
+        # Français
+        "Média", "Spécial", "Discussion", "Utilisateur", "Utilisatrice", "Discussion utilisateur",
+        "Discussion utilisatrice", "Wikipédia", "Discussion Wikipédia", "Fichier", "Discussion fichier", "Modèle",
+        "Discussion modèle", "Aide", "Discussion aide", "Catégorie", "Discussion catégorie", "Portail",
+        "Discussion Portail", "Projet", "Discussion Projet", "Référence", "Discussion Référence", "Sujet",
+        "Discussion module",
+        # Allemand, espagnol, italien
+        "Spezial", "Diskussion", "Benutzer", "Datei", "Vorlage", "Hilfe", "Kategorie", "Especial", "Discusión",
+        "Usuario", "Archivo", "Plantilla", "Ayuda", "Categoría", "Anexo", "Speciale", "Discussione",
+        "Utente", "Immagine", "Aiuto", "Categoria", "Portale",
+    )
+)
+
+# Pages d'accueil publiées dans l'espace principal, et entrée "-" des tops (vues non attribuées).
+IGNORED_TITLES = frozenset({"-", "Main_Page", "Accueil", "Pagina_principale"})
+
+
+@lru_cache(maxsize=100_000)
+def normalize_title(raw: str) -> Optional[str]:
+    """
+    Slug d'article d'un titre de top : décodé ("%C3%A9" -> "é"), espaces remplacés par "_". None pour une page
+    hors espace principal (préfixe d'espace de noms), une page d'accueil ou un titre vide.
+    """
+    title = unquote(raw or "").strip().replace(" ", "_").strip("_")
+    if not title or title in IGNORED_TITLES:
+        return None
+    prefix, colon, _ = title.partition(":")
+    if colon and prefix.replace("_", " ").strip().casefold() in NON_ARTICLE_NAMESPACES:
+        return None
+    return title
+
+
+def normalize_records(records: Iterable[TopRecord]) -> Iterator[TopRecord]:
+    """Enregistrements des tops avec leurs titres normalisés ; ceux à ignorer sont retirés."""
+    for year, month, day, raw, views in records:
+        title = normalize_title(raw) if raw else None
+        if title is not None:
+            yield year, month, day, title, views
+
+
+class TitleResolver:
+    """
+    Résout les redirections des titres d'un projet. Les titres déjà résolus sont lus dans title_resolutions ;
+    les autres sont demandés à l'API par lots de 50 (action=query&redirects=1) puis mis en cache.
+    """
+
+    def __init__(self, project: str, client: Optional[WikiPageClient] = None) -> None:
+        self.project = project
+        self._client = client
+
+    @property
+    def client(self) -> WikiPageClient:
+        if self._client is None:
+            self._client = WikiPageClient(project=self.project)
+        return self._client
+
+    def cached(self, titles: List[str]) -> Dict[str, Resolution]:
+        known: Dict[str, Resolution] = {}
+        with get_session() as session:
+            for chunk in chunked(titles, 1000):
+                for row in session.execute(
+                    select(TitleResolution.title, TitleResolution.canonical, TitleResolution.page_id).where(
+                        TitleResolution.project == self.project, TitleResolution.title.in_(list(chunk))
+                    )
+                ):
+                    known[row.title] = (row.canonical, row.page_id) if row.canonical else None
+        return known
+
+    def store(self, resolved: Dict[str, Resolution]) -> None:
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "project": self.project,
+                "title": title,
+                "canonical": target[0] if target else None,
+                "page_id": target[1] if target else None,
+                "resolved_at": now,
+            }
+            for title, target in resolved.items()
+        ]
+        with get_session() as session:
+            for chunk in chunked(rows, 1000):
+                stmt = dialect_insert(session, TitleResolution).values(list(chunk))
+                session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["project", "title"],
+                        set_={column: stmt.excluded[column] for column in ("canonical", "page_id", "resolved_at")},
+                    )
+                )
+
+    def resolve(self, titles: Iterable[str]) -> Dict[str, Resolution]:
+        """{titre: (slug canonique, page_id) ou None} ; seuls les titres absents du cache passent par l'API."""
+        titles = list(dict.fromkeys(titles))
+        known = self.cached(titles)
+        missing = [title for title in titles if title not in known]
+        if missing:
+            # Titres des lots en échec absents du résultat : ni cachés ni fusionnés, redemandés au prochain import.
+            fetched = {
+                title: (target[0].replace(" ", "_"), target[1]) if target else None
+                for title, target in self.client.resolve_titles(missing).items()
+            }
+            self.store(fetched)
+            known.update(fetched)
+        return known
+
+
+def canonicalize(
+    aggregate: SemesterTopAggregate, resolver: TitleResolver, echo: Callable[[str], None] = print
+) -> Dict[str, int]:
+    """
+    Fusionne dans l'agrégat les titres qui mènent à la même page (redirections, variantes de casse) et retourne
+    {slug canonique: page_id}. Si l'API est injoignable, l'agrégat reste tel quel et rien n'est mis en cache.
+    """
+    try:
+        with span("resolve"):
+            resolved = resolver.resolve(aggregate.titles)
+    except httpx.HTTPError as exc:
+        echo(f"Résolution des redirections impossible ({exc.__class__.__name__}) : titres gardés tels quels.")
+        return {}
+    unresolved = len(aggregate.titles) - len(resolved)
+    if unresolved:
+        echo(f"{unresolved} titres non résolus (lots en échec) : gardés tels quels.")
+    aliases = {title: target[0] for title, target in resolved.items() if target and target[0] != title}
+    merged = aggregate.merge(aliases)
+    if merged:
+        echo(f"{merged} titres fusionnés avec leur page canonique (redirections).")
+    return {target[0]: target[1] for target in resolved.values() if target and target[1] is not None}
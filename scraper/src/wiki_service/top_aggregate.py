@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import calendar
+import codecs
+import json
+from datetime import date, timedelta
+from typing import Collection, Dict, Iterable, Iterator, List, Mapping, Optional
+
+import numpy as np
+
+from .periods import semester_dates
+from .series_codec import MISSING, encode_values
+
+# (year, month, day, article, views) ; day vaut "all-days" pour les tops mensuels.
+TopRecord = tuple[int, int, str, str, int]
+
+
+class SemesterTopAggregate:
+    """
+    Agrégat compact des tops d'un semestre.
+
+    Les titres sont internés (titre -> ligne) et chaque jour est un décalage entier depuis le début du semestre :
+    les vues tiennent dans une matrice int32 dense titres x jours. Un top mensuel ("all-days") est rangé sur le
+    premier jour du mois et couvre tous les jours du mois pour le calcul de la moyenne quotidienne.
+    """
+
+    def __init__(self, year: int, semester: str, initial_capacity: int = 1024) -> None:
+        self.year = year
+        self.semester = semester
+        self.start, self.end = semester_dates(year, semester)
+        self.n_days = (self.end - self.start).days + 1
+        self.titles: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._views = np.zeros((max(1, initial_capacity), self.n_days), dtype=np.int32)
+        # Nombre de jours couverts par chaque case (1 pour un top quotidien, taille du mois pour "all-days").
+        self._span = np.zeros(self.n_days, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def __contains__(self, title: str) -> bool:
+        return title in self._index
+
+    @property
+    def nbytes(self) -> int:
+        return self._views.nbytes + self._span.nbytes
+
+    def _row(self, title: str) -> int:
+        row = self._index.get(title)
+        if row is not None:
+            return row
+        row = len(self.titles)
+        if row == self._views.shape[0]:
+            grown = np.zeros((row * 2, self.n_days), dtype=np.int32)
+            grown[:row] = self._views
+            self._views = grown
+        self._index[title] = row
+        self.titles.append(title)
+        return row
+
+    def offset_for(self, year: int, month: int, day: str) -> tuple[int, int]:
+        """Retourne (décalage depuis le début du semestre, nombre de jours couverts)."""
+        if day == "all-days":
+            offset = (date(year, month, 1) - self.start).days
+            span = calendar.monthrange(year, month)[1]
+        else:
+            offset = (date(year, month, int(day)) - self.start).days
+            span = 1
+        if not 0 <= offset < self.n_days:
+            raise ValueError(f"{year}-{month:02d}-{day} hors du semestre {self.year}-{self.semester}.")
+        return offset, span
+
+    def add(self, title: str, offset: int, views: int, span: int = 1) -> None:
+        if views <= 0:
+            return
+        row = self._row(title)
+        self._views[row, offset] += views
+        self._span[offset] = span
+
+    def add_records(self, records: Iterable[TopRecord], ignored: Collection[str] = frozenset()) -> None:
+        cache: Dict[tuple[int, int, str], tuple[int, int]] = {}
+        for year, month, day, title, views in records:
+            if not title or title in ignored:
+                continue
+            key = (year, month, day)
+            if key not in cache:
+                cache[key] = self.offset_for(year, month, day)
+            offset, span = cache[key]
+            self.add(title, offset, views, span)
+
+    def merge(self, aliases: Mapping[str, str]) -> int:
+        """
+        Verse les lignes des titres alias dans celle de leur titre canonique (vues additionnées jour par jour, le
+        titre canonique est ajouté s'il manque) puis retire les alias. Retourne le nombre de lignes fusionnées.
+        """
+        moves = [(self._index[alias], target) for alias, target in aliases.items() if alias in self._index]
+        moves = [(row, target) for row, target in moves if target != self.titles[row]]
+        if not moves:
+            return 0
+        for row, target in moves:
+            target_row = self._row(target)  # peut agrandir la matrice : à calculer avant l'addition
+            self._views[target_row] += self._views[row]
+        keep = np.ones(len(self.titles), dtype=bool)
+        keep[[row for row, _ in moves]] = False
+        kept = np.flatnonzero(keep)
+        self._views = self._views[kept]
+        self.titles = [self.titles[row] for row in kept]
+        self._index = {title: row for row, title in enumerate(self.titles)}
+        return len(moves)
+
+    def _matrix(self) -> np.ndarray:
+        return self._views[: len(self.titles)]
+
+    def totals(self) -> np.ndarray:
+        return self._matrix().sum(axis=1, dtype=np.int64)
+
+    def covered_days(self) -> np.ndarray:
+        return (self._matrix() > 0).astype(np.int64) @ self._span.astype(np.int64)
+
+    def averages(self) -> np.ndarray:
+        return self.totals() / np.maximum(self.covered_days(), 1)
+
+    def indices(self, titles: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self._index[t] for t in titles), dtype=np.int64)
+
+    def top_indices(self, indices: Optional[np.ndarray] = None, limit: Optional[int] = None) -> np.ndarray:
+        """Indices triés par vues totales décroissantes (tri stable, à égalité l'ordre d'apparition est conservé)."""
+        totals = self.totals()
+        if indices is None:
+            indices = np.arange(len(self.titles))
+        order = np.argsort(-totals[indices], kind="stable")
+        ranked = indices[order]
+        return ranked if limit is None else ranked[:limit]
+
+    def series(self, index: int) -> List[dict]:
+        """Matérialise la série d'un seul titre au format historique [{"timestamp", "views"}]."""
+        row = self._views[index]
+        return [
+            {"timestamp": (self.start + timedelta(days=int(offset))).strftime("%Y%m%d00"), "views": int(row[offset])}
+            for offset in np.flatnonzero(row)
+        ]
+
+    def points(self, index: int) -> List[tuple[date, int, int]]:
+        """(jour, vues, jours couverts) des cases non nulles du titre : un top mensuel couvre tout son mois."""
+        row = self._views[index]
+        return [
+            (self.start + timedelta(days=int(offset)), int(row[offset]), int(self._span[offset]))
+            for offset in np.flatnonzero(row)
+        ]
+
+    def units(self) -> List[tuple[int, int, int, int]]:
+        """Tops présents dans l'agrégat : (année, mois, jour ou 0 pour un top mensuel, nombre d'articles)."""
+        counts = np.count_nonzero(self._matrix(), axis=0)
+        units = []
+        for offset in np.flatnonzero(self._span):
+            day = self.start + timedelta(days=int(offset))
+            units.append((day.year, day.month, 0 if self._span[offset] > 1 else day.day, int(counts[offset])))
+        return units
+
+    def stat(self, index: int) -> dict:
+        row = self._views[index]
+        total = int(row.sum(dtype=np.int64))
+        days = int(self._span[row > 0].sum())
+        return {
+            "views_total": total,
+            "views_avg_daily": total / max(days, 1),
+            "series": self.series(index),
+        }
+
+    def stat_row(self, index: int) -> dict:
+        """Stat prête à insérer, série encodée directement depuis la matrice (sans dicts par jour)."""
+        row = self._views[index]
+        offsets = np.flatnonzero(row)
+        total = int(row.sum(dtype=np.int64))
+        row_data: dict = {
+            "views_total": total,
+            "views_avg_daily": total / max(int(self._span[offsets].sum()), 1),
+            "series_start": None,
+            "series_data": None,
+        }
+        if len(offsets):
+            first, last = int(offsets[0]), int(offsets[-1])
+            values = row[first : last + 1].copy()
+            values[values == 0] = MISSING
+            row_data["series_start"] = self.start + timedelta(days=first)
+            row_data["series_data"] = encode_values(values)
+        return row_data
+
+    def to_dict(self) -> Dict[str, dict]:
+        return {title: self.stat(i) for i, title in enumerate(self.titles)}
+
+
+class TopListStreamParser:
+    """
+    Parseur incrémental des réponses `pageviews/top` : consomme le corps morceau par morceau et produit
+    les enregistrements (year, month, day, article, views) sans charger tout le JSON.
+
+    Les articles d'un item sont gardés jusqu'à la fin de l'item pour ne pas dépendre de l'ordre des clés.
+    """
+
+    def __init__(self, default_year: int, default_month: int) -> None:
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._defaults = {"year": default_year, "month": default_month}
+        self._header: dict = {}
+        self._pending: List[tuple[str, int]] = []
+
+    def feed(self, chunk: bytes, final: bool = False) -> Iterator[TopRecord]:
+        self._buf = self._buf[self._pos :] + self._decoder.decode(chunk, final)
+        self._pos = 0
+        yield from self._parse(final)
+
+    def close(self) -> Iterator[TopRecord]:
+        return self.feed(b"", final=True)
+
+    def _skip(self, chars: str = " \t\r\n,") -> Optional[str]:
+        buf, pos = self._buf, self._pos
+        while pos < len(buf) and buf[pos] in chars:
+            pos += 1
+        self._pos = pos
+        return buf[pos] if pos < len(buf) else None
+
+    def _value(self, final: bool):
+        """Décode une valeur JSON complète à la position courante, ou lève EOFError s'il manque des données."""
+        try:
+            value, end = self._json.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            raise EOFError
+        # Un nombre en fin de tampon peut être tronqué : on attend le caractère suivant.
+        if end >= len(self._buf) and not final:
+            raise EOFError
+        self._pos = end
+        return value
+
+    def _flush_item(self) -> Iterator[TopRecord]:
+        header = {**self._defaults, **self._header}
+        year, month = int(header["year"]), int(header["month"])
+        day = str(header.get("day") or "")
+        if day:
+            for title, views in self._pending:
+                yield year, month, day, title, views
+        self._header = {}
+        self._pending = []
+
+    def _parse(self, final: bool) -> Iterator[TopRecord]:
+        while True:
+            saved = self._pos
+            try:
+                if self._state == "start":
+                    idx = self._buf.find('"items"', self._pos)
+                    if idx < 0:
+                        self._pos = max(self._pos, len(self._buf) - 7)
+                        return
+                    self._pos = idx + len('"items"')
+                    if self._skip(" \t\r\n:") is None:
+                        raise EOFError
+                    self._pos += 1  # "["
+                    self._state = "items"
+                elif self._state == "items":
+                    char = self._skip()
+                    if char is None:
+                        return
+                    self._pos += 1
+                    self._state = "done" if char == "]" else "item"
+                elif self._state == "item":
+                    char = self._skip()
+                    if char is None:
+                        return
+                    if char == "}":
+                        self._pos += 1
+                        self._state = "items"
+                        yield from self._flush_item()
+                        continue
+                    key = self._value(final)
+                    if self._skip(" \t\r\n:") is None:
+                        raise EOFError
+                    if key == "articles":
+                        self._pos += 1  # "["
+                        self._state = "articles"
+                    else:
+                        self._header[key] = self._value(final)
+                elif self._state == "articles":
+                    char = self._skip()
+                    if char is None:
+                        return
+                    if char == "]":
+                        self._pos += 1
+                        self._state = "item"
+                        continue
+                    article = self._value(final)
+                    self._pending.append((article.get("article"), int(article.get("views", 0))))
+                else:
+                    return
+            except EOFError:
+                self._pos = saved
+                return
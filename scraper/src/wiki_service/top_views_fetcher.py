@@ -1,60 +1,165 @@
 from __future__ import annotations
 
-from collections import defaultdict
-from datetime import date
-from typing import Dict, List
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Dict, List, Sequence, Union
 
 import httpx
 
 from .config import get_settings
-
-IGNORED_ARTICLES = {"Main_Page", "Sp%C3%A9cial%3ARecherche", "Special:Search"}
+from .http_transport import run_async, shared_async_transport
+from .metrics import metered_async, span
+from .periods import months_for_semester
+from .titles import normalize_records
+from .top_aggregate import SemesterTopAggregate, TopListStreamParser
 
 
 class TopViewsFetcher:
     BASE_URL = "https://wikimedia.org/api/rest_v1/metrics/pageviews/top"
 
-    def __init__(self, project: str | None = None, user_agent: str | None = None) -> None:
+    def __init__(
+        self,
+        project: str | None = None,
+        user_agent: str | None = None,
+        max_concurrency: int | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
         settings = get_settings()
         self.project = project or settings.wikimedia_project
         self.user_agent = user_agent or settings.user_agent
-        self.client = httpx.Client(timeout=30, headers={"User-Agent": self.user_agent})
+        self.max_concurrency = max(1, max_concurrency or settings.top_fetch_concurrency)
+        self.transport = transport
 
     def _months_for_semester(self, semester: str) -> List[int]:
-        if semester not in ("S1", "S2"):
-            raise ValueError("Semester must be S1 or S2.")
-        return list(range(1, 7)) if semester == "S1" else list(range(7, 13))
+        return months_for_semester(semester)
 
-    def fetch_semester_top(self, year: int, semester: str) -> Dict[str, dict]:
-        months = self._months_for_semester(semester)
-        per_article_daily: dict[str, dict[str, int]] = defaultdict(dict)
+    def _month_url(self, year: int, month: int) -> str:
+        return f"{self.BASE_URL}/{self.project}/all-access/{year}/{month:02d}/all-days"
+
+    def _day_url(self, year: int, month: int, day: int) -> str:
+        return f"{self.BASE_URL}/{self.project}/all-access/{year}/{month:02d}/{day:02d}"
+
+    def _async_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=30,
+            headers={"User-Agent": self.user_agent},
+            transport=metered_async(self.transport or shared_async_transport(), "top"),
+        )
 
-        for month in months:
-            url = f"{self.BASE_URL}/{self.project}/all-access/{year}/{month:02d}/all-days"
-            resp = self.client.get(url)
+    async def _fetch_top(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        aggregate: SemesterTopAggregate,
+        year: int,
+        month: int,
+        day: int = 0,
+    ) -> bool:
+        """Verse le top mensuel (day = 0) ou quotidien dans l'agrégat ; False si l'API ne l'a pas (404)."""
+        parser = TopListStreamParser(default_year=year, default_month=month)
+        url = self._day_url(year, month, day) if day else self._month_url(year, month)
+        async with semaphore, client.stream("GET", url) as resp:
             if resp.status_code == 404:
-                # Données top non disponibles pour ce mois (souvent avant 2016). On saute.
-                continue
+                # Données top non disponibles (souvent avant 2016, ou pas encore publiées). On saute.
+                return False
             resp.raise_for_status()
-            payload = resp.json()
-            for item in payload.get("items", []):
-                day = item.get("day")  # e.g. "20240101"
-                if not day:
-                    continue
-                for article in item.get("articles", []):
-                    title = article.get("article")
-                    if not title or title in IGNORED_ARTICLES:
-                        continue
-                    views = int(article.get("views", 0))
-                    per_article_daily[title][day] = per_article_daily[title].get(day, 0) + views
-
-        aggregated: Dict[str, dict] = {}
-        for title, daily_map in per_article_daily.items():
-            total = sum(daily_map.values())
-            series = [{"timestamp": day, "views": views} for day, views in sorted(daily_map.items())]
-            aggregated[title] = {
-                "views_total": total,
-                "views_avg_daily": total / max(len(daily_map), 1),
-                "series": series,
-            }
-        return aggregated
+            # Le corps est parsé au fil de l'eau et versé directement dans l'agrégat, morceau par morceau.
+            chunks = resp.aiter_bytes()
+            while True:
+                with span("fetch"):
+                    chunk = await anext(chunks, None)
+                with span("parse"):
+                    records = list(parser.feed(chunk) if chunk is not None else parser.close())
+                with span("aggregate"):
+                    # Titres décodés, pages hors espace principal écartées (voir titles.normalize_title).
+                    aggregate.add_records(normalize_records(records))
+                if chunk is None:
+                    break
+        return True
+
+    async def _fetch_semester(
+        self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, year: int, semester: str
+    ) -> SemesterTopAggregate:
+        aggregate = SemesterTopAggregate(year, semester)
+        await asyncio.gather(
+            *(
+                self._fetch_top(client, semaphore, aggregate, year, month)
+                for month in self._months_for_semester(semester)
+            )
+        )
+        return aggregate
+
+    async def fetch_semester_aggregate_async(self, year: int, semester: str) -> SemesterTopAggregate:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._async_client() as client:
+            return await self._fetch_semester(client, semaphore, year, semester)
+
+    async def fetch_semesters_aggregate_async(
+        self, periods: Sequence[tuple[int, str]]
+    ) -> Dict[tuple[int, str], SemesterTopAggregate]:
+        """Télécharge plusieurs semestres en parallèle, avec un plafond global de requêtes simultanées."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._async_client() as client:
+            results = await asyncio.gather(
+                *(self._fetch_semester(client, semaphore, year, sem) for year, sem in periods)
+            )
+        return {tuple(period): result for period, result in zip(periods, results)}
+
+    async def iter_semesters_aggregate_async(
+        self, periods: Sequence[tuple[int, str]], max_in_flight: int | None = None
+    ) -> AsyncIterator[tuple[tuple[int, str], Union[SemesterTopAggregate, Exception]]]:
+        """
+        Produit (période, agrégat) dans l'ordre des périodes, avec au plus max_in_flight semestres en cours.
+
+        Tant que le consommateur n'a pas repris l'itération, aucun nouveau semestre n'est lancé : la mémoire
+        reste bornée. Une période en échec est produite avec son exception au lieu d'interrompre les autres.
+        """
+        in_flight = max(1, max_in_flight or get_settings().top_fetch_semesters)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        pending = deque(tuple(period) for period in periods)
+        tasks: deque = deque()
+        async with self._async_client() as client:
+            try:
+                while pending or tasks:
+                    while pending and len(tasks) < in_flight:
+                        period = pending.popleft()
+                        task = asyncio.create_task(self._fetch_semester(client, semaphore, *period))
+                        tasks.append((period, task))
+                    period, task = tasks.popleft()
+                    try:
+                        result: Union[SemesterTopAggregate, Exception] = await task
+                    except Exception as exc:  # noqa: BLE001
+                        result = exc
+                    yield period, result
+            finally:
+                for _, task in tasks:
+                    task.cancel()
+
+    async def fetch_units_aggregate_async(
+        self, year: int, semester: str, units: Sequence[tuple[int, int, int]]
+    ) -> tuple[SemesterTopAggregate, List[tuple[int, int, int]]]:
+        """Agrège seulement les tops demandés (année, mois, jour ou 0) ; renvoie aussi ceux réellement publiés."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        aggregate = SemesterTopAggregate(year, semester)
+        async with self._async_client() as client:
+            found = await asyncio.gather(
+                *(self._fetch_top(client, semaphore, aggregate, *unit) for unit in units)
+            )
+        return aggregate, [tuple(unit) for unit, ok in zip(units, found) if ok]
+
+    def fetch_units_aggregate(
+        self, year: int, semester: str, units: Sequence[tuple[int, int, int]]
+    ) -> tuple[SemesterTopAggregate, List[tuple[int, int, int]]]:
+        return run_async(self.fetch_units_aggregate_async(year, semester, units))
+
+    def fetch_semester_aggregate(self, year: int, semester: str) -> SemesterTopAggregate:
+        return run_async(self.fetch_semester_aggregate_async(year, semester))
+
+    def fetch_semesters_aggregate(
+        self, periods: Sequence[tuple[int, str]]
+    ) -> Dict[tuple[int, str], SemesterTopAggregate]:
+        return run_async(self.fetch_semesters_aggregate_async(periods))
+
+    def fetch_semester_top(self, year: int, semester: str) -> Dict[str, dict]:
+        """Forme historique {titre: {views_total, views_avg_daily, series}} ; matérialise tous les titres."""
+        return self.fetch_semester_aggregate(year, semester).to_dict()
@@ -1,17 +1,59 @@
 from __future__ import annotations
 
-from typing import Any, Optional
+import asyncio
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence
 from urllib.parse import quote
 
 import httpx
 
 from .config import get_settings
+from .http_transport import run_async, shared_async_transport, shared_transport
+from .metrics import metered, metered_async
+
+
+class BatchResults(dict):
+    """
+    Résultats fusionnés des requêtes groupées. Un lot en échec (5xx après retries, réponse illisible)
+    n'emporte pas les autres : ses titres sont listés dans `failed` (à redemander plus tard), le type d'erreur
+    dans `errors`.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.failed: List[str] = []
+        self.errors: Counter = Counter()
+
+    @classmethod
+    def merge(cls, batches: Sequence[List[str]], results: Sequence[Any]) -> "BatchResults":
+        merged = cls()
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                merged.failed.extend(batch)
+                merged.errors[result.__class__.__name__] += 1
+            elif isinstance(result, BaseException):
+                raise result  # annulation, KeyboardInterrupt
+            else:
+                merged.update(result)
+        return merged
 
 
 class WikiPageClient:
     SUMMARY_URL = "https://{project}/api/rest_v1/page/summary/{title}"
+    API_URL = "https://{project}/w/api.php"
+    # TextExtracts plafonne exlimit à 20 titres par requête quand les extraits sont demandés.
+    MAX_TITLES_PER_QUERY = 20
+    # Sans extraits, action=query accepte 50 titres par requête (500 pour les comptes bots).
+    MAX_TITLES_PER_RESOLVE = 50
 
-    def __init__(self, project: str | None = None, user_agent: str | None = None) -> None:
+    def __init__(
+        self,
+        project: str | None = None,
+        user_agent: str | None = None,
+        api_url: str | None = None,
+        transport: httpx.BaseTransport | None = None,
+        async_transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
         settings = get_settings()
         raw_project = project or settings.wikimedia_project
         if raw_project.endswith(".org"):
@@ -19,7 +61,21 @@ class WikiPageClient:
         else:
             self.project = f"{raw_project}.org"
         self.user_agent = user_agent or settings.user_agent
-        self.client = httpx.Client(timeout=15, headers={"User-Agent": self.user_agent})
+        # Surcharge possible pour pointer vers un serveur local de substitution (WIKI_API_URL, modèle par projet).
+        self.api_url = (api_url or settings.wiki_api_url or self.API_URL).format(project=self.project)
+        self._async_transport = async_transport
+        self.client = httpx.Client(
+            timeout=15, headers={"User-Agent": self.user_agent}, transport=metered(transport or shared_transport(), "pages")
+        )
+
+    def close(self) -> None:
+        self.client.close()
+
+    def __enter__(self) -> "WikiPageClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
     def fetch_summary(self, slug: str) -> Optional[dict[str, Any]]:
         encoded = quote(slug.replace(" ", "_"))
@@ -34,3 +90,145 @@ class WikiPageClient:
             "summary": data.get("extract"),
             "image_url": data.get("thumbnail", {}).get("source"),
         }
+
+    def _async_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=30,
+            headers={"User-Agent": self.user_agent},
+            transport=metered_async(self._async_transport or shared_async_transport(), "pages"),
+        )
+
+    def _query_params(self, titles: List[str]) -> dict[str, str]:
+        return {
+            "action": "query",
+            "format": "json",
+            "formatversion": "2",
+            "redirects": "1",
+            "prop": "extracts|pageimages",
+            "exintro": "1",
+            "explaintext": "1",
+            "exlimit": "max",
+            "piprop": "thumbnail",
+            "pithumbsize": "320",
+            "pilimit": "max",
+            "titles": "|".join(titles),
+        }
+
+    async def fetch_summaries_batch_async(
+        self, client: httpx.AsyncClient, titles: List[str]
+    ) -> Dict[str, dict[str, Any]]:
+        """
+        Métadonnées de plusieurs titres en une requête `action=query` (extracts + pageimages).
+
+        Retourne {titre demandé: {title, page_id, summary, image_url}} ; les pages absentes sont omises.
+        """
+        params = self._query_params(titles)
+        aliases: Dict[str, str] = {}
+        pages: Dict[str, dict] = {}
+        while True:
+            resp = await client.get(self.api_url, params=params)
+            resp.raise_for_status()
+            payload = resp.json()
+            query = payload.get("query", {})
+            for entry in query.get("normalized", []) + query.get("redirects", []):
+                aliases[entry["from"]] = entry["to"]
+            for page in query.get("pages", []):
+                if page.get("missing") or page.get("invalid"):
+                    continue
+                merged = pages.setdefault(page["title"], {})
+                for key, value in page.items():
+                    merged.setdefault(key, value)
+            if "continue" not in payload:
+                break
+            # Les extraits peuvent être paginés : on relance avec les jetons de continuation.
+            params = {**self._query_params(titles), **payload["continue"]}
+
+        results: Dict[str, dict[str, Any]] = {}
+        for title in titles:
+            page = pages.get(self._follow(aliases, title))
+            if not page:
+                continue
+            results[title] = {
+                "title": page.get("title"),
+                "page_id": page.get("pageid"),
+                "summary": page.get("extract") or None,
+                "image_url": page.get("thumbnail", {}).get("source"),
+            }
+        return results
+
+    @staticmethod
+    def _follow(aliases: Dict[str, str], title: str) -> str:
+        """Titre final d'une chaîne normalisation / redirections (le titre demandé peut contenir des "_")."""
+        resolved = title if title in aliases else title.replace("_", " ")
+        seen = set()
+        while resolved in aliases and resolved not in seen:
+            seen.add(resolved)
+            resolved = aliases[resolved]
+        return resolved
+
+    async def resolve_titles_batch_async(
+        self, client: httpx.AsyncClient, titles: List[str]
+    ) -> Dict[str, Optional[tuple[str, int]]]:
+        """
+        Cible des redirections de plusieurs titres en une requête `action=query&redirects=1` (sans extraits).
+
+        Retourne {titre demandé: (titre canonique, page_id)}, ou None pour une page absente ou un titre invalide.
+        """
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": "2",
+            "redirects": "1",
+            "titles": "|".join(titles),
+        }
+        resp = await client.get(self.api_url, params=params)
+        resp.raise_for_status()
+        query = resp.json().get("query", {})
+        aliases = {entry["from"]: entry["to"] for entry in query.get("normalized", []) + query.get("redirects", [])}
+        pages = {
+            page["title"]: page["pageid"]
+            for page in query.get("pages", [])
+            if not (page.get("missing") or page.get("invalid")) and "pageid" in page
+        }
+        results: Dict[str, Optional[tuple[str, int]]] = {}
+        for title in titles:
+            canonical = self._follow(aliases, title)
+            results[title] = (canonical, pages[canonical]) if canonical in pages else None
+        return results
+
+    async def resolve_titles_async(self, titles: Iterable[str], max_concurrency: int | None = None) -> BatchResults:
+        """{titre: (titre canonique, page_id) ou None} ; les titres des lots en échec sont dans `failed`."""
+        titles = list(dict.fromkeys(titles))
+        size = self.MAX_TITLES_PER_RESOLVE
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or get_settings().metadata_concurrency))
+        batches = [titles[i : i + size] for i in range(0, len(titles), size)]
+
+        async with self._async_client() as client:
+
+            async def run(batch: List[str]) -> Dict[str, Optional[tuple[str, int]]]:
+                async with semaphore:
+                    return await self.resolve_titles_batch_async(client, batch)
+
+            results = await asyncio.gather(*(run(batch) for batch in batches), return_exceptions=True)
+        return BatchResults.merge(batches, results)
+
+    def resolve_titles(self, titles: Iterable[str], max_concurrency: int | None = None) -> BatchResults:
+        return run_async(self.resolve_titles_async(titles, max_concurrency))
+
+    async def fetch_summaries_async(self, titles: Iterable[str], max_concurrency: int | None = None) -> BatchResults:
+        """{titre: métadonnées} ; pages absentes omises, titres des lots en échec dans `failed`."""
+        titles = list(dict.fromkeys(titles))
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or get_settings().metadata_concurrency))
+        batches = [titles[i : i + self.MAX_TITLES_PER_QUERY] for i in range(0, len(titles), self.MAX_TITLES_PER_QUERY)]
+
+        async with self._async_client() as client:
+
+            async def run(batch: List[str]) -> Dict[str, dict[str, Any]]:
+                async with semaphore:
+                    return await self.fetch_summaries_batch_async(client, batch)
+
+            results = await asyncio.gather(*(run(batch) for batch in batches), return_exceptions=True)
+        return BatchResults.merge(batches, results)
+
+    def fetch_summaries(self, titles: Iterable[str], max_concurrency: int | None = None) -> BatchResults:
+        return run_async(self.fetch_summaries_async(titles, max_concurrency))
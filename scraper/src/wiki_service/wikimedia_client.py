@@ -7,20 +7,39 @@ import httpx
 from urllib.parse import quote
 
 from .config import get_settings
+from .periods import chunk_ranges
+from .http_transport import shared_transport
+from .metrics import metered, span
 
 
 class WikimediaClient:
     BASE_URL = "https://wikimedia.org/api/rest_v1/metrics/pageviews/per-article"
 
-    def __init__(self, project: str | None = None, user_agent: str | None = None) -> None:
+    def __init__(
+        self,
+        project: str | None = None,
+        user_agent: str | None = None,
+        transport: httpx.BaseTransport | None = None,
+    ) -> None:
         settings = get_settings()
         self.project = project or settings.wikimedia_project
         self.user_agent = user_agent or settings.user_agent
+        # Par défaut le transport du process : connexions réutilisées par tous les clients.
         self._client = httpx.Client(
             timeout=20,
             headers={"User-Agent": self.user_agent},
+            transport=metered(transport or shared_transport(), "wikimedia"),
         )
 
+    def close(self) -> None:
+        self._client.close()
+
+    def __enter__(self) -> "WikimediaClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
     def _format_date(self, d: date) -> str:
         return d.strftime("%Y%m%d")
 
@@ -29,14 +48,30 @@ class WikimediaClient:
         start_str = self._format_date(start)
         end_str = self._format_date(end)
         url = f"{self.BASE_URL}/{self.project}/all-access/user/{encoded}/daily/{start_str}/{end_str}"
-        resp = self._client.get(url)
-        resp.raise_for_status()
-        payload = resp.json()
-        items = payload.get("items", [])
-        return [
-            {
-                "timestamp": item.get("timestamp"),
-                "views": int(item.get("views", 0)),
-            }
-            for item in items
-        ]
+        with span("fetch"):
+            resp = self._client.get(url)
+            resp.raise_for_status()
+        with span("parse"):
+            payload = resp.json()
+            items = payload.get("items", [])
+            return [
+                {
+                    "timestamp": item.get("timestamp"),
+                    "views": int(item.get("views", 0)),
+                }
+                for item in items
+            ]
+
+    def fetch_history(self, article_slug: str, start: date, end: date, chunk_days: int | None = None) -> List[dict]:
+        """
+        Série quotidienne complète sur [start, end] : une requête par tranche de `chunk_days` jours
+        (une seule en pratique). Une tranche en 404 (article inexistant à cette époque) est vide.
+        """
+        items: List[dict] = []
+        for chunk_start, chunk_end in chunk_ranges(start, end, chunk_days or get_settings().history_chunk_days):
+            try:
+                items.extend(self.fetch_daily_views(article_slug, chunk_start, chunk_end))
+            except httpx.HTTPStatusError as exc:
+                if exc.response.status_code != 404:
+                    raise
+        return items
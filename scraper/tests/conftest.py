@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+# Base SQLite jetable, fixée avant la première lecture de la configuration.
+os.environ["WIKI_DB_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='wiki-tests-')}/tests.db"
+os.environ.setdefault("WIKI_HTTP_CACHE", "false")
+
+
+@pytest.fixture
+def database():
+    from wiki_service.db import Base, get_engine
+    from wiki_service.partitions import create_schema
+
+    engine = get_engine()
+    with engine.begin() as conn:
+        create_schema(conn, ["fr.wikipedia"])
+    yield engine
+    Base.metadata.drop_all(engine)
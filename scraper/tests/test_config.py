@@ -0,0 +1,15 @@
+from wiki_service.config import Settings
+
+
+def test_prefixed_variables_are_read(monkeypatch):
+    monkeypatch.setenv("WIKI_HTTP_CACHE", "false")
+    monkeypatch.setenv("WIKI_HTTP_RATE_LIMIT", "7.5")
+    monkeypatch.setenv("WIKI_PROJECT", "en.wikipedia")
+    settings = Settings()
+    assert settings.http_cache_enabled is False
+    assert settings.http_rate_limit == 7.5
+    assert settings.wikimedia_project == "en.wikipedia"
+
+
+def test_conftest_disables_http_cache():
+    assert Settings().http_cache_enabled is False
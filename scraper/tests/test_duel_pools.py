@@ -0,0 +1,72 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import update
+
+from wiki_service import duel_pools
+from wiki_service.db import get_session
+from wiki_service.models import Article, ArticleSemesterStat, ArticleTheme, DuelPool, Theme
+
+
+def seed_theme(articles: int = 12) -> None:
+    with get_session() as session:
+        theme = Theme(name="Sport")
+        session.add(theme)
+        for i in range(articles):
+            article = Article(project="fr.wikipedia", slug=f"Page_{i}", title=f"Page {i}")
+            session.add(article)
+            session.flush()
+            session.add(ArticleTheme(article_id=article.id, theme_id=theme.id))
+            session.add(
+                ArticleSemesterStat(
+                    project="fr.wikipedia",
+                    article_id=article.id,
+                    year=2024,
+                    semester="S1",
+                    views_total=1000 * (i + 1),
+                    views_avg_daily=10.0 * (i + 1),
+                )
+            )
+
+
+def generate(seed: int):
+    with get_session() as session:
+        return duel_pools.generate_duel_pools(
+            session, ["Sport"], [(2024, "S1")], per_period=2, seed=seed, project="fr.wikipedia"
+        )
+
+
+def test_conflicting_pools_are_not_counted(database, monkeypatch):
+    seed_theme()
+    assert generate(seed=1).created == 2
+    with get_session() as session:
+        session.execute(update(DuelPool).values(claimed_at=datetime.now(timezone.utc)))
+
+    # Génération concurrente simulée : les pools existants ne sont pas vus au tirage, l'insertion les écarte.
+    monkeypatch.setattr(duel_pools, "existing_card_keys", lambda *args, **kwargs: defaultdict(set))
+    report = generate(seed=1)
+    assert (report.created, report.periods) == (0, 0)
+    with get_session() as session:
+        assert session.query(DuelPool).count() == 2
+
+
+def test_card_key_ignores_order():
+    assert duel_pools.card_key([3, 1, 2]) == duel_pools.card_key([1, 2, 3])
+    assert duel_pools.card_key([1, 2, 3]) != duel_pools.card_key([1, 2, 4])
+
+
+def test_draw_pools_returns_distinct_pools_outside_known():
+    cards = [{"article_id": i, "views_avg_daily": float(i)} for i in range(1, 13)]
+    known = {duel_pools.card_key(range(1, 11))}
+    pools = duel_pools.draw_pools(cards, 5, known, np.random.default_rng(0))
+    assert len(pools) == 5
+    keys = set()
+    for pool in pools:
+        ids = [card["article_id"] for card in pool]
+        assert len(set(ids)) == len(ids) == duel_pools.DUEL_POOL_SIZE
+        assert [card["position"] for card in pool] == list(range(1, duel_pools.DUEL_POOL_SIZE + 1))
+        keys.add(duel_pools.card_key(ids))
+    assert len(keys) == 5 and not keys & known
+
+    assert duel_pools.draw_pools(cards[:9], 5, set(), np.random.default_rng(0)) == []
@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+import httpx
+
+from wiki_service.db import get_session
+from wiki_service.history import backfill_stats
+from wiki_service.models import Article, ArticleSemesterStat, EmptySemester
+from wiki_service.wikimedia_client import WikimediaClient
+
+# L'article n'a de vues qu'à partir de 2023 : les semestres 2021-2022 restent vides.
+FIRST_DAY = date(2023, 1, 1)
+PERIODS = [(year, semester) for year in (2021, 2022, 2023) for semester in ("S1", "S2")]
+
+
+class CountingHistory:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        start, end = (date(int(p[:4]), int(p[4:6]), int(p[6:8])) for p in request.url.path.split("/")[-2:])
+        day, items = max(start, FIRST_DAY), []
+        while day <= end:
+            items.append({"timestamp": day.strftime("%Y%m%d00"), "views": 10})
+            day += timedelta(days=1)
+        return httpx.Response(200, json={"items": items})
+
+
+def add_article() -> tuple[int, str]:
+    with get_session() as session:
+        article = Article(project="fr.wikipedia", slug="Exemple", title="Exemple")
+        session.add(article)
+        session.flush()
+        return article.id, article.slug
+
+
+def test_second_backfill_makes_no_request(database):
+    articles = [add_article()]
+    history = CountingHistory()
+    client = WikimediaClient(project="fr.wikipedia", transport=httpx.MockTransport(history))
+
+    first = backfill_stats(articles, PERIODS, client=client, project="fr.wikipedia", echo=lambda _: None)
+    assert history.calls > 0
+    assert first.stats_written == 2
+    assert first.empty == first.empty_recorded == 4
+
+    calls = history.calls
+    second = backfill_stats(articles, PERIODS, client=client, project="fr.wikipedia", echo=lambda _: None)
+    assert history.calls == calls
+    assert second.requests == 0 and second.articles == 0
+
+    with get_session() as session:
+        assert session.query(ArticleSemesterStat).count() == 2
+        assert session.query(EmptySemester).count() == 4
+
+
+def test_refresh_rechecks_empty_semesters(database):
+    articles = [add_article()]
+    history = CountingHistory()
+    client = WikimediaClient(project="fr.wikipedia", transport=httpx.MockTransport(history))
+
+    backfill_stats(articles, PERIODS, client=client, project="fr.wikipedia", echo=lambda _: None)
+    calls = history.calls
+    report = backfill_stats(articles, PERIODS, client=client, refresh=True, project="fr.wikipedia", echo=lambda _: None)
+    assert history.calls > calls
+    assert report.empty_recorded == 4
@@ -0,0 +1,128 @@
+import asyncio
+
+import httpx
+
+from wiki_service.http_scheduler import AsyncScheduledTransport, RequestScheduler, ScheduledTransport
+
+
+def make_scheduler(max_concurrency: int = 2) -> RequestScheduler:
+    return RequestScheduler(
+        rate=1000.0,
+        burst=1000,
+        max_concurrency=max_concurrency,
+        retries=0,
+        backoff_base=0.0,
+        backoff_max=0.0,
+        failure_threshold=10,
+        cooldown=30.0,
+    )
+
+
+class HangingTransport(httpx.AsyncBaseTransport):
+    """Ne répond qu'après `release` : les requêtes en cours peuvent être annulées."""
+
+    def __init__(self) -> None:
+        self.release = asyncio.Event()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await self.release.wait()
+        return httpx.Response(200, json={"ok": True}, request=request)
+
+
+def test_cancelled_requests_release_their_slot():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=2)
+        inner = HangingTransport()
+        async with httpx.AsyncClient(transport=AsyncScheduledTransport(scheduler, inner)) as client:
+            tasks = [asyncio.create_task(client.get("https://example.org/a")) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            host = scheduler.host("example.org")
+            assert host._in_flight == 2
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            assert host._in_flight == 0
+
+            inner.release.set()
+            response = await asyncio.wait_for(client.get("https://example.org/b"), timeout=2)
+            assert response.status_code == 200
+        assert host._in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_unexpected_error_releases_slot():
+    class Exploding(httpx.BaseTransport):
+        def handle_request(self, request: httpx.Request) -> httpx.Response:
+            raise KeyboardInterrupt
+
+    scheduler = make_scheduler(max_concurrency=1)
+    client = httpx.Client(transport=ScheduledTransport(scheduler, Exploding()))
+    for _ in range(3):
+        try:
+            client.get("https://example.org/")
+        except KeyboardInterrupt:
+            pass
+    assert scheduler.host("example.org")._in_flight == 0
+
+
+def test_response_body_close_releases_slot():
+    scheduler = make_scheduler(max_concurrency=1)
+    transport = ScheduledTransport(scheduler, httpx.MockTransport(lambda request: httpx.Response(200, text="ok")))
+    with httpx.Client(transport=transport) as client:
+        for _ in range(3):
+            assert client.get("https://example.org/").text == "ok"
+    assert scheduler.host("example.org")._in_flight == 0
+
+
+def test_cancelled_probe_rearms_circuit():
+    class FlakyThenHanging(httpx.AsyncBaseTransport):
+        """Première requête en erreur réseau (ouvre le disjoncteur), puis réponses après `release`."""
+
+        def __init__(self) -> None:
+            self.calls = 0
+            self.release = asyncio.Event()
+
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            self.calls += 1
+            if self.calls == 1:
+                raise httpx.ConnectError("boom", request=request)
+            await self.release.wait()
+            return httpx.Response(200, request=request)
+
+    async def scenario():
+        scheduler = RequestScheduler(
+            rate=1000.0,
+            burst=1000,
+            max_concurrency=2,
+            retries=0,
+            backoff_base=0.0,
+            backoff_max=0.0,
+            failure_threshold=1,
+            cooldown=0.05,
+        )
+        inner = FlakyThenHanging()
+        async with httpx.AsyncClient(transport=AsyncScheduledTransport(scheduler, inner)) as client:
+            try:
+                await client.get("https://example.org/")
+            except httpx.ConnectError:
+                pass
+            host = scheduler.host("example.org")
+            assert host._open_until
+
+            await asyncio.sleep(0.06)
+            probe = asyncio.create_task(client.get("https://example.org/probe"))
+            await asyncio.sleep(0.02)
+            assert host._probing
+            probe.cancel()
+            await asyncio.gather(probe, return_exceptions=True)
+            assert not host._probing and host._in_flight == 0 and host._open_until
+
+            # Après un nouveau cooldown, un autre essai passe et referme le disjoncteur.
+            await asyncio.sleep(0.06)
+            inner.release.set()
+            response = await asyncio.wait_for(client.get("https://example.org/again"), timeout=2)
+            assert response.status_code == 200
+            assert not host._open_until and not host._probing
+
+    asyncio.run(scenario())
@@ -0,0 +1,63 @@
+import numpy as np
+
+from wiki_service.question_bank import (
+    ARTICLES_PER_QUESTION,
+    DIFFICULTIES,
+    CandidatePool,
+    allocate,
+    score_candidates,
+    select_quartets,
+)
+
+
+def make_pool(count: int = 40, used: set[int] = frozenset()) -> CandidatePool:
+    # Vues croissantes d'un facteur 1.2 (ln 1.2 ≈ 0.18) : un, deux ou quatre pas couvrent les trois paliers.
+    rows = [(i + 1, int(181 * 100 * 1.2**i), 100 * 1.2**i) for i in range(count)]
+    return CandidatePool.from_rows(rows, set(used))
+
+
+def test_allocate_uses_largest_remainders():
+    assert allocate(8, {"easy": 1, "medium": 2, "hard": 1}) == {"easy": 2, "medium": 4, "hard": 2}
+    # 10 * (1/4, 2/4, 1/4) = 2.5, 5, 2.5 : un seul reste à distribuer, au premier plus fort reste.
+    assert allocate(10, {"easy": 1, "medium": 2, "hard": 1}) == {"easy": 3, "medium": 5, "hard": 2}
+    # 7 * (1/3, 1/3, 1/3) : les quotas somment toujours au total demandé.
+    assert sum(allocate(7, {"easy": 1, "medium": 1, "hard": 1}).values()) == 7
+    assert allocate(5, {"easy": 0, "hard": 0}) == {"easy": 0, "hard": 0}
+
+
+def test_score_candidates_has_no_repeated_article_and_minimal_gaps():
+    log_views = make_pool().log_views
+    quartets, gaps = score_candidates(log_views, 500, np.random.default_rng(0))
+    assert quartets.shape[1] == ARTICLES_PER_QUESTION and len(quartets) == len(gaps) > 0
+    assert all(len(set(quartet.tolist())) == ARTICLES_PER_QUESTION for quartet in quartets)
+    assert np.allclose(gaps, np.diff(log_views[quartets], axis=1).min(axis=1))
+
+    empty, no_gaps = score_candidates(log_views[:3], 10, np.random.default_rng(0))
+    assert empty.shape == (0, ARTICLES_PER_QUESTION) and len(no_gaps) == 0
+
+
+def test_select_quartets_respects_buckets_and_period_reuse():
+    pool = make_pool(used={1, 2})
+    chosen = select_quartets(pool, {"easy": 2, "medium": 2, "hard": 2}, 2000, np.random.default_rng(0))
+    assert sorted(label for label, _, _ in chosen) == ["easy", "easy", "hard", "hard", "medium", "medium"]
+
+    bounds = {label: (low, high) for label, low, high in DIFFICULTIES}
+    seen: set[int] = set()
+    for label, quartet, gap in chosen:
+        low, high = bounds[label]
+        assert low <= gap < high
+        assert np.isclose(gap, np.diff(pool.log_views[quartet]).min())
+        ids = set(pool.article_ids[quartet].tolist())
+        assert len(ids) == ARTICLES_PER_QUESTION
+        assert not ids & seen and not ids & {1, 2}
+        seen |= ids
+    assert pool.used.sum() == 2  # le pool n'est pas modifié
+
+
+def test_select_quartets_is_deterministic_for_a_seed():
+    quotas = {"easy": 1, "medium": 2, "hard": 1}
+    first = select_quartets(make_pool(), quotas, 500, np.random.default_rng(7))
+    second = select_quartets(make_pool(), quotas, 500, np.random.default_rng(7))
+    assert [(label, quartet.tolist()) for label, quartet, _ in first] == [
+        (label, quartet.tolist()) for label, quartet, _ in second
+    ]
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+from wiki_service.db import get_session
+from wiki_service.models import Article, ArticleSemesterStat
+from wiki_service.question_builder import upsert_semester_stat_from_series
+
+
+def daily(start: date, days: int, views: int = 10) -> list[dict]:
+    return [{"timestamp": (start + timedelta(days=i)).strftime("%Y%m%d00"), "views": views} for i in range(days)]
+
+
+def add_stat(session, series: list[dict], views_total: int, views_avg_daily: float) -> Article:
+    article = Article(project="fr.wikipedia", slug="Exemple", title="Exemple")
+    session.add(article)
+    stat = ArticleSemesterStat(
+        project="fr.wikipedia",
+        article=article,
+        year=2024,
+        semester="S1",
+        views_total=views_total,
+        views_avg_daily=views_avg_daily,
+    )
+    stat.set_series(series)
+    session.add(stat)
+    session.flush()
+    return article
+
+
+def test_monthly_stat_is_not_extended_with_days_of_the_same_month(database):
+    with get_session() as session:
+        # Top mensuel de janvier : un point au 1er portant les 31 jours.
+        article = add_stat(session, [{"timestamp": "2024010100", "views": 310}], 310, 10.0)
+        stat = upsert_semester_stat_from_series(session, article, 2024, "S1", daily(date(2024, 1, 1), 45))
+        assert (stat.views_total, stat.views_avg_daily) == (310, 10.0)
+
+
+def test_daily_stat_receives_new_days(database):
+    with get_session() as session:
+        article = add_stat(session, daily(date(2024, 1, 1), 10), 100, 10.0)
+        stat = upsert_semester_stat_from_series(session, article, 2024, "S1", daily(date(2024, 1, 1), 15, views=20))
+        assert stat.views_total == 100 + 5 * 20
+        assert stat.views_avg_daily == 200 / 15
@@ -0,0 +1,50 @@
+import asyncio
+
+from wiki_service.question_server import QuestionIndex, QuestionServer
+
+
+def make_server() -> QuestionServer:
+    index = QuestionIndex("fr.wikipedia")
+    index.put(
+        {
+            "question_id": 1,
+            "theme": "Sport",
+            "year": 2024,
+            "semester": "S1",
+            "articles": [{"title": "Exemple"}],
+            "correct_order": ["Exemple"],
+        }
+    )
+    return QuestionServer(index, reload_interval=60, full_reload_interval=600, echo=lambda _: None)
+
+
+async def exchange(server: QuestionServer, request: bytes) -> tuple[str, bytes]:
+    """Envoie une requête brute et lit la réponse jusqu'à la fermeture de la connexion."""
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    async with listener:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout=2)
+        writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return head.decode(), body
+
+
+def test_malformed_content_length_is_rejected():
+    for value in (b"abc", b"-1", b"1.5"):
+        head, body = asyncio.run(
+            exchange(make_server(), b"GET /health HTTP/1.1\r\nContent-Length: " + value + b"\r\n\r\n")
+        )
+        assert head.startswith("HTTP/1.1 400"), value
+        assert b"Content-Length" in body
+
+
+def test_head_advertises_get_content_length():
+    request = "{} /question?theme=Sport HTTP/1.1\r\nConnection: close\r\n\r\n"
+    get_head, get_body = asyncio.run(exchange(make_server(), request.format("GET").encode()))
+    head_head, head_body = asyncio.run(exchange(make_server(), request.format("HEAD").encode()))
+    assert head_body == b""
+    assert f"Content-Length: {len(get_body)}" in get_head
+    assert f"Content-Length: {len(get_body)}" in head_head
@@ -0,0 +1,72 @@
+import httpx
+
+from wiki_service import wiki_page_client
+from wiki_service.wiki_page_client import WikiPageClient
+
+
+def test_api_url_template_is_per_project(monkeypatch):
+    monkeypatch.setattr(
+        wiki_page_client.get_settings(), "wiki_api_url", "http://localhost:8000/{project}/w/api.php"
+    )
+    transport = httpx.MockTransport(lambda request: httpx.Response(200))
+    fr = WikiPageClient(project="fr.wikipedia", transport=transport)
+    en = WikiPageClient(project="en.wikipedia", transport=transport)
+    assert fr.api_url == "http://localhost:8000/fr.wikipedia.org/w/api.php"
+    assert en.api_url == "http://localhost:8000/en.wikipedia.org/w/api.php"
+
+
+def test_default_api_url():
+    client = WikiPageClient(project="de.wikipedia", transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+    assert client.api_url == "https://de.wikipedia.org/w/api.php"
+
+
+def query_handler(failing: str):
+    """api.php simulé : le lot contenant `failing` répond 500, les autres renvoient une page par titre."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        titles = request.url.params["titles"].split("|")
+        if failing in titles:
+            return httpx.Response(500)
+        pages = [
+            {"title": title, "pageid": index, "extract": f"À propos de {title}"} for index, title in enumerate(titles)
+        ]
+        return httpx.Response(200, json={"query": {"pages": pages}})
+
+    return handler
+
+
+def test_failed_batch_does_not_discard_the_others():
+    titles = [f"Page {i}" for i in range(45)]  # 3 lots de 20 titres au plus
+    client = WikiPageClient(
+        project="fr.wikipedia",
+        transport=httpx.MockTransport(lambda request: httpx.Response(200)),
+        async_transport=httpx.MockTransport(query_handler("Page 25")),
+    )
+    fetched = client.fetch_summaries(titles)
+    assert fetched.failed == titles[20:40]
+    assert sorted(fetched) == sorted(titles[:20] + titles[40:])
+    assert fetched.errors == {"HTTPStatusError": 1}
+
+    resolved = client.resolve_titles(titles)  # lots de 50 : un seul, en échec
+    assert resolved.failed == titles and not resolved
+
+
+def test_enrichment_leaves_failed_articles_unchecked(database):
+    from wiki_service.db import get_session
+    from wiki_service.metadata_enricher import articles_missing_metadata, enrich_articles
+    from wiki_service.models import Article
+
+    with get_session() as session:
+        session.add_all(Article(project="fr.wikipedia", slug=f"Page {i}", title=f"Page {i}") for i in range(45))
+    client = WikiPageClient(
+        project="fr.wikipedia",
+        transport=httpx.MockTransport(lambda request: httpx.Response(200)),
+        async_transport=httpx.MockTransport(query_handler("Page 5")),
+    )
+    with get_session() as session:
+        articles = articles_missing_metadata(session, "fr.wikipedia")
+        result = enrich_articles(session, articles, client, batch_size=50)
+    assert (result.requested, result.updated, result.not_found, result.failed) == (45, 25, 0, 20)
+    with get_session() as session:
+        retry = [slug for _, slug in articles_missing_metadata(session, "fr.wikipedia")]
+    assert retry == [f"Page {i}" for i in range(20)]